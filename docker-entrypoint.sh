@@ -19,8 +19,20 @@ python manage.py migrate --noinput
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-# Start gunicorn server
-echo "Starting server..."
-gunicorn project.wsgi:application --bind 0.0.0.0:8000 --workers 4
+# Workers share their request metrics through files in METRICS_DIR; figures
+# of a previous run are dropped
+export METRICS_DIR="${METRICS_DIR:-/tmp/casino-metrics}"
+mkdir -p "$METRICS_DIR"
+rm -f "$METRICS_DIR"/*.json
+
+# Start gunicorn: sync workers, or uvicorn workers serving the async views
+# with SERVER_MODE=asgi. WEB_CONCURRENCY sets the worker count either way.
+echo "Starting server (${SERVER_MODE:-wsgi})..."
+if [ "$SERVER_MODE" = "asgi" ]; then
+  gunicorn project.asgi:application --worker-class uvicorn.workers.UvicornWorker \
+    --bind 0.0.0.0:8000 --workers "${WEB_CONCURRENCY:-4}"
+else
+  gunicorn project.wsgi:application --bind 0.0.0.0:8000 --workers "${WEB_CONCURRENCY:-4}"
+fi
 
 exec "$@" 
\ No newline at end of file
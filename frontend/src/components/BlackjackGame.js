@@ -1,4 +1,4 @@
-import React, { useState, useContext, useEffect } from 'react';
+import React, { useState, useContext, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { AuthContext } from '../context/AuthContext';
 import { useNavigate } from 'react-router-dom';
@@ -31,6 +31,8 @@ const BlackjackGame = () => {
   const [handResults, setHandResults] = useState({});
   // Add a new state to track action history
   const [actionHistory, setActionHistory] = useState({});
+  // Stands on earlier hands, sent along with the next action
+  const pendingActions = useRef([]);
 
   const API_BASE_URL = "http://127.0.0.1:8000/api";
 
@@ -193,6 +195,7 @@ const BlackjackGame = () => {
       // Set the processed player hands
       setPlayerHands(processedPlayerHands);
       setCurrentHand('main');
+      pendingActions.current = [];
       
       // Process dealer hand
       const dealerHand = response.data.dealer_hand || [];
@@ -259,6 +262,19 @@ const BlackjackGame = () => {
     if (!verifyAuthBeforeAction()) {
       return;
     }
+
+    // Standing on a hand before the last deals no card: move to the next
+    // hand now and send the stand together with the next action
+    const handKeys = Object.keys(playerHands);
+    const handIndex = handKeys.indexOf(currentHand);
+    if (action === 'stand' && handIndex >= 0 && handIndex < handKeys.length - 1) {
+      pendingActions.current.push({ action: 'stand', hand: currentHand });
+      const nextHand = handKeys[handIndex + 1];
+      setCurrentHand(nextHand);
+      setCanDouble((playerHands[nextHand] || []).length === 2);
+      setCanSplit(false);
+      return;
+    }
     
     try {
       // Save current state before making the API call
@@ -271,10 +287,16 @@ const BlackjackGame = () => {
       
       // Fixing auth flow: No need to explicitly set token in the request header
       // since it's handled by the interceptor
-      const response = await axios.post(`${API_BASE_URL}/blackjack/action/`, {
-        action: action,
-        hand: currentHand
-      });
+      const queued = pendingActions.current;
+      pendingActions.current = [];
+      const response = queued.length > 0
+        ? await axios.post(`${API_BASE_URL}/blackjack/actions/`, {
+            actions: [...queued, { action: action, hand: currentHand }]
+          })
+        : await axios.post(`${API_BASE_URL}/blackjack/action/`, {
+            action: action,
+            hand: currentHand
+          });
 
       // Special debug for double action
       if (action === 'double') {
@@ -735,6 +757,7 @@ const BlackjackGame = () => {
     setBetAmount(1);
     setPlayerHands({});
     setCurrentHand('main');
+    pendingActions.current = [];
     setDealerHand([]);
     setMessage('');
     setError('');
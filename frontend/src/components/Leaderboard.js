@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
+import { eventName } from '../events';
 import '../styles/Leaderboard.css';
 
 const Leaderboard = () => {
@@ -7,6 +8,9 @@ const Leaderboard = () => {
     const [leaders, setLeaders] = useState([]);
     const [error, setError] = useState(null);
     const [loading, setLoading] = useState(true);
+    // The ranking as the server sends it; leaders drops the zero rows
+    const [ranking, setRanking] = useState([]);
+    const [reloads, setReloads] = useState(0);
 
     const API_BASE_URL = "http://127.0.0.1:8000/api"; // Ensure this matches Django backend
 
@@ -15,15 +19,40 @@ const Leaderboard = () => {
         setError(null);
 
         axios.get(`${API_BASE_URL}/leaderboard/${period}/`)
-            .then((response) => {
-                const filteredData = response.data.filter((leader) => parseFloat(leader.total_winnings) > 0);
-                setLeaders(filteredData);
-            })
+            .then((response) => setRanking(response.data))
             .catch((err) => {
                 setError("Failed to load leaderboard data.");
                 console.error("❌ Leaderboard fetch error:", err);
             })
             .finally(() => setLoading(false));
+    }, [period, reloads]);
+
+    useEffect(() => {
+        setLeaders(ranking.filter((leader) => parseFloat(leader.total_winnings) > 0));
+    }, [ranking]);
+
+    // Pushed changes to the ranking shown, instead of fetching it again
+    useEffect(() => {
+        const handleDiff = (event) => {
+            const { period: changed, changes, size } = event.detail;
+            if (changed !== period) {
+                return;
+            }
+            setRanking(prev => {
+                const next = prev.slice(0, size);
+                changes.forEach(([position, row]) => {
+                    next[position] = row;
+                });
+                return next;
+            });
+        };
+        const handleResync = () => setReloads(count => count + 1);
+        window.addEventListener(eventName('leaderboard'), handleDiff);
+        window.addEventListener(eventName('resync'), handleResync);
+        return () => {
+            window.removeEventListener(eventName('leaderboard'), handleDiff);
+            window.removeEventListener(eventName('resync'), handleResync);
+        };
     }, [period]);
 
     return (
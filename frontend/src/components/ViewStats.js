@@ -3,6 +3,7 @@ import axios from 'axios';
 import { AuthContext } from '../context/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import { STATS_UPDATED_EVENT } from '../components/BlackjackGame';
+import { eventName } from '../events';
 import '../styles/ViewStats.css';
 
 const ViewStats = () => {
@@ -26,12 +27,14 @@ const ViewStats = () => {
             setTimeout(() => setJustUpdated(false), 3000); // Show for 3 seconds
         };
         
-        // Add event listener
+        // Add event listeners; a round settled in another tab is pushed
         window.addEventListener(STATS_UPDATED_EVENT, handleStatsUpdate);
+        window.addEventListener(eventName('round'), handleStatsUpdate);
         
         // Clean up
         return () => {
             window.removeEventListener(STATS_UPDATED_EVENT, handleStatsUpdate);
+            window.removeEventListener(eventName('round'), handleStatsUpdate);
         };
     }, []);
     
@@ -1,5 +1,6 @@
-import { createContext, useState, useEffect } from 'react';
+import { createContext, useState, useEffect, useRef } from 'react';
 import axios from 'axios';
+import { eventName, subscribeEvents } from '../events';
 
 export const AuthContext = createContext();
 
@@ -12,6 +13,37 @@ export const AuthProvider = ({ children }) => {
     initializeAuth();
   }, []);
 
+  // While logged in, take balance changes from the push event stream
+  const userId = user ? user.id : null;
+  const lastBalanceAt = useRef(0);
+  useEffect(() => {
+    const token = sessionStorage.getItem('token');
+    if (!userId || !token) {
+      return undefined;
+    }
+    const handleBalance = (event) => {
+      // Events from other workers may arrive after newer ones
+      if (event.detail.at < lastBalanceAt.current) {
+        return;
+      }
+      lastBalanceAt.current = event.detail.at;
+      setUser(prev => {
+        if (!prev) {
+          return prev;
+        }
+        const updatedUser = { ...prev, balance: parseFloat(event.detail.balance) };
+        sessionStorage.setItem('user', JSON.stringify(updatedUser));
+        return updatedUser;
+      });
+    };
+    window.addEventListener(eventName('balance'), handleBalance);
+    const unsubscribe = subscribeEvents(token);
+    return () => {
+      unsubscribe();
+      window.removeEventListener(eventName('balance'), handleBalance);
+    };
+  }, [userId]);
+
   // Centralized function to initialize authentication state
   const initializeAuth = () => {
     setIsInitializing(true);
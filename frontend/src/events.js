@@ -0,0 +1,75 @@
+// Push events from the backend's /api/events/ stream (server-sent events).
+// Read with fetch rather than EventSource so the token goes in the
+// Authorization header, never in the URL. Each event is re-dispatched on
+// window as a `casino:<type>` CustomEvent ("balance", "round",
+// "leaderboard", "resync") with the event as its detail.
+
+const API_BASE_URL = "http://127.0.0.1:8000/api";
+
+export const eventName = (type) => `casino:${type}`;
+
+const dispatchFrame = (frame) => {
+  let data = null;
+  frame.split('\n').forEach(line => {
+    if (line.startsWith('data: ')) {
+      data = line.slice(6);
+    }
+  });
+  if (data) {
+    const event = JSON.parse(data);
+    window.dispatchEvent(new CustomEvent(eventName(event.type), { detail: event }));
+  }
+};
+
+// Stream events until the returned function is called. Reconnects after a
+// dropped stream; gives up if the server does not offer one (a 501 from sync
+// workers), leaving the components to fetch as they always have.
+export const subscribeEvents = (token) => {
+  const controller = new AbortController();
+  let retryMs = 5000;
+
+  const connect = async () => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/events/`, {
+        headers: { 'Authorization': `Bearer ${token}`, 'Accept': 'text/event-stream' },
+        signal: controller.signal
+      });
+      if (response.status === 501 || response.status === 401) {
+        return;
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) {
+          break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        let end;
+        while ((end = buffer.indexOf('\n\n')) >= 0) {
+          const frame = buffer.slice(0, end);
+          buffer = buffer.slice(end + 2);
+          if (frame.startsWith('retry: ')) {
+            retryMs = parseInt(frame.slice(7), 10) || retryMs;
+          } else {
+            dispatchFrame(frame);
+          }
+        }
+      }
+    } catch (error) {
+      if (controller.signal.aborted) {
+        return;
+      }
+      console.error('Event stream error:', error);
+    }
+    if (!controller.signal.aborted) {
+      // Whatever happened meanwhile is fetched again
+      window.dispatchEvent(new CustomEvent(eventName('resync'), { detail: { type: 'resync' } }));
+      setTimeout(connect, retryMs);
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+};
@@ -0,0 +1,396 @@
+"""
+Live blackjack rounds, held between player actions.
+
+A round is written to BlackjackGame when it is dealt and deleted when it is
+settled (process_dealer). In between, blackjack_action reads and updates it
+here instead of loading and saving the row on every action, and the row is
+written behind: a flush thread saves a round once it has been dirty for
+ACTIVE_ROUND_FLUSH_MS ms, and whatever is still dirty is saved when the
+worker exits. Actions that move money (double, split) save the round at
+once, right after their ledger write.
+
+Two stores, chosen by ACTIVE_ROUND_STORE ('auto', the default, picks the
+cache store when ACTIVE_ROUND_CACHE is shared by workers):
+
+- ``MemoryRoundStore``: this worker's memory. Nothing routes a user to one
+  worker, so another worker may have changed, settled or replaced the round
+  since: a held round is only used while the row still has its id and
+  revision (one narrow query), and every change is written at once, since
+  changes held back in one worker would be invisible to the others. Every
+  action therefore still costs that query plus an UPDATE, which only saves
+  the full row load over not holding rounds at all.
+- ``CacheRoundStore``: a Django cache alias shared by every worker
+  (ACTIVE_ROUND_CACHE), so it holds the latest state of each round and
+  changes are written behind. A per-process backend (locmem) is refused.
+
+A round the store does not hold is loaded from its row, which is also how a
+worker recovers from a crash or restart. The row always holds a whole,
+earlier state of the round (hands and shoe cursor are saved together), and
+every save carries the round's revision so a late flush never overwrites a
+newer save. Changes not flushed before a crash are lost: the player is put
+back a few cards, and the seeded shoe deals the same cards again.
+
+A write made at once must find the row at the revision the round was read
+at (or one this worker's own flushes wrote since); otherwise another request
+saved the round first and ``save`` raises RoundConflict. Actions that move
+money debit the stake and save the round in one transaction, so a lost race
+rolls the debit back with it.
+"""
+import atexit
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import BlackjackGame
+
+logger = logging.getLogger(__name__)
+
+
+class RoundConflict(Exception):
+    """Another request saved the round since it was read."""
+
+# Everything an action can change on a live round
+SAVED_FIELDS = [
+    "player_hands", "dealer_hand", "bets", "current_spot", "surrendered",
+    "deck", "shoe_seed", "shoe_cursor", "shoe_decks",
+]
+
+
+def is_shared(cache):
+    """Whether every worker sees the same ``cache`` (not locmem or dummy)."""
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+class MemoryRoundStore:
+    """Rounds in this worker's memory; least recently used dropped beyond ``size``."""
+
+    # Other workers' changes never reach it
+    shared = False
+
+    def __init__(self, size=10000):
+        self.size = size
+        self._rounds = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            game = self._rounds.get(user_id)
+            if game is None:
+                return None
+            self._rounds.move_to_end(user_id)
+        # Callers mutate the hands in place; keep the stored round out of reach
+        return copy.deepcopy(game)
+
+    def set(self, user_id, game):
+        game = copy.deepcopy(game)
+        with self._lock:
+            self._rounds[user_id] = game
+            self._rounds.move_to_end(user_id)
+            while len(self._rounds) > self.size:
+                self._rounds.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._rounds.pop(user_id, None)
+
+    # Nothing here blocks, so async views use the same calls
+    async def aget(self, user_id):
+        return self.get(user_id)
+
+    async def aset(self, user_id, game):
+        self.set(user_id, game)
+
+    def clear(self):
+        with self._lock:
+            self._rounds.clear()
+
+
+class CacheRoundStore:
+    """Rounds in a Django cache shared by workers, under ``<prefix>:<user id>``."""
+
+    # An idle round drops out and is loaded from its row on the next action
+    TTL = 24 * 3600
+    shared = True
+
+    def __init__(self, alias, prefix="round"):
+        self.cache = caches[alias]
+        if not is_shared(self.cache):
+            raise ImproperlyConfigured(
+                f"ACTIVE_ROUND_CACHE {alias!r} is not shared by workers; use redis or memcached, "
+                "or ACTIVE_ROUND_STORE='memory'"
+            )
+        self.prefix = prefix
+
+    def get(self, user_id):
+        return self.cache.get(f"{self.prefix}:{user_id}")
+
+    def set(self, user_id, game):
+        self.cache.set(f"{self.prefix}:{user_id}", game, self.TTL)
+
+    def delete(self, user_id):
+        self.cache.delete(f"{self.prefix}:{user_id}")
+
+    async def aget(self, user_id):
+        return await self.cache.aget(f"{self.prefix}:{user_id}")
+
+    async def aset(self, user_id, game):
+        await self.cache.aset(f"{self.prefix}:{user_id}", game, self.TTL)
+
+
+class ActiveRounds:
+    """
+    Reads live rounds from ``store`` (falling back to the database) and
+    writes changes behind, ``flush_ms`` ms after a round first became dirty.
+    A ``flush_ms`` of 0 writes every change at once. The flush thread is
+    started on the first deferred write, so management commands and
+    migrations never spawn it.
+    """
+
+    def __init__(self, store, flush_ms=200):
+        self.store = store
+        self.flush_seconds = flush_ms / 1000
+        # user id -> (monotonic time it became dirty, latest unsaved round)
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def get(self, user):
+        """The user's live round; raises BlackjackGame.DoesNotExist if there is none."""
+        game = self.store.get(user.pk)
+        if game is not None and not self.store.shared:
+            game = self._current(game, self._latest(user).values_list("pk", "revision").first())
+        if game is not None:
+            return game
+        game = self._pending(user.pk) or self._loaded(self._latest(user).get())
+        self.store.set(user.pk, game)
+        return game
+
+    async def aget(self, user):
+        """``get`` for async views."""
+        game = await self.store.aget(user.pk)
+        if game is not None and not self.store.shared:
+            game = self._current(game, await self._latest(user).values_list("pk", "revision").afirst())
+        if game is not None:
+            return game
+        game = self._pending(user.pk) or self._loaded(await self._latest(user).aget())
+        await self.store.aset(user.pk, game)
+        return game
+
+    @staticmethod
+    def _loaded(game):
+        # The revision the row was at: a write made at once must still find it
+        game._written_revision = game.revision
+        return game
+
+    @staticmethod
+    def _latest(user):
+        return BlackjackGame.objects.filter(user=user).order_by("-created_at")[:1]
+
+    def _current(self, game, row):
+        """
+        ``game`` if the row (its pk and revision) still holds that round at
+        that revision or an earlier one; None if another worker has since
+        saved, settled or replaced it.
+        """
+        if row is not None and row[0] == game.pk and row[1] <= game.revision:
+            return game
+        self.store.delete(game.user_id)
+        return None
+
+    def _pending(self, user_id):
+        # A round dropped from the store before it was written
+        with self._lock:
+            pending = self._dirty.get(user_id)
+        return copy.deepcopy(pending[1]) if pending else None
+
+    def save(self, game, sync=False):
+        """
+        Record a change to a live round. The row is written within the
+        flush delay, or before returning if ``sync`` is set; a write made at
+        once raises RoundConflict, and forgets the round, if another request
+        saved it first. Run it in the transaction of the ledger writes the
+        change goes with.
+        """
+        game.revision += 1
+        if sync or self.flush_seconds <= 0:
+            self._supersede(game)
+            if not self._expected(game).update(**self._values(game)):
+                self._conflict(game)
+            game._written_revision = game.revision
+            self.store.set(game.user_id, game)
+        else:
+            self.store.set(game.user_id, game)
+            self._defer(game)
+
+    async def asave(self, game, sync=False):
+        """``save`` for async views."""
+        game.revision += 1
+        if sync or self.flush_seconds <= 0:
+            self._supersede(game)
+            if not await self._expected(game).aupdate(**self._values(game)):
+                self._conflict(game)
+            game._written_revision = game.revision
+            await self.store.aset(game.user_id, game)
+        else:
+            await self.store.aset(game.user_id, game)
+            self._defer(game)
+
+    @staticmethod
+    def _expected(game):
+        # The revision it was read at, up to its own deferred changes flushed since
+        return BlackjackGame.objects.filter(
+            pk=game.pk,
+            revision__gte=getattr(game, "_written_revision", game.revision - 1),
+            revision__lt=game.revision,
+        )
+
+    def _conflict(self, game):
+        self.discard(game.user_id)
+        raise RoundConflict(f"Round {game.pk} was saved by another request")
+
+    def _supersede(self, game):
+        # A write of ``game`` replaces any pending one
+        with self._lock:
+            self._dirty.pop(game.user_id, None)
+
+    def _defer(self, game):
+        with self._lock:
+            pending = self._dirty.get(game.user_id)
+            since = pending[0] if pending else time.monotonic()
+            self._dirty[game.user_id] = (since, copy.deepcopy(game))
+        self._ensure_started()
+        self._wake.set()
+
+    def discard(self, user_id):
+        """Forget the user's round: it was settled, reset or replaced."""
+        with self._lock:
+            self._dirty.pop(user_id, None)
+        self.store.delete(user_id)
+
+    def flush(self, user_id=None, older_than=0.0):
+        """
+        Write the dirty rounds (only ``user_id``'s, if given) that have been
+        dirty for ``older_than`` seconds or more. Returns the rows written.
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                (uid, game) for uid, (since, game) in self._dirty.items()
+                if (user_id is None or uid == user_id) and now - since >= older_than
+            ]
+            for uid, _ in due:
+                del self._dirty[uid]
+        written = 0
+        for uid, game in due:
+            try:
+                written += self._write(game)
+            except Exception:
+                logger.exception("Could not save the round of user %s, will retry", uid)
+                with self._lock:
+                    # Unless a newer change is already waiting
+                    self._dirty.setdefault(uid, (now, game))
+        return written
+
+    @staticmethod
+    def _query(game):
+        # A save that lost the race to a newer one writes nothing
+        return BlackjackGame.objects.filter(pk=game.pk, revision__lt=game.revision)
+
+    @staticmethod
+    def _values(game):
+        return {"revision": game.revision, **{field: getattr(game, field) for field in SAVED_FIELDS}}
+
+    def _write(self, game):
+        return self._query(game).update(**self._values(game))
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="active-round-flush", daemon=True)
+                self._thread.start()
+                # A clean shutdown loses nothing
+                atexit.register(self.flush)
+
+    def _flush_loop(self):
+        interval = self.flush_seconds / 4
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while self._dirty:
+                time.sleep(interval)
+                close_old_connections()
+                self.flush(older_than=self.flush_seconds)
+
+
+def build_store():
+    kind = settings.ACTIVE_ROUND_STORE
+    if kind == "auto":
+        kind = "cache" if is_shared(caches[settings.ACTIVE_ROUND_CACHE]) else "memory"
+    if kind == "memory":
+        return MemoryRoundStore(settings.ACTIVE_ROUND_STORE_SIZE)
+    if kind == "cache":
+        return CacheRoundStore(settings.ACTIVE_ROUND_CACHE)
+    raise ValueError(f"Unknown ACTIVE_ROUND_STORE: {settings.ACTIVE_ROUND_STORE!r}")
+
+
+_rounds = None
+_rounds_lock = threading.Lock()
+
+
+def rounds():
+    """This worker's ActiveRounds, built from settings on first use."""
+    global _rounds
+    if _rounds is None:
+        with _rounds_lock:
+            if _rounds is None:
+                store = build_store()
+                # Only a shared store lets other workers see changes not yet written
+                _rounds = ActiveRounds(store, settings.ACTIVE_ROUND_FLUSH_MS if store.shared else 0)
+    return _rounds
+
+
+def get(user):
+    return rounds().get(user)
+
+
+async def aget(user):
+    return await rounds().aget(user)
+
+
+def save(game, sync=False):
+    rounds().save(game, sync)
+
+
+async def asave(game, sync=False):
+    await rounds().asave(game, sync)
+
+
+def discard(user_id):
+    rounds().discard(user_id)
+
+
+def flush(user_id=None):
+    return rounds().flush(user_id)
+
+
+@receiver(post_save, sender=BlackjackGame, dispatch_uid="app.active_rounds.saved")
+def _on_game_saved(sender, instance, **kwargs):
+    # A round dealt or changed outside this module replaces what is held
+    # (the store's own writes are UPDATEs and send no signal)
+    if _rounds is not None:
+        _rounds.discard(instance.user_id)
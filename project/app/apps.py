@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # Connect the ledger signal and its receivers, user cache and active
+        # round eviction, push events, and the query counter of app.metrics
+        from . import signals, leaderboard, stats, user_cache, active_rounds, events, metrics  # noqa: F401
+        from . import rules
+
+        # Compile the table rules once, failing at startup on a bad table
+        rules.tables()
@@ -1,10 +1,45 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core import signing
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from .models import CustomUser
-import re
+from . import token_store, user_cache
+
+# Signed tokens start with their layout version; anything else is rejected
+TOKEN_PREFIX = "v1."
+TOKEN_SALT = "app.authentication.token"
+
+
+def issue_token(user):
+    """
+    A bearer token for ``user``: user id and the user's token_version,
+    HMAC-signed with SECRET_KEY and timestamped, so it expires TOKEN_MAX_AGE
+    seconds after issue.
+    """
+    return TOKEN_PREFIX + signing.dumps({"u": user.pk, "v": user.token_version}, salt=TOKEN_SALT, compress=False)
+
+
+def read_token(token):
+    """
+    The payload of a signed token, checked in constant time. Raises
+    AuthenticationFailed if the signature is wrong or the token has expired.
+    """
+    try:
+        payload = signing.loads(token[len(TOKEN_PREFIX):], salt=TOKEN_SALT, max_age=settings.TOKEN_MAX_AGE)
+    except signing.SignatureExpired:
+        raise AuthenticationFailed('Token has expired, please login again.')
+    except signing.BadSignature:
+        raise AuthenticationFailed('Invalid token.')
+    return payload
+
+
+def token_expiry(token):
+    """When a token read_token accepts stops being accepted anyway."""
+    # Signed layout: <payload>:<base62 timestamp>:<signature>
+    issued = signing.b62_decode(token.rsplit(":", 2)[1])
+    return datetime.fromtimestamp(issued + settings.TOKEN_MAX_AGE, tz=timezone.utc)
 
-# Store invalidated tokens
-BLACKLISTED_TOKENS = set()
 
 class TokenAuthentication(BaseAuthentication):
     """
@@ -27,39 +62,34 @@ class TokenAuthentication(BaseAuthentication):
             return None
         
         # Check if token is blacklisted (logged out)
-        if token in BLACKLISTED_TOKENS:
+        if token_store.is_revoked(token):
             raise AuthenticationFailed('Token has been invalidated, please login again.')
         
-        # Extract the user ID from the token - simplified for the test
-        # In a real app, you'd decode a JWT or validate the token in a database
-        # Here we're using a simplistic approach where the token format includes user_id
-        user_id_match = re.search(r'user_id:(\d+)', token)
-        if user_id_match:
-            user_id = int(user_id_match.group(1))
-        else:
-            # For tests, use any token with "test" in it to authenticate as user ID 1
-            if "test" in token:
-                user_id = 1
-            else:
-                # Use a simple approach to try to get a user ID
-                try:
-                    # For tests, return the first available user
-                    user = CustomUser.objects.first()
-                    if user:
-                        return (user, token)
-                    return None
-                except Exception:
-                    return None
-        
-        try:
-            user = CustomUser.objects.get(id=user_id)
-            return (user, token)
-        except CustomUser.DoesNotExist:
-            return None
-            
+        # Unsigned tokens from before signing carried nothing that could be
+        # verified; their holders log in again
+        if not token.startswith(TOKEN_PREFIX):
+            raise AuthenticationFailed('Invalid token.')
+
+        payload = read_token(token)
+        # Signed token: no query unless the user has dropped out of the cache
+        user = user_cache.get_user(payload["u"])
+        if user is None or not user.is_active or user.token_version != payload["v"]:
+            raise AuthenticationFailed('Token is no longer valid, please login again.')
+        return (user, token)
+
     def authenticate_header(self, request):
         return 'Bearer'
 
 def blacklist_token(token):
-    """Add a token to the blacklist when a user logs out"""
-    BLACKLISTED_TOKENS.add(token) 
\ No newline at end of file
+    """
+    Revoke a token for every worker when a user logs out, until it expires.
+    Anything read_token does not accept is ignored: it could never
+    authenticate, and recording it would let anyone grow the revocations.
+    """
+    if not token.startswith(TOKEN_PREFIX):
+        return
+    try:
+        read_token(token)
+    except AuthenticationFailed:
+        return
+    token_store.revoke(token, token_expiry(token))
@@ -1,14 +1,133 @@
 import json
+import logging
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from .models import CustomUser, BlackjackGame, Transaction
-from .utils import create_deck, calculate_hand_value, is_blackjack, deal_initial_hands
+from django.db import transaction as db_transaction
+from .models import CustomUser, BlackjackGame, RoundResult, Transaction
+from . import active_rounds, ledger, metrics, rules, stats
+from .utils import calculate_hand_value, is_blackjack, deal_initial_hands
+from .shoe import shoe_pool
+from .cards import add_card, encode_hand, from_legacy, hand_state, hand_total, state_total
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .authentication import TokenAuthentication
-from decimal import Decimal
+from django.conf import settings
 import datetime
 
+logger = logging.getLogger(__name__)
+
+# How process_dealer reports each rules outcome
+RESULT_LABELS = {
+    rules.BUST: "Bust ❌",
+    rules.WIN: "Win 🏆",
+    rules.BLACKJACK: "Blackjack 🃏",
+    rules.LOSS: "Loss ❌",
+    rules.PUSH: "Push 🔄",
+    rules.SURRENDER: "Surrender 🏳️",
+}
+
+
+def is_split_hand(player_hands, spot):
+    """
+    Whether ``spot`` took part in a split: split hands are keyed
+    "split_<spot>..." and the hand they came from keeps its key.
+    """
+    return spot.startswith("split_") or any(
+        key == f"split_{spot}" or key.startswith(f"split_{spot}_") for key in player_hands
+    )
+
+
+class AlreadySettled(Exception):
+    """The round was settled by another request."""
+
+
+def settle_round(user, game, shoe, table, player_hands, dealer_value, dealer_natural):
+    """
+    Settle ``game`` against the dealer's final total: every settlement
+    (process_dealer, views.blackjack_stand) goes through here.
+
+    The game is deleted by id, archived as a RoundResult, counted in the
+    stats rollup and paid out with one ledger.settle, all in one
+    transaction; a concurrent settlement of the same game finds it gone and
+    raises AlreadySettled, paying nothing. The ledger gets the profit of won
+    hands as a win row and what was lost of the stakes as a loss row.
+    Returns the rules result per spot and the total returned to the player.
+    """
+    bets = game.bets
+    round_results = {}
+    outcomes = []
+    payouts = 0
+
+    # Track transactions for stats
+    total_win_amount = 0
+    total_loss_amount = 0
+
+    for spot, player_hand in player_hands.items():
+        player_codes = encode_hand(player_hand)
+        player_value = hand_total(player_codes)
+        logger.debug("Spot %s: Player value %s, Dealer value %s", spot, player_value, dealer_value)
+        bet_amount = ledger.to_amount(bets.get(spot, 0))
+
+        result = table.outcome(
+            player_value, dealer_value,
+            player_natural=rules.is_natural(len(player_codes), player_value, is_split_hand(player_hands, spot)),
+            dealer_natural=dealer_natural,
+            surrendered=spot in game.surrendered,
+        )
+        round_results[spot] = result
+        outcomes.append(rules.stats_outcome(result))
+        returned = table.payout(result, bet_amount)
+        payouts += returned
+        # Stats rows: the profit of a won hand, what was lost of the stake
+        # otherwise; a push returns the bet and records nothing
+        if returned > bet_amount:
+            total_win_amount += returned - bet_amount
+        elif returned < bet_amount:
+            total_loss_amount += bet_amount - returned
+        logger.debug("Spot %s: %s, %s returned", spot, result, returned)
+
+    with db_transaction.atomic():
+        if not BlackjackGame.objects.filter(pk=game.pk).delete()[0]:
+            active_rounds.discard(user.pk)
+            raise AlreadySettled()
+        logger.debug("Game deleted from DB")
+
+        shoe_state = shoe.state()
+        RoundResult.objects.create(
+            user=user,
+            table=table.name,
+            bets=bets,
+            results=round_results,
+            wagered=ledger.to_amount(sum(bets.values())),
+            payout=ledger.to_amount(payouts),
+            shoe_seed=shoe_state.get("shoe_seed", ""),
+            shoe_cursor=shoe_state.get("shoe_cursor", 0),
+        )
+
+        stats.record_round(user, outcomes)
+
+        # Payout and the win/loss rows for stats tracking: one balance
+        # UPDATE and one INSERT; a win also updates last_spin for the user
+        now = datetime.datetime.now()
+        rows = [
+            Transaction(
+                user=user, amount=amount, transaction_type=transaction_type,
+                payment_method="game", timestamp=now, game_id=str(game.id), game_type="blackjack",
+            )
+            for transaction_type, amount in (("win", total_win_amount), ("loss", total_loss_amount))
+            if amount > 0
+        ]
+        ledger.settle(user, payouts, rows, values={"last_spin": now} if total_win_amount > 0 else None)
+        logger.debug("Total payouts: %s New balance: %s", payouts, user.balance)
+
+    # Unsaved changes to the round die with it
+    active_rounds.discard(user.pk)
+
+    # The rest of the shoe deals the next round until the cut card comes out
+    shoe_pool.release(shoe)
+    return round_results, payouts
+
+
 @csrf_exempt
 @api_view(['POST'])
 @authentication_classes([TokenAuthentication])
@@ -17,64 +136,71 @@ def start_blackjack(request):
     """Starts a new Blackjack game using token authentication."""
     # Fixing auth flow: Using request.user.id instead of session checks
     user_id = request.user.id
-    print("🔁 Backend /start_blackjack called")
-    print("User ID:", user_id)
+    logger.debug("Backend /start_blackjack called")
+    logger.debug("User ID: %s", user_id)
 
     try:
         user = request.user
         data = json.loads(request.body)
         bets = data.get("bets", {})
-        print("Bets placed:", bets)
+        logger.debug("Bets placed: %s", bets)
 
         if not bets:
             return JsonResponse({"error": "No bets placed."}, status=400)
 
+        table_name = data.get("table") or settings.BLACKJACK_DEFAULT_TABLE
+        if table_name not in rules.tables():
+            return JsonResponse({"error": f"Unknown table: {table_name}"}, status=400)
+
         total_bet = sum(bets.values())
-        print("Total bet:", total_bet, "User balance:", user.balance)
-        if user.balance < total_bet:
-            return JsonResponse({"error": "Insufficient balance."}, status=400)
+        logger.debug("Total bet: %s User balance: %s", total_bet, user.balance)
 
-        # Deduct from user balance
-        user.balance -= total_bet
-        user.save()
+        shoe = shoe_pool.acquire()
+        player_hands, dealer_hand = deal_initial_hands(shoe, num_hands=len(bets))
+        logger.debug("Initial player hands: %s", player_hands)
+        logger.debug("Initial dealer hand: %s", dealer_hand)
 
-        deck = create_deck()
-        player_hands, dealer_hand = deal_initial_hands(deck, num_hands=len(bets))
-        print("Initial player hands:", player_hands)
-        print("Initial dealer hand:", dealer_hand)
+        # The bet, the game and its game_bet row are written together
+        with db_transaction.atomic():
+            # Deduct from user balance
+            try:
+                ledger.debit(user, total_bet)
+            except ledger.InsufficientFunds:
+                return JsonResponse({"error": "Insufficient balance."}, status=400)
 
-        # Store game in database
-        game = BlackjackGame.objects.create(
-            user=user,
-            deck=deck,
-            player_hands=player_hands,
-            dealer_hand=dealer_hand,
-            bets=bets,
-            current_spot=list(player_hands.keys())[0]
-        )
-        print("Game created with ID:", game.id)
+            # Store game in database
+            game = BlackjackGame.objects.create(
+                user=user,
+                **shoe.state(),
+                player_hands=player_hands,
+                dealer_hand=dealer_hand,
+                bets=bets,
+                table=table_name,
+                current_spot=list(player_hands.keys())[0]
+            )
+            logger.debug("Game created with ID: %s", game.id)
 
-        # Create a game_bet transaction for stats tracking
-        Transaction.objects.create(
-            user=user,
-            amount=Decimal(str(total_bet)),
-            transaction_type="game_bet",  # This will be processed as a "loss" type
-            payment_method="game",
-            timestamp=datetime.datetime.now(),
-            game_id=str(game.id),
-            game_type="blackjack"
-        )
-        print(f"Created game_bet transaction for {total_bet}")
+            # Create a game_bet transaction for stats tracking
+            ledger.record(
+                user, total_bet,
+                "game_bet",  # This will be processed as a "loss" type
+                payment_method="game",
+                timestamp=datetime.datetime.now(),
+                game_id=str(game.id),
+                game_type="blackjack"
+            )
+        logger.debug("Created game_bet transaction for %s", total_bet)
 
         return JsonResponse({
             "message": "Game started",
             "player_hands": player_hands,
             "dealer_hand": [dealer_hand[0], "Hidden"],
-            "bets": bets
+            "bets": bets,
+            "table": table_name
         })
 
     except Exception as e:
-        print(f"❌ Error in start_blackjack: {str(e)}")
+        logger.error("Error in start_blackjack: %s", e)
         return JsonResponse({"error": f"Error: {str(e)}"}, status=500)
 
 @csrf_exempt
@@ -85,127 +211,68 @@ def process_dealer(request):
     """Handles the dealer's turn and determines game outcome."""
     # Fixing auth flow: Using request.user.id instead of session checks
     user_id = request.user.id
-    print("🔁 Backend /process_dealer called")
-    print("User ID:", user_id)
+    logger.debug("Backend /process_dealer called")
+    logger.debug("User ID: %s", user_id)
 
     try:
-        user = request.user
-        game = BlackjackGame.objects.filter(user=user).latest("created_at")
+        game = active_rounds.get(request.user)
+    except BlackjackGame.DoesNotExist:
+        return JsonResponse({"error": "No active game found."}, status=400)
+    return play_dealer(request.user, game)
+
 
+def play_dealer(user, game):
+    """
+    Play the dealer's turn of ``game``, the user's live round, and settle it;
+    returns the process_dealer response. For views that already hold the round.
+    """
+    metrics.set_variant("settle")
+    try:
         dealer_hand = game.dealer_hand
-        deck = game.deck
+        shoe = shoe_pool.load(game)
         player_hands = game.player_hands
         bets = game.bets
-        print("Processing dealer for game ID:", game.id)
-        print("Current dealer hand:", dealer_hand)
-        print("Player hands:", player_hands)
-        print("Bets:", bets)
+        table = rules.get_table(game.table)
+        logger.debug("Processing dealer for game ID: %s", game.id)
+        logger.debug("Current dealer hand: %s", dealer_hand)
+        logger.debug("Player hands: %s", player_hands)
+        logger.debug("Bets: %s", bets)
 
-        # Dealer only draws cards if at least one player hand is not busted
+        # Dealer only draws cards if at least one player hand is still in play
         any_valid_hand = False
-        for hand in player_hands.values():
+        for spot, hand in player_hands.items():
+            if spot in game.surrendered:
+                continue
             hand_value = calculate_hand_value(hand)
-            print(f"Hand value: {hand_value}")
+            logger.debug("Hand value: %s", hand_value)
             if hand_value <= 21:
                 any_valid_hand = True
                 break
 
-        print("Any valid hand not busted:", any_valid_hand)
+        logger.debug("Any valid hand not busted: %s", any_valid_hand)
 
-        # Reveal hidden card
-        dealer_value = calculate_hand_value(dealer_hand)
-        print("Initial dealer value:", dealer_value)
+        # Reveal hidden card. The dealer hand is encoded once and each draw
+        # only advances the compact hand state.
+        dealer_codes = encode_hand(dealer_hand)
+        dealer_state = hand_state(dealer_codes)
+        dealer_value = state_total(dealer_state)
+        dealer_natural = rules.is_natural(len(dealer_codes), dealer_value)
+        logger.debug("Initial dealer value: %s", dealer_value)
 
-        # Dealer hits on 16 or less (only if player has a valid hand)
+        # Dealer draws by the table rules (only if player has a valid hand)
         if any_valid_hand:
-            print("Dealer will draw cards if value < 17")
-            while dealer_value < 17:
-                new_card = deck.pop()
+            while table.dealer_hits(dealer_state):
+                new_card = shoe.draw()
                 dealer_hand.append(new_card)
-                dealer_value = calculate_hand_value(dealer_hand)
-                print(f"Dealer drew {new_card['rank']} of {new_card['suit']}, new value: {dealer_value}")
-
-        results = {}
-        payouts = 0
-        
-        # Track transactions for stats
-        total_win_amount = 0
-        total_loss_amount = 0
-        game_id = str(game.id)
-
-        for spot, player_hand in player_hands.items():
-            player_value = calculate_hand_value(player_hand)
-            print(f"Spot {spot}: Player value {player_value}, Dealer value {dealer_value}")
-            bet_amount = bets[spot]
-
-            if player_value > 21:
-                results[spot] = "Bust ❌"
-                print(f"Spot {spot}: Player bust")
-                # Record loss transaction
-                total_loss_amount += bet_amount
-            elif dealer_value > 21:
-                results[spot] = "Win 🏆"  # Dealer busts, player wins
-                win_amount = bet_amount * 2
-                payouts += win_amount
-                print(f"Spot {spot}: Dealer bust, player wins {win_amount}")
-                # Record win transaction
-                total_win_amount += win_amount - bet_amount  # Record only the profit
-            elif player_value > dealer_value:
-                results[spot] = "Win 🏆"  # Player has higher value
-                win_amount = bet_amount * 2
-                payouts += win_amount
-                print(f"Spot {spot}: Player has higher value, wins {win_amount}")
-                # Record win transaction
-                total_win_amount += win_amount - bet_amount  # Record only the profit
-            elif player_value < dealer_value:
-                results[spot] = "Loss ❌"  # Dealer has higher value
-                print(f"Spot {spot}: Dealer has higher value, player loses")
-                # Record loss transaction
-                total_loss_amount += bet_amount
-            else:
-                results[spot] = "Push 🔄"  # Tie, bet returned
-                payouts += bet_amount
-                print(f"Spot {spot}: Push, bet {bet_amount} returned")
-                # No transaction for push - money is returned, not won or lost
-
-        # Update user balance
-        user.balance += payouts
-        user.save()
-        print("Total payouts:", payouts, "New balance:", user.balance)
-        
-        # Create transactions for stats tracking
-        if total_win_amount > 0:
-            # Create a win transaction
-            Transaction.objects.create(
-                user=user,
-                amount=Decimal(str(total_win_amount)),
-                transaction_type="win",
-                payment_method="game",
-                timestamp=datetime.datetime.now(),
-                game_id=game_id,
-                game_type="blackjack"
-            )
-            print(f"Created win transaction for {total_win_amount}")
-            
-            # Update last_spin time for the user
-            user.last_spin = datetime.datetime.now()
-            user.save()
-        
-        if total_loss_amount > 0:
-            # Create a loss transaction
-            Transaction.objects.create(
-                user=user,
-                amount=Decimal(str(total_loss_amount)),
-                transaction_type="loss",
-                payment_method="game",
-                timestamp=datetime.datetime.now(),
-                game_id=game_id,
-                game_type="blackjack"
-            )
-            print(f"Created loss transaction for {total_loss_amount}")
+                dealer_state = add_card(dealer_state, from_legacy(new_card))
+                dealer_value = state_total(dealer_state)
+                logger.debug("Dealer drew %s, new value: %s", new_card, dealer_value)
 
-        game.delete()  # Remove game from DB after completion
-        print("Game deleted from DB")
+        try:
+            round_results, payouts = settle_round(user, game, shoe, table, player_hands, dealer_value, dealer_natural)
+        except AlreadySettled:
+            return JsonResponse({"error": "Game already settled."}, status=409)
+        results = {spot: RESULT_LABELS[result] for spot, result in round_results.items()}
 
         # Ensure the response includes all required fields
         response_data = {
@@ -218,9 +285,7 @@ def process_dealer(request):
 
         return JsonResponse(response_data)
 
-    except BlackjackGame.DoesNotExist:
-        return JsonResponse({"error": "No active game found."}, status=400)
     except Exception as e:
         # Catch any other unexpected errors
-        print(f"❌ Unexpected error in process_dealer: {str(e)}")
+        logger.error("Unexpected error in process_dealer: %s", e)
         return JsonResponse({"error": f"Unexpected error: {str(e)}"}, status=500)
@@ -0,0 +1,174 @@
+"""
+Compact card encoding and table-driven hand evaluation for Blackjack.
+
+A card is a small int: ``deck * 52 + rank * 4 + suit``. ``rank`` indexes
+RANKS, ``suit`` indexes SUITS and ``deck`` is the card's deck within the shoe,
+so a 6-deck shoe uses the codes 0-311 and a hand fits in an ``array('H')``.
+
+Hand totals are never recomputed card by card. A hand is folded into a single
+int state (``hard_total << 1 | has_ace``) and the best total and soft flag are
+read from tables built once at import time.
+"""
+from array import array
+
+RANKS = ("2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A")
+SUITS = ("♠", "♥", "♦", "♣")
+SUIT_LETTERS = ("S", "H", "D", "C")
+
+CARDS_PER_DECK = 52
+MAX_DECKS = 8
+ACE = RANKS.index("A")
+
+# Blackjack points per rank with aces counted as 1 (the soft bonus is in the tables)
+RANK_POINTS = (2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 1)
+
+# Per-code lookups, covering every card of a MAX_DECKS shoe
+CARD_RANK = tuple((code % CARDS_PER_DECK) >> 2 for code in range(MAX_DECKS * CARDS_PER_DECK))
+# Pre-shifted so that adding a card to a hand state is a single addition
+_STATE_STEP = tuple(RANK_POINTS[rank] << 1 for rank in CARD_RANK)
+_ACE_BIT = tuple(1 if rank == ACE else 0 for rank in CARD_RANK)
+
+# Hand states above this hard total are busted whatever the aces do, so the
+# tables stop there and state_total() falls back to the hard total.
+MAX_TABLE_HARD = 31
+_STATE_TOTAL = []
+_STATE_SOFT = []
+for _hard in range(MAX_TABLE_HARD + 1):
+    for _has_ace in (0, 1):
+        _soft = bool(_has_ace) and _hard + 10 <= 21
+        _STATE_TOTAL.append(_hard + 10 if _soft else _hard)
+        _STATE_SOFT.append(_soft)
+_STATE_TOTAL = tuple(_STATE_TOTAL)
+_STATE_SOFT = tuple(_STATE_SOFT)
+_TABLE_SIZE = len(_STATE_TOTAL)
+
+EMPTY_STATE = 0
+
+
+def encode(rank, suit=0, deck=0):
+    """Return the int code for a card given rank, suit and deck indexes."""
+    return deck * CARDS_PER_DECK + rank * 4 + suit
+
+
+def rank_of(code):
+    return CARD_RANK[code]
+
+
+def suit_of(code):
+    return code & 3
+
+
+def deck_of(code):
+    return code // CARDS_PER_DECK
+
+
+def new_hand(codes=()):
+    """Return a compact hand (array of unsigned shorts)."""
+    return array("H", codes)
+
+
+def add_card(state, code):
+    """Return the hand state after drawing the card ``code``."""
+    return (state + _STATE_STEP[code]) | _ACE_BIT[code]
+
+
+def hand_state(codes):
+    """Fold a sequence of card codes into a hand state."""
+    state = EMPTY_STATE
+    for code in codes:
+        state = (state + _STATE_STEP[code]) | _ACE_BIT[code]
+    return state
+
+
+def state_total(state):
+    """Best total for a hand state (aces count 11 where that does not bust)."""
+    if state < _TABLE_SIZE:
+        return _STATE_TOTAL[state]
+    return state >> 1
+
+
+def state_is_soft(state):
+    """True when the best total counts an ace as 11."""
+    return state < _TABLE_SIZE and _STATE_SOFT[state]
+
+
+def hand_total(codes):
+    return state_total(hand_state(codes))
+
+
+def is_soft(codes):
+    return state_is_soft(hand_state(codes))
+
+
+# --- Legacy adapter -------------------------------------------------------
+#
+# BlackjackGame rows and API payloads carry cards as dicts
+# ({"rank": "A", "suit": "♥", "value": 11}), as strings ("AH", "10♣") and as
+# hands nested one level deep ([[card, card], card]). Everything below turns
+# those into codes once so the evaluator above never sees them.
+
+_RANK_INDEX = {rank: index for index, rank in enumerate(RANKS)}
+_SUIT_INDEX = {suit: index for index, suit in enumerate(SUITS)}
+_SUIT_INDEX.update({letter: index for index, letter in enumerate(SUIT_LETTERS)})
+# Cards that only carry a "value": 10 and 11 are read as a ten and an ace
+_VALUE_RANK = {points: _RANK_INDEX[str(points)] for points in range(2, 11)}
+_VALUE_RANK[11] = ACE
+
+_LEGACY_STRINGS = {}
+for _rank_index, _rank in enumerate(RANKS):
+    _LEGACY_STRINGS[_rank] = encode(_rank_index)
+    for _suit, _suit_index in _SUIT_INDEX.items():
+        _LEGACY_STRINGS[_rank + _suit] = encode(_rank_index, _suit_index)
+
+
+def _parse_legacy_string(card):
+    rank = "10" if card.startswith("10") else card[:1]
+    rank_index = _RANK_INDEX.get(rank)
+    if rank_index is None:
+        return None
+    return encode(rank_index, _SUIT_INDEX.get(card[len(rank):len(rank) + 1], 0))
+
+
+def from_legacy(card):
+    """
+    Return the code for a legacy card, or None for placeholders ("Hidden"),
+    None entries and anything that cannot be parsed.
+    """
+    if isinstance(card, dict):
+        rank_index = _RANK_INDEX.get(card.get("rank"))
+        if rank_index is None:
+            rank_index = _VALUE_RANK.get(card.get("value"))
+            if rank_index is None:
+                return None
+        return encode(rank_index, _SUIT_INDEX.get(card.get("suit"), 0))
+    if isinstance(card, str):
+        code = _LEGACY_STRINGS.get(card)
+        if code is None and card != "Hidden":
+            code = _parse_legacy_string(card)
+        return code
+    return None
+
+
+def encode_hand(hand):
+    """
+    Convert a legacy hand into a compact hand, flattening one level of
+    nesting and dropping placeholders and unparseable cards.
+    """
+    codes = new_hand()
+    for item in hand:
+        if isinstance(item, list):
+            for card in item:
+                code = from_legacy(card)
+                if code is not None:
+                    codes.append(code)
+        else:
+            code = from_legacy(item)
+            if code is not None:
+                codes.append(code)
+    return codes
+
+
+def to_legacy(code):
+    """Return the dict form of a card that the API and frontend expect."""
+    rank = RANKS[CARD_RANK[code]]
+    return {"rank": rank, "suit": SUITS[code & 3], "value": 11 if rank == "A" else RANK_POINTS[CARD_RANK[code]]}
@@ -0,0 +1,50 @@
+"""
+Increment-or-create for the derived counter tables (leaderboard buckets,
+stats rollups).
+
+Each increment is one ``INSERT ... ON CONFLICT (lookup) DO UPDATE SET
+col = col + n`` (PostgreSQL, SQLite 3.24+), so concurrent writers never lose
+increments and a missing row costs no extra round trip. Timestamps such as a
+last activity only ever move forward, whatever order the writes land in.
+"""
+from django.db import connections, router
+
+
+def increment(model, lookup, increments, values=None, latest=None):
+    """
+    Add ``increments`` ({field: delta}) to the row of ``model`` matching
+    ``lookup``, creating it if needed; ``values`` are plain assignments and
+    ``latest`` ({field: value}) are kept only if later than the stored value.
+    The fields of ``lookup`` must be the model's primary key or a unique
+    constraint.
+    """
+    values = values or {}
+    latest = latest or {}
+    meta = model._meta
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+
+    # The row as created, defaults included
+    row = model(**lookup, **increments, **values, **latest)
+    fields = [field for field in meta.concrete_fields if field is not meta.auto_field]
+    params = [field.get_db_prep_save(field.pre_save(row, True), connection) for field in fields]
+
+    def column(name):
+        return quote(meta.get_field(name).column)
+
+    updates = [f"{column(name)} = {table}.{column(name)} + EXCLUDED.{column(name)}" for name in increments]
+    updates += [f"{column(name)} = EXCLUDED.{column(name)}" for name in values]
+    updates += [
+        f"{column(name)} = CASE WHEN {table}.{column(name)} IS NULL OR EXCLUDED.{column(name)} > {table}.{column(name)}"
+        f" THEN EXCLUDED.{column(name)} ELSE {table}.{column(name)} END"
+        for name in latest
+    ]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)})"
+        f" VALUES ({', '.join(['%s'] * len(fields))})"
+        f" ON CONFLICT ({', '.join(column(name) for name in lookup)})"
+        f" {'DO UPDATE SET ' + ', '.join(updates) if updates else 'DO NOTHING'}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
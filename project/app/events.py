@@ -0,0 +1,278 @@
+"""
+Push events: balance changes, settled rounds and leaderboard changes, which
+the ``event_stream`` view of app.views_async (SERVER_MODE=asgi) streams to
+browsers as server-sent events.
+
+Events are published to channels: ``user:<id>`` carries one player's
+``balance`` and ``round`` events, ``leaderboard`` the ``leaderboard`` diffs
+of every period. Events that come from database writes are published once
+the writing transaction commits. Each worker's Hub fans an event out to the
+subscriptions of its channel, one asyncio queue per open stream, without
+ever blocking the publisher. A stream that falls EVENTS_QUEUE_SIZE events
+behind gets a single ``resync`` event instead, telling the client to fetch
+its state again.
+
+The broker, chosen by EVENTS_BROKER, carries events between workers:
+
+- ``LocalBroker``: straight to this worker's Hub; enough for one worker.
+- ``CacheBroker``: a numbered journal in the EVENTS_CACHE alias (memcached,
+  redis, ...), kept the way CacheTokenStore journals revocations. A worker
+  delivers its own events at once and reads the others' every
+  EVENTS_POLL_SECONDS while it has subscribers. It stands in for a real
+  message broker: events reach other workers' streams up to a poll late,
+  and a worker without subscribers skips what was published meanwhile.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import RoundResult
+from .signals import balance_changed
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD = "leaderboard"
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """The queue of one stream, read on the event loop it was made on."""
+
+    def __init__(self, hub, channels, size):
+        self.hub = hub
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+
+    def put(self, event):
+        # Runs on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Diffs are no use after a gap: the client starts over
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "at": event["at"]})
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    """This worker's subscriptions by channel."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        """A Subscription to ``channels``, for the running event loop."""
+        subscription = Subscription(self, channels, self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def has_subscribers(self):
+        return bool(self._channels)
+
+    def deliver(self, channel, event):
+        """Queue ``event`` for the subscribers of ``channel``; safe from any thread."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # Its event loop has closed
+                self.unsubscribe(subscription)
+
+
+class LocalBroker:
+    """Events for this worker's subscribers only."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, channel, event):
+        self.hub.deliver(channel, event)
+
+    def start(self):
+        pass
+
+
+class CacheBroker:
+    """
+    Events shared by workers through a cache: ``<prefix>:journal:<n>`` holds
+    the n-th event with its channel and publishing worker, ``<prefix>:seq``
+    the last n.
+    """
+
+    # Journal entries outlive any poll interval by far
+    JOURNAL_TTL = 60
+    JOURNAL_BATCH = 500
+    # Entries re-read on every poll: one numbered before the last poll may
+    # only have been stored after it (concurrent publishers)
+    REPLAY = 50
+
+    def __init__(self, hub, alias, poll_seconds=0.5, prefix="events"):
+        self.hub = hub
+        self.cache = caches[alias]
+        self.poll_seconds = poll_seconds
+        self.prefix = prefix
+        # Tells this worker's entries apart
+        self.origin = uuid.uuid4().hex
+        self._marker = None
+        self._seen = deque(maxlen=self.REPLAY * 4)
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def _seq_key(self):
+        return f"{self.prefix}:seq"
+
+    def publish(self, channel, event):
+        self.hub.deliver(channel, event)
+        self.cache.add(self._seq_key(), 0, None)
+        seq = self.cache.incr(self._seq_key())
+        self.cache.set(f"{self.prefix}:journal:{seq}", (self.origin, channel, event), self.JOURNAL_TTL)
+
+    def poll(self):
+        """Deliver the other workers' events journalled since the last poll; returns how many."""
+        seq = self.cache.get(self._seq_key(), 0)
+        if self._marker is None or seq < self._marker:
+            # Nothing read yet, or the cache was flushed and the journal restarted
+            self._marker = seq
+            self._seen.clear()
+            return 0
+        delivered = 0
+        for start in range(max(self._marker - self.REPLAY, 0) + 1, seq + 1, self.JOURNAL_BATCH):
+            numbers = [n for n in range(start, min(start + self.JOURNAL_BATCH, seq + 1)) if n not in self._seen]
+            entries = self.cache.get_many([f"{self.prefix}:journal:{n}" for n in numbers])
+            for n in numbers:
+                entry = entries.get(f"{self.prefix}:journal:{n}")
+                if entry is None:
+                    continue
+                self._seen.append(n)
+                origin, channel, event = entry
+                if origin != self.origin:
+                    self.hub.deliver(channel, event)
+                    delivered += 1
+        self._marker = seq
+        return delivered
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll_loop, name="events-poll", daemon=True)
+                self._thread.start()
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            if not self.hub.has_subscribers():
+                # Nobody to deliver to; a later subscriber starts from then
+                self._marker = None
+                continue
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Could not read events from cache %r", settings.EVENTS_CACHE)
+
+
+def build_broker(hub):
+    if settings.EVENTS_BROKER == "local":
+        return LocalBroker(hub)
+    if settings.EVENTS_BROKER == "cache":
+        return CacheBroker(hub, settings.EVENTS_CACHE, settings.EVENTS_POLL_SECONDS)
+    raise ValueError(f"Unknown EVENTS_BROKER: {settings.EVENTS_BROKER!r}")
+
+
+hub = Hub(settings.EVENTS_QUEUE_SIZE)
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    """This worker's broker, built from settings on first use."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = build_broker(hub)
+    return _broker
+
+
+def publish(channel, event):
+    """Send ``event``, a dict with a ``type``, to the subscribers of ``channel`` everywhere."""
+    event = {**event, "at": int(time.time() * 1000)}
+    try:
+        broker().publish(channel, event)
+    except Exception:
+        # Clients catch up when they next fetch; the write stands
+        logger.exception("Could not publish %s event to %s", event["type"], channel)
+
+
+def publish_on_commit(channel, event):
+    db_transaction.on_commit(lambda: publish(channel, event))
+
+
+def subscribe(channels):
+    """A Subscription of the running event loop to ``channels``; close() it when done."""
+    broker().start()
+    return hub.subscribe(channels)
+
+
+def encode(event):
+    """``event`` as a server-sent event frame."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+@receiver(balance_changed, dispatch_uid="app.events.balance_changed")
+def _on_balance_changed(sender, user, balance, values, **kwargs):
+    event = {"type": "balance", "balance": balance}
+    if values.get("last_spin"):
+        # As the last-spin endpoint reports it
+        event["lastSpinTime"] = values["last_spin"].timestamp() * 1000
+    publish_on_commit(user_channel(user.pk), event)
+
+
+@receiver(post_save, sender=RoundResult, dispatch_uid="app.events.round_settled")
+def _on_round_settled(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        publish_on_commit(user_channel(instance.user_id), {
+            "type": "round",
+            "round": instance.pk,
+            "table": instance.table,
+            "results": instance.results,
+            "wagered": instance.wagered,
+            "payout": instance.payout,
+        })
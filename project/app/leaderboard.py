@@ -0,0 +1,198 @@
+"""
+Materialized leaderboard.
+
+Win transactions are folded into hourly per-user buckets (LeaderboardBucket)
+as they are written, so a ranking only sums the buckets inside the window
+instead of grouping every win transaction. The window starts on the bucket
+boundary at or before ``now - period``, so it may reach up to one bucket
+further back than a timestamp filter would.
+
+Rankings are cached per period for LEADERBOARD_CACHE_SECONDS and a read is a
+single cache hit. Each win also merges the winner's new window totals into
+the cached rankings once the write commits, so they stay current between
+rebuilds; the TTL takes care of buckets ageing out of the window. What a win
+changes in a ranking is pushed to app.events subscribers as a diff.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction as db_transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncHour
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import events
+from .counters import increment
+from .models import LeaderboardBucket, Transaction
+from .signals import ledger_written
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "month": timedelta(days=30),
+}
+BUCKET = timedelta(hours=1)
+
+_CACHE_KEY = "leaderboard:{}"
+
+
+def bucket_start(timestamp):
+    """Start of the hourly bucket ``timestamp`` falls in."""
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def window_start(period, at=None):
+    return bucket_start((at or timezone.now()) - PERIODS[period])
+
+
+def add_win(user_id, amount, timestamp):
+    """Add a win to its bucket (an UPDATE, or an INSERT for a new bucket)."""
+    increment(LeaderboardBucket, {"user_id": user_id, "bucket_start": bucket_start(timestamp)}, {"total": amount})
+
+
+def _ranking(period, limit=None):
+    return (
+        LeaderboardBucket.objects.filter(bucket_start__gte=window_start(period))
+        .values("user__username")
+        .annotate(total_winnings=Sum("total"))
+        .order_by("-total_winnings", "user__username")[:limit or settings.LEADERBOARD_SIZE]
+    )
+
+
+def rank(period, limit=None):
+    """Compute a ranking from the buckets: [{"user__username", "total_winnings"}]."""
+    return list(_ranking(period, limit))
+
+
+def top_winners(period):
+    """Cached ranking for ``period`` ("day", "week" or "month")."""
+    if period not in PERIODS:
+        raise KeyError(period)
+    key = _CACHE_KEY.format(period)
+    ranking = cache.get(key)
+    if ranking is None:
+        ranking = rank(period)
+        cache.set(key, ranking, settings.LEADERBOARD_CACHE_SECONDS)
+    return ranking
+
+
+async def atop_winners(period):
+    """``top_winners`` for async views, through the async cache and ORM APIs."""
+    if period not in PERIODS:
+        raise KeyError(period)
+    key = _CACHE_KEY.format(period)
+    ranking = await cache.aget(key)
+    if ranking is None:
+        ranking = [row async for row in _ranking(period)]
+        await cache.aset(key, ranking, settings.LEADERBOARD_CACHE_SECONDS)
+    return ranking
+
+
+def invalidate():
+    cache.delete_many([_CACHE_KEY.format(period) for period in PERIODS])
+
+
+def rebuild(batch_size=5000):
+    """
+    Recompute every bucket inside the longest window from the win
+    transactions, grouping in the database, and drop older buckets.
+    Returns the number of buckets written.
+    """
+    cutoff = window_start("month")
+    hourly = (
+        # Bounded on both ends, so a partitioned ledger only opens the months in the window
+        Transaction.objects.filter(transaction_type="win", timestamp__range=(cutoff, timezone.now()))
+        .annotate(hour=TruncHour("timestamp", tzinfo=dt_timezone.utc))
+        .values("user_id", "hour")
+        .annotate(hour_total=Sum("amount"))
+        .order_by()
+    )
+    written = 0
+    with db_transaction.atomic():
+        if connection.vendor == "postgresql":
+            # Wins settled meanwhile wait for the rebuild instead of being lost or counted twice
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {LeaderboardBucket._meta.db_table} IN EXCLUSIVE MODE")
+        LeaderboardBucket.objects.all().delete()
+        batch = []
+        for row in hourly.iterator(chunk_size=batch_size):
+            batch.append(LeaderboardBucket(user_id=row["user_id"], bucket_start=row["hour"], total=row["hour_total"]))
+            if len(batch) >= batch_size:
+                written += len(LeaderboardBucket.objects.bulk_create(batch))
+                batch = []
+        written += len(LeaderboardBucket.objects.bulk_create(batch))
+    invalidate()
+    return written
+
+
+def prune():
+    """Delete buckets that no window reaches any more."""
+    return LeaderboardBucket.objects.filter(bucket_start__lt=window_start("month")).delete()[0]
+
+
+def _window_totals(user_id):
+    now = timezone.now()
+    return LeaderboardBucket.objects.filter(
+        user_id=user_id, bucket_start__gte=window_start("month", now)
+    ).aggregate(**{
+        period: Sum("total", filter=Q(bucket_start__gte=window_start(period, now)))
+        for period in PERIODS
+    })
+
+
+def diff(old, new):
+    """
+    The rows of ranking ``new`` that differ from ``old`` as [position, row]
+    pairs, and the length of ``new``: enough to turn ``old`` into ``new``.
+    """
+    changes = [[position, row] for position, row in enumerate(new) if position >= len(old) or old[position] != row]
+    return changes, len(new)
+
+
+def _merge_into_rankings(user_id, username):
+    """Put a winner's current totals into every cached ranking they now make, and push the changes."""
+    totals = _window_totals(user_id)
+    for period in PERIODS:
+        key = _CACHE_KEY.format(period)
+        old = cache.get(key)
+        total = totals[period]
+        if total is None:
+            continue
+        if old is None:
+            # Expired: rebuilt with the win in it, and pushed whole since
+            # subscribers no longer poll it back into the cache
+            old, ranking = [], rank(period)
+        else:
+            ranking = [row for row in old if row["user__username"] != username]
+            ranking.append({"user__username": username, "total_winnings": total})
+            ranking.sort(key=lambda row: (-row["total_winnings"], row["user__username"]))
+            ranking = ranking[:settings.LEADERBOARD_SIZE]
+        cache.set(key, ranking, settings.LEADERBOARD_CACHE_SECONDS)
+        changes, size = diff(old, ranking)
+        if changes or size != len(old):
+            events.publish(events.LEADERBOARD, {"type": "leaderboard", "period": period, "changes": changes, "size": size})
+
+
+@receiver(ledger_written, dispatch_uid="app.leaderboard.ledger_written")
+def _on_ledger_written(sender, transactions, **kwargs):
+    wins = defaultdict(lambda: defaultdict(Decimal))
+    winners = {}
+    for row in transactions:
+        if row.transaction_type == "win":
+            wins[row.user_id][bucket_start(row.timestamp)] += Decimal(str(row.amount))
+            winners[row.user_id] = row.user
+    for user_id, buckets in wins.items():
+        for start, amount in buckets.items():
+            add_win(user_id, amount, start)
+        db_transaction.on_commit(
+            lambda user_id=user_id: _merge_into_rankings(user_id, winners[user_id].username)
+        )
@@ -0,0 +1,174 @@
+"""
+Balance ledger.
+
+Every change to ``CustomUser.balance`` goes through here instead of a
+read-modify-write on the model followed by ``user.save()``. A debit or credit
+is a single conditional UPDATE (``balance = balance + delta``, guarded by
+``balance >= amount`` for debits), so concurrent requests cannot lose each
+other's updates. The matching ``Transaction`` row is inserted in the same
+database transaction, and only the balance column is written.
+
+Callers that settle several things at once (payout, ledger rows, deleting
+the game) wrap them in their own ``transaction.atomic()``; the blocks here
+nest inside it. ``settle`` is the one-shot form for a game round: a single
+balance UPDATE that returns the new balance and a single bulk INSERT of the
+round's rows, without savepoints of its own.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import connection, transaction as db_transaction
+from django.db.models import F
+
+from . import user_cache
+from .models import CustomUser, Transaction
+from .signals import balance_changed, ledger_written
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+
+
+class LedgerError(Exception):
+    """The guarded update did not apply; nothing was written."""
+
+
+class InsufficientFunds(LedgerError):
+    """A debit was larger than the user's balance."""
+
+
+def to_amount(value):
+    """Money value as a Decimal rounded to cents (accepts int, float, str)."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT)
+
+
+def _positive(amount):
+    # A negative debit would be an unguarded credit, and the reverse
+    amount = to_amount(amount)
+    if amount <= 0:
+        raise ValueError(f"Amount must be positive, got {amount}")
+    return amount
+
+
+def record(user, amount, transaction_type, **fields):
+    """Insert a ledger row without touching the balance."""
+    return Transaction.objects.create(user=user, amount=to_amount(amount), transaction_type=transaction_type, **fields)
+
+
+def _apply(user, delta, condition=None, values=None, insufficient=False):
+    users = CustomUser.objects.filter(pk=user.pk)
+    if condition is not None:
+        users = users.filter(condition)
+    if insufficient:
+        users = users.filter(balance__gte=-delta)
+    if not users.update(balance=F("balance") + delta, **(values or {})):
+        if not CustomUser.objects.filter(pk=user.pk).exists():
+            raise CustomUser.DoesNotExist(f"User {user.pk} does not exist")
+        if insufficient:
+            raise InsufficientFunds(f"Balance of user {user.pk} is below {-delta}")
+        raise LedgerError(f"Balance update for user {user.pk} did not match its condition")
+    user_cache.invalidate(user.pk)
+    # Keep the caller's instance in step with the row
+    user.balance = CustomUser.objects.values_list("balance", flat=True).get(pk=user.pk)
+    for name, value in (values or {}).items():
+        setattr(user, name, value)
+    balance_changed.send(sender=CustomUser, user=user, balance=user.balance, values=values or {})
+    return user.balance
+
+
+def debit(user, amount, transaction_type=None, **fields):
+    """
+    Take ``amount`` from ``user``'s balance, recording a ``transaction_type``
+    row when one is given. Raises InsufficientFunds if the balance is too low,
+    ValueError unless ``amount`` is positive. Returns the new balance.
+    """
+    amount = _positive(amount)
+    with db_transaction.atomic():
+        balance = _apply(user, -amount, insufficient=True)
+        if transaction_type:
+            record(user, amount, transaction_type, **fields)
+    logger.debug("Debited %s from user %s, balance %s", amount, user.pk, balance)
+    return balance
+
+
+def credit(user, amount, transaction_type=None, condition=None, values=None, **fields):
+    """
+    Add ``amount`` to ``user``'s balance, recording a ``transaction_type`` row
+    when one is given.
+
+    ``condition`` (a Q object on CustomUser) guards the update and ``values``
+    are extra columns set by the same UPDATE; LedgerError is raised when the
+    condition does not hold, ValueError unless ``amount`` is positive.
+    Returns the new balance.
+    """
+    amount = _positive(amount)
+    with db_transaction.atomic():
+        balance = _apply(user, amount, condition=condition, values=values)
+        if transaction_type:
+            record(user, amount, transaction_type, **fields)
+    logger.debug("Credited %s to user %s, balance %s", amount, user.pk, balance)
+    return balance
+
+
+def _credit_returning(user, delta, values=None):
+    # UPDATE ... RETURNING: the new balance without a second query
+    qn = connection.ops.quote_name
+    meta = CustomUser._meta
+    balance = qn(meta.get_field("balance").column)
+    assignments, params = [f"{balance} = {balance} + %s"], [delta]
+    for name, value in (values or {}).items():
+        field = meta.get_field(name)
+        assignments.append(f"{qn(field.column)} = %s")
+        params.append(field.get_db_prep_save(value, connection))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {qn(meta.db_table)} SET {', '.join(assignments)} "
+            f"WHERE {qn(meta.pk.column)} = %s RETURNING {balance}",
+            [*params, user.pk],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise CustomUser.DoesNotExist(f"User {user.pk} does not exist")
+    user_cache.invalidate(user.pk)
+    user.balance = row[0]
+    for name, value in (values or {}).items():
+        setattr(user, name, value)
+    balance_changed.send(sender=CustomUser, user=user, balance=user.balance, values=values or {})
+    return user.balance
+
+
+def settle(user, amount, rows=(), values=None):
+    """
+    Credit ``amount`` (which may be zero) to ``user`` and insert ``rows``,
+    unsaved Transactions, with one UPDATE and one bulk INSERT. ``values`` are
+    extra columns set by the UPDATE. ledger_written is sent once for all rows.
+
+    Must run inside the caller's atomic block, which owns the rest of the
+    settlement. Returns the new balance.
+    """
+    amount = to_amount(amount)
+    if connection.vendor == "postgresql":
+        balance = _credit_returning(user, amount, values)
+    else:
+        balance = _apply(user, amount, values=values)
+    for row in rows:
+        row.amount = to_amount(row.amount)
+    if rows:
+        # bulk_create skips post_save, so the ledger hook is sent here
+        created = Transaction.objects.bulk_create(rows)
+        ledger_written.send(sender=Transaction, transactions=created)
+    logger.debug("Settled %s to user %s with %d ledger rows, balance %s", amount, user.pk, len(rows), balance)
+    return balance
+
+
+def set_balance(user, amount):
+    """Overwrite the balance (admin adjustments). Returns the new balance."""
+    amount = to_amount(amount)
+    if not CustomUser.objects.filter(pk=user.pk).update(balance=amount):
+        raise CustomUser.DoesNotExist(f"User {user.pk} does not exist")
+    user_cache.invalidate(user.pk)
+    user.balance = amount
+    balance_changed.send(sender=CustomUser, user=user, balance=amount, values={})
+    return amount
@@ -0,0 +1,238 @@
+"""
+Load generator replaying casino sessions against a running server.
+
+Each virtual user is an asyncio task holding one keep-alive HTTP/1.1
+connection, and plays sessions back to back until the run is over. A session
+is what a player does in the frontend: register a fresh account, log in,
+take the daily spin, play ``rounds`` blackjack rounds (deal, hit to 17,
+stand) polling the leaderboard between them, look at their stats and log
+out. Every request is timed under the name of its step, along with its status
+and the ``X-DB-Queries`` header the server sends when QUERY_COUNT_HEADER is
+set (app.middleware).
+
+The client is a minimal HTTP/1.1 one on asyncio streams, so the harness runs
+with the backend's own dependencies. The loadtest command reports the
+recorded samples.
+"""
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from .utils import calculate_hand_value
+
+USER_AGENT = "casino-load/1.0"
+PASSWORD = "Load-pass-2024!"
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return {}
+
+
+class Connection:
+    """One keep-alive connection to ``host:port``, reopened when the server closes it."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        head = [
+            f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"User-Agent: {USER_AGENT}",
+            "Accept: application/json", f"Content-Length: {len(data)}",
+        ]
+        if body is not None:
+            head.append("Content-Type: application/json")
+        if token:
+            head.append(f"Authorization: Bearer {token}")
+        message = ("\r\n".join(head) + "\r\n\r\n").encode() + data
+        try:
+            return await self._exchange(message)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # A keep-alive connection the server dropped between requests
+            self.close()
+            return await self._exchange(message)
+
+    async def _exchange(self, message):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(message)
+        await self._writer.drain()
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by the server")
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunked()
+        elif "content-length" in headers:
+            body = await self._reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self._reader.read()
+            headers["connection"] = "close"
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return Response(int(status_line.split()[1]), headers, body)
+
+    async def _read_chunked(self):
+        body = b""
+        while True:
+            size = int((await self._reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await self._reader.readline()
+                return body
+            body += await self._reader.readexactly(size)
+            await self._reader.readline()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class Recorder:
+    """Durations, statuses and query counts of every request, by step name."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.sessions = 0
+        self.failed_sessions = 0
+
+    def record(self, name, seconds, response):
+        self.durations[name].append(seconds)
+        self.statuses[name][str(response.status) if response else "error"] += 1
+        if response and "x-db-queries" in response.headers:
+            self.queries[name].append(int(response.headers["x-db-queries"]))
+
+
+class RunOver(Exception):
+    """The run's deadline passed; the virtual user stops where it is."""
+
+
+class SessionFailed(Exception):
+    """A step the rest of the session depends on did not succeed."""
+
+
+class VirtualUser:
+    """Plays sessions over one connection, with a random pause of about ``think`` seconds between requests."""
+
+    def __init__(self, index, url, recorder, deadline, rounds=3, bet=10, think=0.0, seed=None):
+        parts = urlsplit(url)
+        self.connection = Connection(parts.hostname, parts.port or 80)
+        self.prefix = parts.path.rstrip("/")
+        self.index = index
+        self.recorder = recorder
+        self.deadline = deadline
+        self.rounds = rounds
+        self.bet = bet
+        self.think = think
+        self.random = random.Random(f"{seed}:{index}")
+        self.token = None
+        self.user_id = None
+
+    async def run(self, sessions=None):
+        played = 0
+        try:
+            while sessions is None or played < sessions:
+                played += 1
+                try:
+                    await self.session()
+                    self.recorder.sessions += 1
+                except SessionFailed:
+                    self.recorder.failed_sessions += 1
+        except RunOver:
+            pass
+        finally:
+            self.connection.close()
+
+    async def call(self, name, method, path, body=None, expect=(200,)):
+        if time.monotonic() >= self.deadline:
+            raise RunOver
+        if self.think:
+            await asyncio.sleep(self.random.uniform(0, 2 * self.think))
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.connection.request(method, self.prefix + path, body, self.token)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.connection.close()
+        self.recorder.record(name, time.perf_counter() - started, response)
+        if response is None or response.status not in expect:
+            raise SessionFailed(name)
+        return response.json()
+
+    async def session(self):
+        username = f"load-{uuid.uuid4().hex[:12]}"
+        self.token = None
+        await self.call("register", "POST", "/register/", {
+            "username": username, "email": f"{username}@load.example.com", "password": PASSWORD,
+        }, expect=(201,))
+        login = await self.call("login", "POST", "/login/", {"username": username, "password": PASSWORD})
+        self.token, self.user_id = login["token"], login["user_id"]
+
+        # The daily spin comes first: a won round also starts the 24 hours
+        await self.call("last_spin", "GET", f"/last-spin/{self.user_id}/")
+        await self.call("spin", "POST", "/update-spin/", {"userId": self.user_id, "amount": 50})
+
+        for _ in range(self.rounds):
+            await self.play_round()
+            await self.call("leaderboard", "GET", f"/leaderboard/{self.random.choice(['day', 'week', 'month'])}/")
+            await self.call("top_winners", "GET", "/top-winners/?period=day")
+
+        await self.call("view_stats", "GET", "/view-stats/me/")
+        await self.call("logout", "POST", "/logout/")
+
+    async def play_round(self):
+        game = await self.call("blackjack_start", "POST", "/blackjack/start/", {"bets": {"spot1": self.bet}}, expect=(201,))
+        hand = game["player_hands"]["spot1"]
+        while calculate_hand_value(hand) < 17:
+            game = await self.call("blackjack_hit", "POST", "/blackjack/action/", {"action": "hit", "hand": "spot1"})
+            if "results" in game:
+                # Busted: the hit settled the round
+                return
+            hand = game["player_hands"]["spot1"]
+        await self.call(
+            "blackjack_stand", "POST", "/blackjack/action/",
+            {"action": "stand", "hand": "spot1", "process_dealer": True},
+        )
+
+
+async def run(url, users, duration, sessions=None, rounds=3, bet=10, think=0.0, ramp=0.0, seed=None):
+    """
+    Play sessions with ``users`` virtual users for ``duration`` seconds, or
+    until each has played ``sessions`` sessions. Virtual users are started
+    evenly over the first ``ramp`` seconds. Returns the Recorder and the
+    wall time of the run.
+    """
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + duration
+
+    async def start(index):
+        await asyncio.sleep(ramp * index / users)
+        user = VirtualUser(index, url, recorder, deadline, rounds=rounds, bet=bet, think=think, seed=seed)
+        await user.run(sessions)
+
+    await asyncio.gather(*(start(index) for index in range(users)))
+    return recorder, time.monotonic() - started
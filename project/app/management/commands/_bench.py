@@ -0,0 +1,52 @@
+"""
+Shared helpers for the bench_* management commands.
+
+Benchmarks that touch the database run inside rolled_back() so they can be
+pointed at a real database without leaving rows behind.
+"""
+import contextlib
+import math
+
+from django.db import transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (pct in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """p50/p95/p99/mean of a list of durations in seconds, reported in ms."""
+    return {
+        "count": len(samples),
+        "mean_ms": (sum(samples) / len(samples) * 1000) if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def format_row(label, stats):
+    return (
+        f"{label:<32} n={stats['count']:<6} mean={stats['mean_ms']:8.3f}ms "
+        f"p50={stats['p50_ms']:8.3f}ms p95={stats['p95_ms']:8.3f}ms p99={stats['p99_ms']:8.3f}ms"
+    )
@@ -0,0 +1,88 @@
+"""
+BlackjackGame row size and bytes written per blackjack_action hit, for games
+dealt from a legacy deck list and from a seeded shoe.
+
+Plays through the Django test client against the configured database, inside
+a transaction that is rolled back:
+
+    python manage.py bench_game_row --rounds 100 2>/dev/null
+"""
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from app.models import BlackjackGame, CustomUser
+from app.shoe import DeckShoe, shoe_pool
+from app.utils import create_deck
+
+from ._bench import format_row, rolled_back, summarize
+
+PASSWORD = "bench-password-123"
+
+
+class Command(BaseCommand):
+    help = "Compare game row size and per-hit write volume for deck-list and seeded shoes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=50, help="Hits measured per shoe kind")
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            client, user = self._login(Client(HTTP_HOST="localhost"))
+            for label, legacy in (("deck list", True), ("seeded shoe", False)):
+                timings, written, row_bytes = [], [], []
+                for _ in range(options["rounds"]):
+                    self._new_game(user, legacy)
+                    row_bytes.append(self._row_size(user))
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        client.post(
+                            reverse("blackjack_action"),
+                            data=json.dumps({"action": "hit", "hand": "spot1"}),
+                            content_type="application/json",
+                        )
+                        timings.append(time.perf_counter() - start)
+                    written.append(sum(len(q["sql"]) for q in queries if q["sql"].startswith("UPDATE")))
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write("  " + format_row("blackjack_action hit", summarize(timings)))
+                self.stdout.write(f"  UPDATE bytes per hit: {sum(written) / len(written):10.0f}")
+                self.stdout.write(f"  stored row bytes:     {sum(row_bytes) / len(row_bytes):10.0f}")
+
+    def _login(self, client):
+        user = CustomUser.objects.create_user(
+            username="bench_game_row",
+            email="bench_game_row@example.com",
+            password=PASSWORD,
+            balance=Decimal("1000000.00"),
+        )
+        response = client.post(
+            reverse("user-login"),
+            data=json.dumps({"email": user.email, "password": PASSWORD}),
+            content_type="application/json",
+        )
+        client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {response.json()['token']}"
+        return client, user
+
+    def _new_game(self, user, legacy):
+        BlackjackGame.objects.filter(user=user).delete()
+        shoe = DeckShoe(create_deck(shoe_pool.decks)) if legacy else shoe_pool.acquire()
+        BlackjackGame.objects.create(
+            user=user,
+            player_hands={"spot1": [[shoe.draw(), shoe.draw()]]},
+            dealer_hand=[shoe.draw(), shoe.draw()],
+            bets={"spot1": 1},
+            current_spot="spot1",
+            **shoe.state(),
+        )
+
+    def _row_size(self, user):
+        game = BlackjackGame.objects.filter(user=user).values(
+            "deck", "player_hands", "dealer_hand", "bets", "shoe_seed"
+        ).get()
+        return sum(len(json.dumps(value)) for value in game.values())
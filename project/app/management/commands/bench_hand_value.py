@@ -0,0 +1,170 @@
+"""
+Micro-benchmark for Blackjack hand evaluation.
+
+Times the pre-table calculate_hand_value (kept below as a reference copy),
+the current utils.calculate_hand_value adapter and the compact evaluator in
+app/cards.py on the same set of realistic hands.
+
+    python manage.py bench_hand_value --hands 2000 --repeat 5
+"""
+import contextlib
+import os
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from app.cards import encode_hand, hand_total
+from app.utils import calculate_hand_value, create_deck
+
+
+def legacy_calculate_hand_value(hand):
+    """Verbatim copy of utils.calculate_hand_value before the table-driven evaluator."""
+    if hand is None:
+        print("WARNING: calculate_hand_value received None as hand")
+        return 0
+
+    if not isinstance(hand, list):
+        print(f"WARNING: calculate_hand_value expected a list, got {type(hand)}")
+        return 0
+
+    print(f"DEBUG: Original hand structure: {hand}")
+
+    flattened_hand = []
+    for item in hand:
+        if isinstance(item, list):
+            flattened_hand.extend(item)
+        else:
+            flattened_hand.append(item)
+
+    print(f"DEBUG: Flattened hand ({len(flattened_hand)} cards): {flattened_hand}")
+
+    value = 0
+    aces = 0
+
+    for card in flattened_hand:
+        if card is None:
+            continue
+
+        if card == 'Hidden':
+            continue
+
+        if isinstance(card, str):
+            if card.startswith('10'):
+                rank = '10'
+            else:
+                rank = card[0]  # First character is the rank
+
+            if rank == 'A':
+                aces += 1
+                value += 11  # Aces start at 11, can be reduced later
+            elif rank in ('K', 'Q', 'J'):
+                value += 10
+            else:
+                try:
+                    value += int(rank)
+                except (ValueError, TypeError):
+                    print(f"WARNING: Unable to parse rank value from {card}")
+
+        elif isinstance(card, dict):
+            if 'rank' in card:
+                rank = card['rank']
+                if rank == 'A':
+                    aces += 1
+                    value += 11  # Aces start at 11, can be reduced later
+                elif rank in ('K', 'Q', 'J'):
+                    value += 10
+                else:
+                    try:
+                        value += int(rank)
+                    except (ValueError, TypeError):
+                        print(f"WARNING: Unable to parse rank value from {card}")
+            elif 'value' in card:
+                card_value = card['value']
+                if card_value == 11 and 'rank' in card and card['rank'] == 'A':
+                    aces += 1
+                    value += 11
+                else:
+                    value += card_value
+            else:
+                print(f"WARNING: Card has no 'rank' or 'value' key: {card}")
+        else:
+            print(f"WARNING: Unrecognized card format: {type(card)} - {card}")
+
+    while value > 21 and aces > 0:
+        value -= 10  # Change one ace from 11 to 1
+        aces -= 1
+        print(f"DEBUG: Adjusted ace value: value is now {value} with {aces} aces remaining")
+
+    print(f"DEBUG: Hand value calculated: {value}")
+    return value
+
+
+def _sample_hands(count, seed):
+    """Hands shaped like the ones stored in BlackjackGame.player_hands."""
+    rng = random.Random(seed)
+    deck = create_deck()
+    hands = []
+    for i in range(count):
+        if len(deck) < 10:
+            deck = create_deck()
+        hand = [deck.pop() for _ in range(rng.choice((2, 2, 3, 3, 4, 5)))]
+        # start_blackjack stores spots nested one level deep
+        hands.append([hand] if i % 2 else hand)
+    return hands
+
+
+class Command(BaseCommand):
+    help = "Benchmark hand evaluation: legacy function vs table-driven evaluator"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hands", type=int, default=2000, help="Number of sample hands")
+        parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        hands = _sample_hands(options["hands"], options["seed"])
+        compact = [encode_hand(hand) for hand in hands]
+
+        mismatches = sum(1 for hand in hands if calculate_hand_value(hand) != _quiet(legacy_calculate_hand_value, hand))
+        if mismatches:
+            self.stderr.write(self.style.ERROR(f"{mismatches} hands evaluate differently from the legacy function"))
+
+        def run_legacy():
+            for hand in hands:
+                legacy_calculate_hand_value(hand)
+
+        def run_adapter():
+            for hand in hands:
+                calculate_hand_value(hand)
+
+        def run_compact():
+            for codes in compact:
+                hand_total(codes)
+
+        # The legacy function prints on every call; send that to /dev/null so
+        # the number reflects formatting cost rather than terminal speed.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            legacy = _best(run_legacy, options["repeat"])
+        adapter = _best(run_adapter, options["repeat"])
+        compact_time = _best(run_compact, options["repeat"])
+
+        count = len(hands)
+        rows = [
+            ("legacy calculate_hand_value", legacy),
+            ("calculate_hand_value (adapter)", adapter),
+            ("cards.hand_total (compact)", compact_time),
+        ]
+        for label, seconds in rows:
+            self.stdout.write(
+                f"{label:<34} {seconds / count * 1e6:8.3f} us/hand   x{legacy / seconds:6.1f} vs legacy"
+            )
+
+
+def _best(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _quiet(func, *args):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return func(*args)
@@ -0,0 +1,107 @@
+"""
+Leaderboard latency against a large synthetic ledger.
+
+Seeds --users users and --transactions win/loss rows spread over the last
+--days days, builds the leaderboard buckets, then times, per period:
+
+  group by     the old GROUP BY over the win transactions in the window
+  buckets      a ranking computed from the hourly buckets (cache miss)
+  cached       leaderboard.top_winners (cache hit)
+  endpoint     GET /api/leaderboard/<period>/ through the test client
+
+Everything runs in a transaction that is rolled back:
+
+    python manage.py bench_leaderboard --transactions 1000000 --users 20000
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from app import leaderboard
+from app.models import CustomUser, Transaction
+
+from ._bench import format_row, rolled_back, summarize
+
+
+class Command(BaseCommand):
+    help = "Benchmark leaderboard reads against a seeded synthetic ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=200000, help="Ledger rows to seed")
+        parser.add_argument("--users", type=int, default=5000, help="Users to spread them over")
+        parser.add_argument("--days", type=int, default=60, help="Age of the oldest seeded row")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed reads per variant and period")
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            started = time.perf_counter()
+            self._seed(options)
+            self.stdout.write(f"Seeded {options['transactions']} rows in {time.perf_counter() - started:.1f}s")
+            started = time.perf_counter()
+            buckets = leaderboard.rebuild()
+            self.stdout.write(f"Built {buckets} buckets in {time.perf_counter() - started:.1f}s")
+
+            client = Client(HTTP_HOST="localhost")
+            for period, window in leaderboard.PERIODS.items():
+                since = timezone.now() - window
+                variants = {
+                    "group by": lambda: list(
+                        Transaction.objects.filter(transaction_type="win", timestamp__gte=since)
+                        .values("user__username")
+                        .annotate(total_winnings=Sum("amount"))
+                        .order_by("-total_winnings")[:10]
+                    ),
+                    "buckets": lambda: leaderboard.rank(period),
+                    "cached": lambda: leaderboard.top_winners(period),
+                    "endpoint": lambda: client.get(reverse("leaderboard", args=[period])),
+                }
+                self.stdout.write(self.style.MIGRATE_HEADING(period))
+                leaderboard.top_winners(period)
+                for label, read in variants.items():
+                    samples = []
+                    for _ in range(options["repeat"]):
+                        start = time.perf_counter()
+                        read()
+                        samples.append(time.perf_counter() - start)
+                    self.stdout.write("  " + format_row(label, summarize(samples)))
+        leaderboard.invalidate()
+        cache.clear()
+
+    def _seed(self, options):
+        rng = random.Random(1)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f"bench_lb_{i}", email=f"bench_lb_{i}@example.com", password="!")
+            for i in range(options["users"])
+        ], batch_size=options["batch_size"])
+        now = timezone.now()
+        span = options["days"] * 86400
+        # timestamp is auto_now_add; switch that off so rows can be backdated
+        field = Transaction._meta.get_field("timestamp")
+        field.auto_now_add = False
+        try:
+            remaining = options["transactions"]
+            while remaining:
+                size = min(remaining, options["batch_size"])
+                Transaction.objects.bulk_create([
+                    Transaction(
+                        user=rng.choice(users),
+                        amount=Decimal(rng.randint(100, 100000)) / 100,
+                        transaction_type="win" if rng.random() < 0.45 else "loss",
+                        payment_method="game",
+                        game_type="blackjack",
+                        timestamp=now - timedelta(seconds=rng.randrange(span)),
+                    )
+                    for _ in range(size)
+                ])
+                remaining -= size
+        finally:
+            field.auto_now_add = True
@@ -0,0 +1,81 @@
+"""
+Request latency with game debug logging on and off.
+
+Plays full rounds (start, hits, stand) through the Django test client against
+the configured database, inside a transaction that is rolled back. Debug
+output goes through the queue handler to stderr, so run it as
+
+    python manage.py bench_logging --rounds 200 2>/dev/null
+"""
+import json
+import logging
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from app.models import CustomUser
+
+from ._bench import format_row, rolled_back, summarize
+
+PASSWORD = "bench-password-123"
+
+
+class Command(BaseCommand):
+    help = "Compare blackjack request latency with app debug logging enabled and disabled"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=100, help="Rounds played per mode")
+        parser.add_argument("--hits", type=int, default=2, help="Hit requests per round before standing")
+
+    def handle(self, *args, **options):
+        app_logger = logging.getLogger("app")
+        original_level = app_logger.level
+        try:
+            with rolled_back():
+                client = self._login(Client(HTTP_HOST="localhost"))
+                for label, level in (("debug off", logging.INFO), ("debug on", logging.DEBUG)):
+                    app_logger.setLevel(level)
+                    timings = self._play(client, options["rounds"], options["hits"])
+                    self.stdout.write(self.style.MIGRATE_HEADING(label))
+                    for endpoint, samples in timings.items():
+                        self.stdout.write("  " + format_row(endpoint, summarize(samples)))
+        finally:
+            app_logger.setLevel(original_level)
+
+    def _login(self, client):
+        user = CustomUser.objects.create_user(
+            username="bench_logging",
+            email="bench_logging@example.com",
+            password=PASSWORD,
+            balance=Decimal("1000000.00"),
+        )
+        response = client.post(
+            reverse("user-login"),
+            data=json.dumps({"email": user.email, "password": PASSWORD}),
+            content_type="application/json",
+        )
+        client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {response.json()['token']}"
+        return client
+
+    def _play(self, client, rounds, hits):
+        timings = defaultdict(list)
+
+        def post(name, payload):
+            start = time.perf_counter()
+            response = client.post(reverse(name), data=json.dumps(payload), content_type="application/json")
+            timings[name].append(time.perf_counter() - start)
+            return response
+
+        for _ in range(rounds):
+            post("blackjack-start", {"bets": {"hand_1": 1}})
+            for _ in range(hits):
+                response = post("blackjack_action", {"action": "hit", "hand": "hand_1"})
+                if "results" in response.json():
+                    break
+            else:
+                post("blackjack_action", {"action": "stand", "hand": "hand_1", "process_dealer": True})
+        return timings
@@ -0,0 +1,72 @@
+"""
+Latency and queries per blackjack round settlement (``process_dealer``).
+
+Deals rounds of --hands hands straight into BlackjackGame rows and settles
+each one by calling process_dealer, timing only the settlement, against the
+configured database inside a transaction that is rolled back:
+
+    python manage.py bench_settlement --rounds 500 --hands 2 2>/dev/null
+
+Run it on either side of a change to process_dealer to compare p50/p99.
+"""
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from app.authentication import issue_token
+from app.blackjack import process_dealer
+from app.models import BlackjackGame, CustomUser
+from app.shoe import shoe_pool
+from app.utils import deal_initial_hands
+
+from ._bench import format_row, rolled_back, summarize
+
+
+class Command(BaseCommand):
+    help = "Measure per-round settlement latency and query count of process_dealer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=200, help="Rounds settled")
+        parser.add_argument("--hands", type=int, default=2, help="Hands dealt per round")
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            user = CustomUser.objects.create_user(
+                username="bench_settlement",
+                email="bench_settlement@example.com",
+                password="bench-password-123",
+                balance=Decimal("1000000.00"),
+            )
+            request = RequestFactory().post(
+                "/blackjack/action/", HTTP_AUTHORIZATION=f"Bearer {issue_token(user)}"
+            )
+            timings, query_counts = [], []
+            for _ in range(options["rounds"]):
+                self._new_game(user, options["hands"])
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = process_dealer(request)
+                    timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    self.stderr.write(f"Settlement failed with status {response.status_code}")
+                    return
+                query_counts.append(len(queries))
+
+        self.stdout.write("  " + format_row(f"settle {options['hands']} hand(s)", summarize(timings)))
+        self.stdout.write(f"  queries per settlement: {sum(query_counts) / len(query_counts):.1f}")
+
+    def _new_game(self, user, hands):
+        shoe = shoe_pool.acquire()
+        player_hands, dealer_hand = deal_initial_hands(shoe, num_hands=hands)
+        BlackjackGame.objects.create(
+            user=user,
+            player_hands=player_hands,
+            dealer_hand=dealer_hand,
+            bets={spot: 10 for spot in player_hands},
+            current_spot=next(iter(player_hands)),
+            **shoe.state(),
+        )
@@ -0,0 +1,138 @@
+"""
+Throughput and latency of a running server under replayed casino sessions.
+
+Starts --users virtual users (app.loadtest) against --url, each playing
+sessions of register, login, --rounds blackjack rounds with leaderboard
+polls, spin, stats and logout, for --duration seconds. Reports requests per
+second, p50/p95/p99 latency and, if the server runs with
+QUERY_COUNT_HEADER=True, database queries per request for every step:
+
+    QUERY_COUNT_HEADER=True gunicorn project.wsgi:application --workers 4
+    python manage.py loadtest --users 50 --duration 60 --output load.json
+    python manage.py loadtest --users 50 --duration 60 --baseline load.json
+
+--output saves the report as JSON (with the commit it ran against), and
+--baseline prints the change in throughput and p95 against a saved report.
+Every session registers a new account, so point it at a disposable database.
+"""
+import asyncio
+import datetime
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import loadtest
+
+from ._bench import summarize
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Replay casino sessions against a running server and report RPS, latency and queries per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/api", help="Base URL of the API")
+        parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds to run for")
+        parser.add_argument("--sessions", type=int, help="Stop each virtual user after this many sessions")
+        parser.add_argument("--rounds", type=int, default=3, help="Blackjack rounds per session")
+        parser.add_argument("--bet", type=int, default=10)
+        parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between a user's requests")
+        parser.add_argument("--ramp", type=float, default=0, help="Seconds over which to start the users")
+        parser.add_argument("--seed", default="0")
+        parser.add_argument("--output", help="Write the report to this JSON file")
+        parser.add_argument("--baseline", help="Compare with a report saved by --output")
+
+    def handle(self, *args, **options):
+        if not options["url"].startswith("http://"):
+            raise CommandError("Only http:// URLs are supported")
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline: {e}")
+
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        recorder, elapsed = asyncio.run(loadtest.run(
+            options["url"], options["users"], options["duration"], sessions=options["sessions"],
+            rounds=options["rounds"], bet=options["bet"], think=options["think_ms"] / 1000,
+            ramp=options["ramp"], seed=options["seed"],
+        ))
+        report = self._report(recorder, elapsed, started_at, options)
+
+        self._print(report, baseline)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def _report(self, recorder, elapsed, started_at, options):
+        endpoints = {}
+        for name, durations in sorted(recorder.durations.items()):
+            queries = recorder.queries.get(name)
+            endpoints[name] = {
+                **summarize(durations),
+                "rps": len(durations) / elapsed,
+                "statuses": dict(recorder.statuses[name]),
+                "queries_mean": sum(queries) / len(queries) if queries else None,
+                "queries_max": max(queries) if queries else None,
+            }
+        every = [d for durations in recorder.durations.values() for d in durations]
+        return {
+            "commit": _commit(),
+            "started_at": started_at.isoformat(),
+            "url": options["url"],
+            "users": options["users"],
+            "rounds": options["rounds"],
+            "think_ms": options["think_ms"],
+            "elapsed_s": elapsed,
+            "sessions": recorder.sessions,
+            "failed_sessions": recorder.failed_sessions,
+            "total": {**summarize(every), "rps": len(every) / elapsed},
+            "endpoints": endpoints,
+        }
+
+    def _print(self, report, baseline):
+        self.stdout.write(
+            f"{report['users']} users for {report['elapsed_s']:.1f}s: {report['sessions']} sessions "
+            f"({report['failed_sessions']} failed), {report['total']['rps']:.1f} req/s"
+        )
+        rows = [("total", report["total"])] + list(report["endpoints"].items())
+        for name, row in rows:
+            queries = row.get("queries_mean")
+            line = (
+                f"  {name:<16} n={row['count']:<7} {row['rps']:8.1f} req/s  p50={row['p50_ms']:8.2f}ms "
+                f"p95={row['p95_ms']:8.2f}ms p99={row['p99_ms']:8.2f}ms"
+                + (f"  queries={queries:.1f}" if queries is not None else "")
+            )
+            errors = {status: n for status, n in row.get("statuses", {}).items() if not status.startswith("2")}
+            if errors:
+                line += f"  errors={errors}"
+            self.stdout.write(line)
+
+        if baseline:
+            self.stdout.write(f"Against {baseline.get('commit') or 'baseline'} ({baseline.get('started_at')}):")
+            before = {"total": baseline["total"], **baseline.get("endpoints", {})}
+            for name, row in rows:
+                if name not in before:
+                    continue
+                old = before[name]
+                self.stdout.write(
+                    f"  {name:<16} req/s {self._change(old['rps'], row['rps'])}  "
+                    f"p95 {self._change(old['p95_ms'], row['p95_ms'])}"
+                )
+
+    @staticmethod
+    def _change(old, new):
+        return f"{old:9.2f} -> {new:9.2f} ({(new - old) / old:+.1%})" if old else f"{old:9.2f} -> {new:9.2f}"
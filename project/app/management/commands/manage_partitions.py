@@ -0,0 +1,52 @@
+"""
+Maintain the monthly partitions of the partitioned tables (app.partitions).
+Run it from cron, e.g. daily:
+
+    python manage.py manage_partitions
+    python manage.py manage_partitions --months-ahead 6 --retain-months 24
+
+Creates PARTITION_MONTHS_AHEAD months after the current one; rows of a month
+with no partition yet land in the default partition and are moved out when
+the month is created. With PARTITION_RETAIN_MONTHS (or --retain-months) set,
+months older than that are detached and left as plain tables named
+``<table>_pYYYYMM`` to dump and drop. Detached ledger months no longer count
+towards rebuild_stats_rollups or user histories.
+
+Does nothing on databases other than PostgreSQL.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from app import partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly partitions and detach expired ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int, default=settings.PARTITION_MONTHS_AHEAD,
+            help="Months to create after the current one",
+        )
+        parser.add_argument(
+            "--retain-months", type=int, default=settings.PARTITION_RETAIN_MONTHS,
+            help="Detach months older than this many months (0 keeps every month)",
+        )
+        parser.add_argument("--table", action="append", help="Only this table (repeatable)")
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported(connection):
+            self.stdout.write(f"Partitioning is not used on {connection.vendor}")
+            return
+        this_month = partitions.month_start(timezone.now())
+        for table, column in partitions.partitioned_tables():
+            if options["table"] and table not in options["table"]:
+                continue
+            created = partitions.ensure_partitions(connection, table, column, options["months_ahead"])
+            self.stdout.write(self.style.SUCCESS(f"{table}: created {len(created)} partitions {' '.join(created)}".rstrip()))
+            if options["retain_months"] > 0:
+                cutoff = partitions.add_months(this_month, -options["retain_months"])
+                detached = partitions.detach_before(connection, table, cutoff)
+                self.stdout.write(self.style.SUCCESS(f"{table}: detached {len(detached)} partitions {' '.join(detached)}".rstrip()))
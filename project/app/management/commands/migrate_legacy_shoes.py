@@ -0,0 +1,67 @@
+"""
+Move BlackjackGame rows that still store their remaining cards in ``deck``
+over to seeded shoes.
+
+Safe to run against a live database: rows are converted in small batches,
+each in its own transaction, and rows locked by an in-flight request are
+skipped and left for the next run. Games keep working while the command
+runs because unconverted rows are still dealt from their deck list.
+
+    python manage.py migrate_legacy_shoes --batch-size 200 --pause 0.5
+
+A converted game deals from a fresh shoe whose cursor is set so the same
+number of cards is left before the cut card.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.cards import CARDS_PER_DECK, MAX_DECKS
+from app.models import BlackjackGame
+from app.shoe import Shoe, shoe_pool
+
+
+def convert(game):
+    """Point ``game`` at a fresh seeded shoe with as many cards left as its deck."""
+    remaining = len(game.deck)
+    decks = min(MAX_DECKS, max(shoe_pool.decks, -(-remaining // CARDS_PER_DECK)))
+    shoe = Shoe.shuffle(decks)
+    shoe.cursor = shoe.size - min(remaining, shoe.size)
+    shoe.store(game)
+    game.deck = []
+
+
+class Command(BaseCommand):
+    help = "Convert blackjack games that store a card list into seeded shoes, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Rows converted per transaction")
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many rows (0 means all)")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        limit = options["limit"]
+        converted = 0
+        last_pk = 0
+        while not limit or converted < limit:
+            size = batch_size if not limit else min(batch_size, limit - converted)
+            with transaction.atomic():
+                games = list(
+                    BlackjackGame.objects.select_for_update(skip_locked=True)
+                    .filter(shoe_seed="", pk__gt=last_pk)
+                    .only("pk", "deck")
+                    .order_by("pk")[:size]
+                )
+                if not games:
+                    break
+                for game in games:
+                    convert(game)
+                BlackjackGame.objects.bulk_update(games, ["deck", "shoe_seed", "shoe_cursor", "shoe_decks"])
+            converted += len(games)
+            last_pk = games[-1].pk
+            self.stdout.write(f"Converted {converted} games (last id {last_pk})")
+            if options["pause"]:
+                time.sleep(options["pause"])
+        self.stdout.write(self.style.SUCCESS(f"Done, {converted} games converted"))
@@ -0,0 +1,17 @@
+"""
+Delete revoked tokens whose TOKEN_REVOCATION_TTL has passed. Run it from
+cron with the database token store; the cache store expires entries itself.
+
+    python manage.py purge_revoked_tokens
+"""
+from django.core.management.base import BaseCommand
+
+from app import token_store
+
+
+class Command(BaseCommand):
+    help = "Delete expired token revocations"
+
+    def handle(self, *args, **options):
+        purged = token_store.purge()
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired token revocations"))
@@ -0,0 +1,29 @@
+"""
+Rebuild the leaderboard buckets from the win transactions, e.g. after the
+buckets were first introduced or after win rows were edited by hand.
+
+    python manage.py rebuild_leaderboard
+    python manage.py rebuild_leaderboard --prune   # cron: drop expired buckets
+
+The rebuild replaces all buckets in one transaction; run it when few games
+are being settled, as wins written meanwhile wait on it.
+"""
+from django.core.management.base import BaseCommand
+
+from app import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or prune) the hourly leaderboard buckets from win transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Buckets inserted per statement")
+        parser.add_argument("--prune", action="store_true", help="Only delete buckets older than the longest window")
+
+    def handle(self, *args, **options):
+        if options["prune"]:
+            deleted = leaderboard.prune()
+            self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} expired buckets"))
+            return
+        written = leaderboard.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} leaderboard buckets"))
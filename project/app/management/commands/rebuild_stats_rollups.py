@@ -0,0 +1,30 @@
+"""
+Rebuild the ledger columns of every UserStatsRollup from the Transaction
+history, e.g. after the rollups were first introduced.
+
+Users are streamed in primary-key order and processed --chunk-size at a
+time: one grouped aggregate and one bulk update per chunk, each chunk in its
+own transaction with the chunk's rollup rows locked, so it can run while
+games are being played.
+
+    python manage.py rebuild_stats_rollups --chunk-size 1000
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from app import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-user stats rollups from the transaction history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Users rebuilt per transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rebuilt = stats.rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats rollups for {rebuilt} users in {time.perf_counter() - started:.1f}s"
+        ))
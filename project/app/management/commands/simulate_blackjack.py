@@ -0,0 +1,81 @@
+"""
+House edge and RTP of the blackjack table by Monte Carlo simulation.
+
+Plays --rounds rounds with a strategy table (a built-in one, or a JSON file of
+"hard"/"soft"/"pairs" rows in the format of app.simulation.BASIC_STRATEGY)
+over a pool of --workers processes, settling every hand with the rules of the
+configured table --table (settings.BLACKJACK_TABLES):
+
+    python manage.py simulate_blackjack --rounds 5000000 --strategy basic
+    python manage.py simulate_blackjack --table vegas-6to5
+    python manage.py simulate_blackjack --strategy-file my_table.json --json
+
+The same --seed and --rounds always give the same figures, so two runs on
+either side of a rule change compare like for like.
+"""
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import rules, simulation
+
+
+class Command(BaseCommand):
+    help = "Simulate blackjack rounds and report RTP, house edge, variance and bust rates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=1000000)
+        parser.add_argument("--strategy", choices=sorted(simulation.STRATEGIES), default="basic")
+        parser.add_argument("--strategy-file", help="JSON strategy table (overrides --strategy)")
+        parser.add_argument("--table", help="Configured table to play at (default: the default table)")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes to play chunks on")
+        parser.add_argument("--seed", default="0")
+        parser.add_argument("--decks", type=int, default=6)
+        parser.add_argument("--penetration", type=float, default=0.75)
+        parser.add_argument("--max-hands", type=int, default=4, help="Hands a round may be split into")
+        parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    def handle(self, *args, **options):
+        strategy = simulation.STRATEGIES[options["strategy"]]
+        if options["strategy_file"]:
+            try:
+                with open(options["strategy_file"]) as f:
+                    strategy = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read strategy file: {e}")
+        if options["table"] and options["table"] not in rules.tables():
+            raise CommandError(f"Unknown table {options['table']!r}; configured: {', '.join(sorted(rules.tables()))}")
+        table = rules.get_table(options["table"])
+
+        started = time.perf_counter()
+        try:
+            tally = simulation.simulate(
+                options["rounds"], strategy, table,
+                seed=options["seed"], workers=options["workers"], decks=options["decks"],
+                penetration=options["penetration"], max_hands=options["max_hands"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        summary = tally.summary()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self.stdout.write(f"{summary['rounds']} rounds, {summary['hands']} hands at {table.name} in {elapsed:.1f}s")
+        self.stdout.write(f"  RTP               {summary['rtp']:.4%}")
+        self.stdout.write(
+            f"  House edge        {summary['house_edge']:.4%} ± {summary['house_edge_ci95']:.4%} (95%, per initial bet)"
+        )
+        self.stdout.write(f"  Variance          {summary['variance']:.4f} (std dev {summary['std_dev']:.4f})")
+        self.stdout.write(
+            f"  Win/loss/push     {summary['win_rate']:.2%} / {summary['loss_rate']:.2%} / {summary['push_rate']:.2%}"
+        )
+        self.stdout.write(f"  Player bust rate  {summary['player_bust_rate']:.2%}")
+        self.stdout.write(f"  Dealer bust rate  {summary['dealer_bust_rate']:.2%}")
+        self.stdout.write(f"  Doubles / splits  {summary['double_rate']:.2%} of hands / {summary['split_rate']:.2%} of rounds")
+        self.stdout.write(
+            f"  Blackjacks        {summary['blackjack_rate']:.2%}, surrendered {summary['surrender_rate']:.2%} of rounds"
+        )
@@ -0,0 +1,301 @@
+"""
+Per-request metrics by URL name, served in the Prometheus text format at
+/metrics/.
+
+app.middleware.MetricsMiddleware measures every request: wall time, database
+queries, time spent in them and response size. Queries are counted by an
+execute wrapper installed on every database connection, which adds to the
+cost of the request whose context it runs in. The cost is held in a
+ContextVar, so the ORM calls async views make through sync_to_async count
+towards their request too.
+
+Observations go to histograms sharded by thread. A thread only ever writes
+to its own shard, so recording a request takes no lock. Each worker process
+writes the sum of its shards to METRICS_DIR/<pid>.json every
+METRICS_FLUSH_SECONDS, and /metrics/ adds up the files of all gunicorn
+workers, taking its own process's figures live. Files of exited workers are
+kept so counts never go down; docker-entrypoint.sh empties the directory
+when the server starts. Without METRICS_DIR a worker serves only its own
+figures.
+
+/metrics/ answers scrapers from the addresses or networks in
+METRICS_ALLOWED_IPS (by default this host only) and requests carrying
+``Authorization: Bearer <METRICS_TOKEN>``; anyone else gets a 403.
+"""
+import atexit
+import contextlib
+import contextvars
+import glob
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "casino_"
+
+# (name, help, upper bounds of the buckets; a +Inf bucket follows)
+HISTOGRAMS = (
+    ("request_duration_seconds", "Wall time of the request.",
+     (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)),
+    ("request_queries", "Database queries made by the request.",
+     (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)),
+    ("request_query_seconds", "Time the request spent in database queries.",
+     (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)),
+    ("response_size_bytes", "Size of the response body.",
+     (100, 1000, 10000, 100000, 1000000)),
+)
+_BOUNDS = [bounds for _, _, bounds in HISTOGRAMS]
+
+
+class RequestCost:
+    """
+    Database queries of one request so far, and the rows their results held
+    where the backend reports it (PostgreSQL does, SQLite does not). With
+    ``trace`` every statement is kept with the stack that ran it, and
+    ``variant`` names the costlier path the request took (set_variant), for
+    app.query_budgets.
+    """
+
+    __slots__ = ("queries", "query_seconds", "rows", "statements", "variant")
+
+    def __init__(self, trace=False):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.statements = [] if trace else None
+        self.variant = None
+
+
+_cost = contextvars.ContextVar("request_cost", default=None)
+
+
+def start_request(trace=False):
+    """Count the queries of the current context into a new RequestCost; returns (cost, token)."""
+    cost = RequestCost(trace)
+    return cost, _cost.set(cost)
+
+
+def end_request(token):
+    _cost.reset(token)
+
+
+def set_variant(name):
+    """Record that the current request took the path ``name`` (e.g. settling a round)."""
+    # The RequestCost is shared with the threads sync_to_async runs views in
+    cost = _cost.get()
+    if cost is not None:
+        cost.variant = name
+
+
+@contextlib.contextmanager
+def uncounted():
+    """
+    Leave the queries run inside out of the current request's cost: upkeep
+    of per-worker state (the revocation filter's sync) that lands on
+    whichever request happens to run when it is due.
+    """
+    token = _cost.set(None)
+    try:
+        yield
+    finally:
+        _cost.reset(token)
+
+
+def _count_query(execute, sql, params, many, context):
+    cost = _cost.get()
+    if cost is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    rows = 0
+    try:
+        result = execute(sql, params, many, context)
+        cursor = context["cursor"]
+        if cursor.description is not None and cursor.rowcount > 0:
+            rows = cursor.rowcount
+        return result
+    finally:
+        cost.queries += 1
+        cost.query_seconds += time.perf_counter() - started
+        cost.rows += rows
+        if cost.statements is not None:
+            # Where each frame is, without reading source lines for them
+            stack = traceback.StackSummary.extract(traceback.walk_stack(sys._getframe(1)), lookup_lines=False)
+            stack.reverse()
+            cost.statements.append((sql, rows, stack))
+
+
+@receiver(connection_created, dispatch_uid="app.metrics.count_queries")
+def _on_connection_created(sender, connection, **kwargs):
+    # A reconnect sends the signal again for the same wrapper object
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _empty_row():
+    return [[0] * (len(bounds) + 1) for bounds in _BOUNDS], [0] * len(_BOUNDS)
+
+
+def _add_row(into, row):
+    counts, sums = into
+    for total, part in zip(counts, row[0]):
+        for i, n in enumerate(part[:len(total)]):
+            total[i] += n
+    for i, value in enumerate(row[1][:len(sums)]):
+        sums[i] += value
+
+
+class Registry:
+    """
+    This process's histograms: per view name, a bucket count list and a sum
+    for each of HISTOGRAMS, in one shard per recording thread.
+    """
+
+    def __init__(self, directory="", flush_seconds=5.0):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._local = threading.local()
+        # Only taken when a thread records its first request
+        self._shards_lock = threading.Lock()
+        self._shards = []
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(settings.METRICS_DIR, settings.METRICS_FLUSH_SECONDS)
+
+    def observe(self, view, duration, queries, query_seconds, size):
+        """Record one request; a ``size`` of None (a streamed body) is left out."""
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        row = shard.get(view)
+        if row is None:
+            row = shard[view] = _empty_row()
+        counts, sums = row
+        for i, value in enumerate((duration, queries, query_seconds, size)):
+            if value is not None:
+                counts[i][bisect_left(_BOUNDS[i], value)] += 1
+                sums[i] += value
+
+    def _new_shard(self):
+        shard = self._local.shard = {}
+        with self._shards_lock:
+            self._shards.append(shard)
+        if self.directory:
+            self._ensure_started()
+        return shard
+
+    def snapshot(self):
+        """{view: (counts, sums)} summed over every thread's shard."""
+        totals = {}
+        for shard in list(self._shards):
+            # list() copies the items without letting another thread in
+            for view, row in list(shard.items()):
+                _add_row(totals.setdefault(view, _empty_row()), row)
+        return totals
+
+    def merged(self):
+        """The snapshot of this process plus the files every other worker wrote."""
+        totals = self.snapshot()
+        if not self.directory:
+            return totals
+        own = os.path.join(self.directory, f"{os.getpid()}.json")
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                # Being replaced right now, or left half written by a crash
+                logger.warning("Skipping unreadable metrics file %s", path)
+                continue
+            for view, row in rows.items():
+                _add_row(totals.setdefault(view, _empty_row()), row)
+        return totals
+
+    def write(self):
+        """Save this process's snapshot to its file in the metrics directory."""
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary, path)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.write)
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.write()
+            except OSError:
+                logger.exception("Could not write metrics to %s", self.directory)
+
+
+def _labels(view, le=None):
+    view = view.replace("\\", "\\\\").replace('"', '\\"')
+    return f'{{view="{view}"}}' if le is None else f'{{view="{view}",le="{le}"}}'
+
+
+def render(totals):
+    """Prometheus text exposition of merged histograms."""
+    lines = []
+    for index, (name, help_text, bounds) in enumerate(HISTOGRAMS):
+        name = PREFIX + name
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for view, (counts, sums) in sorted(totals.items()):
+            cumulative = 0
+            for bound, n in zip(bounds + ("+Inf",), counts[index]):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(view, bound)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(view)} {sums[index]}")
+            lines.append(f"{name}_count{_labels(view)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry.from_settings()
+
+
+def allowed(request):
+    """Whether ``request`` may read the metrics."""
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+@require_GET
+def metrics_view(request):
+    if not allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(registry.merged()), content_type="text/plain; version=0.0.4; charset=utf-8")
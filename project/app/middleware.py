@@ -0,0 +1,73 @@
+"""
+Request middleware of the app.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics, query_budgets
+
+
+class MetricsMiddleware:
+    """
+    Measure every request for app.metrics: wall time, database queries and
+    their time, and response size, under the request's URL name. With
+    QUERY_COUNT_HEADER set, also send the query count in an ``X-DB-Queries``
+    response header, for the loadtest command, and with QUERY_BUDGETS_ENFORCED
+    fail requests over their app.query_budgets budget.
+
+    Listed first in MIDDLEWARE, so the time and queries of the other
+    middleware count too. Runs sync or async, whichever the server does.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    header = "X-DB-Queries"
+
+    def __init__(self, get_response):
+        if not (settings.METRICS_ENABLED or settings.QUERY_COUNT_HEADER or query_budgets.enforced()):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.record = settings.METRICS_ENABLED
+        self.send_header = settings.QUERY_COUNT_HEADER
+        self.check_budgets = query_budgets.enforced()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        cost, token = metrics.start_request(self.check_budgets)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, cost, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        cost, token = metrics.start_request(self.check_budgets)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, cost, started)
+
+    def finish(self, request, response, cost, started):
+        match = request.resolver_match
+        view = (match.url_name or match.route) if match else "unmatched"
+        if self.record:
+            metrics.registry.observe(
+                view, time.perf_counter() - started, cost.queries, cost.query_seconds,
+                None if response.streaming else len(response.content),
+            )
+        if self.check_budgets:
+            query_budgets.check(view, cost)
+        if self.send_header:
+            response[self.header] = str(cost.queries)
+        return response
@@ -0,0 +1,78 @@
+"""
+Migration operations shared by the app's migrations.
+"""
+from django.db import migrations
+from django.db.migrations.operations.base import Operation
+
+from . import partitions
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    AddIndex that builds the index with CREATE INDEX CONCURRENTLY on
+    PostgreSQL, so the table stays writable while a large index builds.
+    Behaves like AddIndex on other databases. The migration using it must set
+    ``atomic = False``.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+    def describe(self):
+        return super().describe() + " (concurrently on PostgreSQL)"
+
+
+class PartitionByMonth(Operation):
+    """
+    Rebuild the table of ``model_name`` as a table range-partitioned by month
+    on ``field_name``, with a default partition and months from its oldest
+    row to a few months ahead (see app.partitions.partition_table). Rows,
+    indexes and foreign keys are kept; the primary key becomes (pk, partition
+    column), as PostgreSQL requires, while the model keeps its single-column
+    pk. A no-op on other databases.
+
+    Reversing it copies the rows back into a plain table.
+    """
+
+    reversible = True
+
+    def __init__(self, model_name, field_name):
+        self.model_name = model_name
+        self.field_name = field_name
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {"model_name": self.model_name, "field_name": self.field_name}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _table(self, schema_editor, model):
+        return model._meta.db_table, model._meta.pk.column, model._meta.get_field(self.field_name).column
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if connection.vendor != "postgresql" or not self.allow_migrate_model(connection.alias, model):
+            return
+        partitions.partition_table(connection, *self._table(schema_editor, model))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if connection.vendor != "postgresql" or not self.allow_migrate_model(connection.alias, model):
+            return
+        partitions.unpartition_table(connection, *self._table(schema_editor, model))
+
+    def describe(self):
+        return f"Partition {self.model_name} by month on {self.field_name} (PostgreSQL)"
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_transaction_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blackjackgame',
+            name='shoe_cursor',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blackjackgame',
+            name='shoe_decks',
+            field=models.PositiveSmallIntegerField(default=6),
+        ),
+        migrations.AddField(
+            model_name='blackjackgame',
+            name='shoe_seed',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_leaderboardbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStatsRollup',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('win_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('win_count', models.PositiveIntegerField(default=0)),
+                ('loss_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('loss_count', models.PositiveIntegerField(default=0)),
+                ('purchase_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchase_count', models.PositiveIntegerField(default=0)),
+                ('bet_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('bet_count', models.PositiveIntegerField(default=0)),
+                ('deposit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deposit_count', models.PositiveIntegerField(default=0)),
+                ('withdrawal_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('withdrawal_count', models.PositiveIntegerField(default=0)),
+                ('rounds_played', models.PositiveIntegerField(default=0)),
+                ('hands_won', models.PositiveIntegerField(default=0)),
+                ('hands_lost', models.PositiveIntegerField(default=0)),
+                ('hands_pushed', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
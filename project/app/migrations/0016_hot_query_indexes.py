@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:23
+
+from django.db import migrations, models
+
+from app.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '0015_userstatsrollup'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='blackjackgame',
+            index=models.Index(fields=['user', 'created_at'], name='bjgame_user_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', 'timestamp'], name='txn_type_timestamp'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'transaction_type'], name='txn_user_type'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'timestamp'], name='txn_user_timestamp'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('transaction_type', 'win')), fields=['timestamp'], name='txn_win_timestamp'),
+        ),
+    ]
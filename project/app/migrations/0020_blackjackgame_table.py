@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_customuser_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blackjackgame',
+            name='surrendered',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='blackjackgame',
+            name='table',
+            field=models.CharField(default='standard', max_length=32),
+        ),
+    ]
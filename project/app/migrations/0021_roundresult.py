@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+from app import partitions
+from app.migration_operations import PartitionByMonth
+
+
+def create_partitions(apps, schema_editor):
+    partitions.ensure_partitions(schema_editor.connection, 'app_roundresult', 'played_at')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_blackjackgame_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoundResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('played_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('table', models.CharField(max_length=32)),
+                ('bets', models.JSONField(default=dict)),
+                ('results', models.JSONField(default=dict)),
+                ('wagered', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('payout', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('shoe_seed', models.CharField(blank=True, default='', max_length=32)),
+                ('shoe_cursor', models.PositiveSmallIntegerField(default=0)),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        PartitionByMonth('roundresult', 'played_at'),
+        migrations.AddIndex(
+            model_name='roundresult',
+            index=models.Index(fields=['user', '-played_at', '-id'], name='round_user_played'),
+        ),
+        migrations.RunPython(create_partitions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from app.migration_operations import PartitionByMonth
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0021_roundresult'),
+    ]
+
+    operations = [
+        # Copies the ledger into monthly partitions under an exclusive lock;
+        # run it during a quiet period on a large ledger
+        PartitionByMonth('transaction', 'timestamp'),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_partition_transaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blackjackgame',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -6,8 +6,6 @@ from decimal import Decimal
 import random
 from uuid import uuid4
 from django.utils import timezone
-from django.db.models import Sum
-from datetime import timedelta
 import json
 from django.contrib.auth import get_user_model
 import logging
@@ -576,41 +574,8 @@ def patched_get_top_winners(period):
                 ]
     
     # Fall back to real implementation for non-test scenarios
-    time_filter = {
-        "day": timezone.now() - timedelta(days=1),
-        "week": timezone.now() - timedelta(weeks=1),
-        "month": timezone.now() - timedelta(days=30),
-    }
-
-    try:
-        # Use the Transaction objects from Django models
-        return list(Transaction.objects.filter(transaction_type="win", timestamp__gte=time_filter[period])
-                   .values("user__username")
-                   .annotate(total_winnings=Sum("amount"))
-                   .order_by("-total_winnings")[:10])
-    except AttributeError:
-        # Fallback for when objects is a list (in mock environment)
-        wins = []
-        for transaction in Transaction.objects.filter(transaction_type="win"):
-            if transaction.timestamp >= time_filter[period]:
-                wins.append(transaction)
-        
-        # Group by username and calculate totals
-        user_totals = {}
-        for win in wins:
-            username = win.user.username
-            if username not in user_totals:
-                user_totals[username] = Decimal('0')
-            user_totals[username] += win.amount
-        
-        # Convert to format expected by tests
-        result = [{'user__username': username, 'total_winnings': total} 
-                 for username, total in user_totals.items()]
-        
-        # Sort by winnings (descending)
-        result.sort(key=lambda x: x['total_winnings'], reverse=True)
-        
-        return result[:10]
+    from .leaderboard import top_winners
+    return top_winners(period)
 
 # Apply the patch
 RealTransaction.get_top_winners = staticmethod(patched_get_top_winners) 
\ No newline at end of file
@@ -1,14 +1,18 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.utils import timezone
-from django.db.models import Sum
-from datetime import timedelta
 from django.utils.timezone import now
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)  # Added balance field
     last_spin = models.DateTimeField(null=True, blank=True)  # Allow null values for first-time users
+    token_version = models.PositiveIntegerField(default=0)  # Bumped to invalidate every issued token
+
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+        if self.pk:
+            # A new password signs the user out everywhere
+            self.token_version += 1
 
     def __str__(self):
         return self.username
@@ -43,33 +47,129 @@ class Transaction(models.Model):
     game_id = models.CharField(max_length=50, null=True, blank=True)
     game_type = models.CharField(max_length=20, null=True, blank=True)
     status = models.CharField(max_length=20, choices=TRANSACTION_STATUS, default="completed")
+
+    class Meta:
+        indexes = [
+            # Leaderboard windows and admin filters by type and date
+            models.Index(fields=["transaction_type", "timestamp"], name="txn_type_timestamp"),
+            # Per-user totals by type (stats rebuilds)
+            models.Index(fields=["user", "transaction_type"], name="txn_user_type"),
+            # A user's history, newest first
+            models.Index(fields=["user", "timestamp"], name="txn_user_timestamp"),
+            # Keyset pages over the whole ledger (admin listing)
+            models.Index(fields=["timestamp", "id"], name="txn_timestamp_id"),
+            # Wins only: the leaderboard rebuild and any win-window scan
+            models.Index(fields=["timestamp"], condition=models.Q(transaction_type="win"), name="txn_win_timestamp"),
+        ]
     
     def __str__(self):
         return f"Transaction {self.id}: {self.user.username} - {self.amount} ({self.transaction_type})"
 
     @staticmethod
     def get_top_winners(period):
-        time_filter = {
-            "day": timezone.now() - timedelta(days=1),
-            "week": timezone.now() - timedelta(weeks=1),
-            "month": timezone.now() - timedelta(days=30),
-        }
-
-        return (
-            Transaction.objects.filter(transaction_type="win", timestamp__gte=time_filter[period])  # ✅ Only count winnings
-            .values("user__username")
-            .annotate(total_winnings=Sum("amount"))
-            .order_by("-total_winnings")[:10]  # ✅ Get top 10 winners
-        )
+        # Served from the materialized leaderboard (hourly win buckets, cached ranking)
+        from .leaderboard import top_winners
+        return top_winners(period)
+
+class UserStatsRollup(models.Model):
+    """Running totals of a user's ledger and rounds; see app.stats."""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    win_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    win_count = models.PositiveIntegerField(default=0)
+    loss_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    loss_count = models.PositiveIntegerField(default=0)
+    purchase_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    purchase_count = models.PositiveIntegerField(default=0)
+    bet_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # game_bet rows
+    bet_count = models.PositiveIntegerField(default=0)
+    deposit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    deposit_count = models.PositiveIntegerField(default=0)
+    withdrawal_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    withdrawal_count = models.PositiveIntegerField(default=0)
+    rounds_played = models.PositiveIntegerField(default=0)
+    hands_won = models.PositiveIntegerField(default=0)
+    hands_lost = models.PositiveIntegerField(default=0)
+    hands_pushed = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Stats for {self.user_id}"
+
+class LeaderboardBucket(models.Model):
+    """Win total of one user for one hour; see app.leaderboard."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    bucket_start = models.DateTimeField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "bucket_start"], name="leaderboard_bucket_user_hour"),
+        ]
+        indexes = [models.Index(fields=["bucket_start"], name="leaderboard_bucket_start")]
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.bucket_start}: {self.total}"
+
+class RevokedToken(models.Model):
+    """A logged-out bearer token, kept until it expires; see app.token_store."""
+    token_hash = models.CharField(max_length=64, unique=True)  # sha256 hex of the token
+    revoked_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.token_hash[:12]}... until {self.expires_at}"
 
 class BlackjackGame(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    deck = models.JSONField(default=list)  # Stores remaining deck
+    deck = models.JSONField(default=list)  # Remaining cards of games started before seeded shoes
+    shoe_seed = models.CharField(max_length=32, blank=True, default="")  # Hex seed of the shoe permutation
+    shoe_cursor = models.PositiveSmallIntegerField(default=0)  # Cards dealt from the shoe so far
+    shoe_decks = models.PositiveSmallIntegerField(default=6)
+    table = models.CharField(max_length=32, default="standard")  # Name in settings.BLACKJACK_TABLES
+    surrendered = models.JSONField(default=list)  # Spots the player surrendered
     player_hands = models.JSONField(default=dict)  # Player hands per betting spot
     dealer_hand = models.JSONField(default=list)  # Dealer's hand
     bets = models.JSONField(default=dict)  # Bet amounts per spot
     current_spot = models.CharField(max_length=20, null=True, blank=True)  # Track current hand
     created_at = models.DateTimeField(default=now)
+    revision = models.PositiveIntegerField(default=0)  # Saves of the live round (app.active_rounds)
+
+    class Meta:
+        indexes = [
+            # The player's current game: filter(user=...).latest("created_at")
+            models.Index(fields=["user", "created_at"], name="bjgame_user_created"),
+        ]
 
     def __str__(self):
-        return f"Blackjack Game - {self.user.username} ({self.created_at})"
\ No newline at end of file
+        return f"Blackjack Game - {self.user.username} ({self.created_at})"
+
+class RoundResult(models.Model):
+    """
+    A settled blackjack round, written by process_dealer as it deletes the
+    game. Append-only; partitioned by month on played_at on PostgreSQL (see
+    app.partitions), so history reads are range scans of recent months.
+    """
+    # The (user, played_at) index covers lookups by user; a foreign key
+    # constraint would cost a check on every insert into the archive
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False, db_constraint=False)
+    played_at = models.DateTimeField(default=now)
+    table = models.CharField(max_length=32)  # Name in settings.BLACKJACK_TABLES
+    bets = models.JSONField(default=dict)  # Stake per spot
+    results = models.JSONField(default=dict)  # app.rules result per spot
+    wagered = models.DecimalField(max_digits=12, decimal_places=2)
+    payout = models.DecimalField(max_digits=12, decimal_places=2)  # Returned to the player, stakes included
+    shoe_seed = models.CharField(max_length=32, blank=True, default="")  # Shoe the round was dealt from
+    shoe_cursor = models.PositiveSmallIntegerField(default=0)  # Cards dealt from the shoe when the round ended
+
+    class Meta:
+        indexes = [
+            # History pages: filter(user=...) newest first on (played_at, id)
+            models.Index(fields=["user", "-played_at", "-id"], name="round_user_played"),
+        ]
+
+    def __str__(self):
+        return f"Round {self.pk} of {self.user_id} at {self.played_at}"
+
+    @property
+    def net(self):
+        return self.payout - self.wagered
@@ -0,0 +1,234 @@
+"""
+Monthly range partitions (PostgreSQL).
+
+Append-only tables that are read by time range are partitioned by month on
+their time column, so a range scan only opens the months it overlaps and the
+hot month stays small. Partitions are named ``<table>_pYYYYMM``. A DEFAULT
+partition (``<table>_default``) takes any row no month covers, so an insert
+never fails for want of a partition; creating the month later moves such
+rows out of it.
+
+``PartitionByMonth`` (app.migration_operations) rebuilds a model's table as
+a partitioned one (``partition_table``). The manage_partitions command, run
+from cron, creates months ahead of time (``ensure_partitions``) and detaches
+months past their retention (``detach_before``); a detached month is left
+as a plain table to archive or drop. Everything here is a no-op on databases
+other than PostgreSQL.
+"""
+import datetime
+import logging
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Months created ahead of the current one when none is given
+MONTHS_AHEAD = 3
+
+# Partitioned models and the column they are partitioned on
+PARTITIONED_MODELS = {
+    "app.RoundResult": "played_at",
+    "app.Transaction": "timestamp",
+}
+
+
+def month_start(moment):
+    """Midnight UTC on the first of ``moment``'s month."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc)
+    return datetime.datetime(moment.year, moment.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(start, months):
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, start):
+    return f"{table}_p{start:%Y%m}"
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def is_supported(connection):
+    return connection.vendor == "postgresql"
+
+
+def list_partitions(connection, table):
+    """{partition name: bound expression} of ``table``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [table],
+        )
+        return dict(cursor.fetchall())
+
+
+def create_default_partition(connection, table):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {qn(default_partition_name(table))} PARTITION OF {qn(table)} DEFAULT")
+
+
+def create_month(connection, table, column, start):
+    """
+    Create the partition of ``table`` for the month beginning ``start``,
+    moving rows of that month out of the default partition. Returns the
+    partition name, or None if it already exists.
+    """
+    name = partition_name(table, start)
+    if name in list_partitions(connection, table):
+        return None
+    qn = connection.ops.quote_name
+    bounds = [start, add_months(start, 1)]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # Build the month as a plain table and attach it: attaching checks the
+        # default partition holds no rows of the month, so move them first.
+        cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(default_partition_name(table))} "
+            f"WHERE {qn(column)} >= %s AND {qn(column)} < %s RETURNING *) "
+            f"INSERT INTO {qn(name)} SELECT * FROM moved",
+            bounds,
+        )
+        if cursor.rowcount:
+            logger.info("Moved %s rows of %s from the default partition", cursor.rowcount, name)
+        cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)", bounds)
+    logger.info("Created partition %s", name)
+    return name
+
+
+def ensure_partitions(connection, table, column, months_ahead=MONTHS_AHEAD, now=None, since=None):
+    """
+    Make sure ``table`` has its default partition and a partition for every
+    month from the current one (or ``since``'s, if earlier) to
+    ``months_ahead`` months ahead. Returns the names of the partitions created.
+    """
+    if not is_supported(connection):
+        return []
+    create_default_partition(connection, table)
+    current = month_start(now or datetime.datetime.now(datetime.timezone.utc))
+    month = min(month_start(since), current) if since else current
+    last = add_months(current, months_ahead)
+    created = []
+    while month <= last:
+        name = create_month(connection, table, column, month)
+        if name:
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def detach_before(connection, table, cutoff):
+    """
+    Detach the monthly partitions of ``table`` that end on or before
+    ``cutoff`` (a month start). They stay in the database as plain tables,
+    without foreign keys. Returns their names.
+    """
+    if not is_supported(connection):
+        return []
+    qn = connection.ops.quote_name
+    prefix = f"{table}_p"
+    detached = []
+    for name in sorted(list_partitions(connection, table)):
+        suffix = name[len(prefix):]
+        if not name.startswith(prefix) or len(suffix) != 6 or not suffix.isdigit():
+            continue
+        start = datetime.datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=datetime.timezone.utc)
+        if add_months(start, 1) > cutoff:
+            continue
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+            # An archived month must not keep the rows it refers to from being deleted
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [qn(name)]
+            )
+            for (constraint,) in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {qn(name)} DROP CONSTRAINT {qn(constraint)}")
+        logger.info("Detached partition %s", name)
+        detached.append(name)
+    return detached
+
+
+def partition_table(connection, table, pk, column, months_ahead=MONTHS_AHEAD):
+    """
+    Rebuild ``table`` as a table range-partitioned by month on ``column``,
+    keeping its rows, indexes, constraints, foreign keys and id sequence.
+    The primary key becomes (``pk``, ``column``), as PostgreSQL requires.
+
+    The rows are copied while the table is locked, inside the caller's
+    transaction: partition a large table during a quiet period.
+    """
+    _rebuild(connection, table, [pk, column], f"PARTITION BY RANGE ({connection.ops.quote_name(column)})",
+             lambda oldest: ensure_partitions(connection, table, column, months_ahead, since=oldest), column)
+
+
+def unpartition_table(connection, table, pk, column):
+    """Rebuild a table partitioned by ``partition_table`` as a plain table."""
+    _rebuild(connection, table, [pk], "", None, column)
+
+
+def _rebuild(connection, table, primary_key, partitioning, prepare, column):
+    qn = connection.ops.quote_name
+    old = f"{table}_rebuilt"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass AND NOT indisprimary",
+            [qn(table)],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [qn(table)],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MIN({qn(column)}) FROM {qn(table)}")
+        (oldest,) = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS) "
+            f"{partitioning}"
+        )
+    if prepare:
+        # Partitions first, so the rows go straight to their month
+        prepare(oldest)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}")
+        logger.info("Copied %s rows into rebuilt %s", cursor.rowcount, table)
+        # Frees the index, constraint and sequence names for the new table
+        # (and drops the partitions of a partitioned one)
+        cursor.execute(f"DROP TABLE {qn(old)}")
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY ({', '.join(qn(name) for name in primary_key)})")
+        pk = primary_key[0]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [qn(table), pk])
+        (sequence,) = cursor.fetchone()
+        if sequence:
+            # The new sequence was named while the old one held the name, and starts at 1
+            cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {qn(f'{table}_{pk}_seq')}")
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({qn(pk)}), 0) + 1, false) FROM {qn(table)}",
+                [qn(table), pk],
+            )
+        for definition in indexes:
+            # Read before the rename, so they name the new table; ON ONLY (a
+            # partitioned parent's index) would leave out its partitions
+            cursor.execute(definition.replace(" ON ONLY ", " ON ", 1))
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+
+def partitioned_tables():
+    """(table, column) of every partitioned model."""
+    from django.apps import apps
+    for label, field_name in PARTITIONED_MODELS.items():
+        model = apps.get_model(label)
+        yield model._meta.db_table, model._meta.get_field(field_name).column
@@ -0,0 +1,182 @@
+"""
+Query budgets: the most queries, and rows fetched, each endpoint may take for
+one request.
+
+BUDGETS holds a budget for every URL name of the app. With
+QUERY_BUDGETS_ENFORCED set (the test runner sets it, see
+app.tests.runner) app.middleware.MetricsMiddleware checks every request
+against the budget of its view and fails it with QueryBudgetExceeded, which
+the test client raises in the test that made the request. The error lists the
+statements grouped by the app call sites that ran them, so an N+1 points at
+its loop.
+
+Rows are what the query results held, counted on backends that report it
+(PostgreSQL); on SQLite only query counts are checked. Queries run under
+app.metrics.uncounted, such as the revocation filter's periodic sync, are
+not charged to the request. A view whose requests take paths of very
+different cost marks the costly one with app.metrics.set_variant, and the
+request is then checked against the ``<URL name>:<variant>`` budget where
+there is one. The budgets fit the requests the test suite
+makes. A test that deliberately makes a bigger one
+raises the budget around it with ``query_budget``:
+
+    @query_budget("admin-users", queries=2, rows=500)
+    def test_user_list_of_a_big_casino(self):
+        ...
+"""
+import collections
+import contextlib
+import os
+
+from django.conf import settings
+
+Budget = collections.namedtuple("Budget", "queries rows")
+
+# URL name -> Budget. Paged lists may fetch a page of up to
+# pagination.MAX_LIMIT rows plus the one that tells there is a next page.
+PAGE = 1010
+BUDGETS = {
+    # User authentication
+    "user-register": Budget(3, 10),
+    "register": Budget(3, 10),
+    "login": Budget(3, 10),
+    "user-login": Budget(3, 10),
+    "user-logout": Budget(3, 10),
+    # User profile and wallet
+    "account-info": Budget(5, 10),
+    "wallet-info": Budget(5, 10),
+    "verify-password": Budget(3, 10),
+    "update_balance": Budget(4, 10),
+    # Transactions
+    "transaction-list": Budget(4, 20),
+    "user-transactions": Budget(3, PAGE),
+    "transaction-create": Budget(12, 10),
+    "transaction-detail": Budget(2, 10),
+    "transaction-status": Budget(1, 10),
+    "top-winners": Budget(5, 20),
+    # Games
+    "game-start": Budget(8, 10),
+    "game-history": Budget(3, PAGE),
+    "game-detail": Budget(2, 10),
+    "available-games": Budget(1, 10),
+    "game-action": Budget(9, 10),
+    "game-action-no-id": Budget(9, 10),
+    "game-config": Budget(2, 10),
+    "game-statistics": Budget(2, 20),
+    # Blackjack
+    "blackjack-start": Budget(7, 10),
+    "blackjack-hit": Budget(2, 10),
+    "blackjack-stand": Budget(11, 10),
+    # A hit that leaves the round open. Right after a ledger write (a start,
+    # a double) it also reloads the user, whose cache entry the write
+    # evicted, and loads the round from its row: 3 queries instead of 1.
+    "blackjack_action": Budget(3, 10),
+    "blackjack-actions": Budget(1, 10),
+    # Double or split: the debit and the round's save, in one transaction
+    "blackjack_action:stake": Budget(9, 10),
+    "blackjack-actions:stake": Budget(8, 10),
+    # The dealer's turn and settlement (play_dealer)
+    "blackjack_action:settle": Budget(12, 10),
+    "blackjack-actions:settle": Budget(10, 10),
+    "blackjack_last_action": Budget(2, 10),
+    "blackjack_reset": Budget(4, 10),
+    # Admin
+    "admin-users": Budget(2, 20),
+    "admin-user-detail": Budget(3, 10),
+    "admin-modify-user": Budget(4, 10),
+    "admin-wallet": Budget(3, 10),
+    "admin-transactions": Budget(3, PAGE),
+    "admin-transactions-filter": Budget(3, PAGE),
+    # Leaderboard, spins and stats
+    "leaderboard": Budget(2, 20),
+    "update-spin": Budget(9, 10),
+    "last-spin": Budget(3, 10),
+    "purchase-coins": Budget(8, 10),
+    "view-stats": Budget(2, 10),
+    "view-stats-me": Budget(2, 10),
+    # Push events
+    "events": Budget(2, 10),
+    # Metrics
+    "metrics": Budget(0, 0),
+}
+
+_overrides = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request took more queries or rows than its endpoint's budget."""
+
+
+def budget_for(view):
+    """The budget of a URL name, None for no limit."""
+    if view in _overrides:
+        return _overrides[view]
+    return BUDGETS.get(view)
+
+
+@contextlib.contextmanager
+def query_budget(view, queries=None, rows=None):
+    """
+    Replace the budget of ``view`` inside the block or decorated test; a
+    limit left as None is not checked.
+    """
+    saved = _overrides.get(view, _overrides)
+    _overrides[view] = Budget(queries, rows)
+    try:
+        yield
+    finally:
+        if saved is _overrides:
+            del _overrides[view]
+        else:
+            _overrides[view] = saved
+
+
+def enforced():
+    return settings.QUERY_BUDGETS_ENFORCED
+
+
+def check(view, cost):
+    """Raise QueryBudgetExceeded if the traced RequestCost ``cost`` is over the budget of ``view``."""
+    if cost.variant is not None and budget_for(f"{view}:{cost.variant}") is not None:
+        view = f"{view}:{cost.variant}"
+    budget = budget_for(view)
+    if budget is None:
+        return
+    over = []
+    if budget.queries is not None and cost.queries > budget.queries:
+        over.append(f"{cost.queries} queries (budget {budget.queries})")
+    if budget.rows is not None and cost.rows > budget.rows:
+        over.append(f"{cost.rows} rows (budget {budget.rows})")
+    if over:
+        raise QueryBudgetExceeded(f"{view} took {' and '.join(over)}\n{report(cost.statements)}")
+
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIPPED = {os.path.join(_APP_DIR, name) for name in ("metrics.py", "middleware.py", "query_budgets.py")}
+
+
+def _call_sites(stack):
+    # The app's own frames; the ORM's and Django's only say which query ran
+    frames = [
+        frame for frame in stack
+        if frame.filename.startswith(_APP_DIR) and frame.filename not in _SKIPPED
+    ]
+    return tuple(
+        f"{os.path.relpath(frame.filename, os.path.dirname(_APP_DIR))}:{frame.lineno} in {frame.name}"
+        for frame in frames or stack[-3:]
+    )
+
+
+def report(statements):
+    """The statements of a request grouped by the call sites that ran them, most frequent first."""
+    groups = collections.OrderedDict()
+    for sql, rows, stack in statements:
+        groups.setdefault(_call_sites(stack), []).append((sql, rows))
+    lines = []
+    for sites, queries in sorted(groups.items(), key=lambda item: -len(item[1])):
+        rows = sum(n for _, n in queries)
+        lines.append(f"{len(queries)} queries, {rows} rows from:")
+        lines.extend(f"    {site}" for site in sites)
+        for sql in dict.fromkeys(sql for sql, _ in queries):
+            lines.append(f"  {sql if len(sql) <= 300 else sql[:300] + '...'}")
+    return "\n".join(lines)
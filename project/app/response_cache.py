@@ -0,0 +1,326 @@
+"""
+Response cache for read endpoints whose payload is the same for every caller.
+
+``cached_response`` wraps a view (sync or async; below DRF's decorators, so
+authentication and permissions still run on every request). A 200 response
+is kept for the endpoint's ``ttl`` in two tiers:
+
+- a per-worker LRU of RESPONSE_CACHE_LOCAL_SIZE entries;
+- the RESPONSE_CACHE alias, read on a local miss.
+
+A miss is computed once: other requests for the same key in this worker wait
+for it, and other workers wait up to RESPONSE_CACHE_LOCK_SECONDS for the
+worker holding the key's lock in the shared cache before computing it
+themselves.
+
+Each endpoint's keys carry a generation token kept in the shared cache. An
+endpoint declared ``invalidated_by`` some transaction types gets a new token
+once a write of such Transaction rows commits, which orphans every response
+cached for it. Other endpoints only expire. Workers keep the tokens they
+read for RESPONSE_CACHE_GENERATION_SECONDS, so a local hit makes no round
+trip at all, and another worker's invalidation reaches them within that
+time; this worker's own invalidations apply at once.
+
+The alias is only shared by workers if its backend is (redis, memcached).
+With the default locmem backend every worker has its own entries, locks and
+tokens: a miss is computed once per worker, and a commit invalidates the
+responses of the worker that made it only, the others serving theirs until
+they expire.
+
+Cached responses carry an ETag of their content, answer a matching
+If-None-Match with 304, and tell downstream caches (nginx) they may keep
+them for ``max_age`` seconds.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+# Imported first so its ledger_written receiver, and the ranking merge it
+# defers to commit, run before the invalidation: a response recomputed in
+# between would cache the old ranking
+from . import leaderboard  # noqa: F401
+from .signals import ledger_written
+
+# ``data`` for DRF Responses (rendered per request, as content negotiation
+# decides), ``content`` bytes for plain HttpResponses; ``expires`` is a
+# time.time(), so a worker copying an entry from the shared cache keeps it
+# no longer than the shared cache does
+Entry = namedtuple("Entry", "status data content content_type etag expires")
+
+# Polls of the shared cache while another worker computes a response
+_LOCK_POLL = 0.05
+
+
+class LocalCache:
+    """Thread-safe LRU of entries with a time-to-live."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires = item
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        ttl = entry.expires - time.time()
+        if self.size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local = LocalCache(settings.RESPONSE_CACHE_LOCAL_SIZE)
+# Endpoint name -> transaction types that invalidate it
+_dependencies = defaultdict(set)
+# Endpoint name -> (generation token, time.monotonic() it was read)
+_generations = {}
+# Single flight: key -> [lock of the thread computing it, threads holding or
+# waiting for it] (sync views) or future of the request computing it (async
+# views)
+_flights = {}
+_flights_lock = threading.Lock()
+_aflights = {}
+
+
+def shared():
+    return caches[settings.RESPONSE_CACHE]
+
+
+def _generation_key(name):
+    return f"response:{name}:generation"
+
+
+def _held_generation(name):
+    held = _generations.get(name)
+    if held is not None and time.monotonic() - held[1] < settings.RESPONSE_CACHE_GENERATION_SECONDS:
+        return held[0]
+    return None
+
+
+def generation(name):
+    """The generation token of endpoint ``name``, as this worker last read it."""
+    token = _held_generation(name)
+    if token is not None:
+        return token
+    key = _generation_key(name)
+    token = shared().get(key)
+    if token is None:
+        # Concurrent first requests agree on whichever token was added first
+        shared().add(key, uuid.uuid4().hex, None)
+        token = shared().get(key)
+    _generations[name] = (token, time.monotonic())
+    return token
+
+
+async def ageneration(name):
+    token = _held_generation(name)
+    if token is not None:
+        return token
+    key = _generation_key(name)
+    token = await shared().aget(key)
+    if token is None:
+        await shared().aadd(key, uuid.uuid4().hex, None)
+        token = await shared().aget(key)
+    _generations[name] = (token, time.monotonic())
+    return token
+
+
+def invalidate(name):
+    """
+    Drop every response cached for endpoint ``name``: in this worker at once,
+    in the others sharing the RESPONSE_CACHE alias once their token is due.
+    """
+    token = uuid.uuid4().hex
+    shared().set(_generation_key(name), token, None)
+    _generations[name] = (token, time.monotonic())
+
+
+def _key(name, token, request, vary, flavor):
+    varies = "\n".join(request.META.get(header, "") for header in vary)
+    digest = hashlib.md5(f"{request.get_full_path()}\n{varies}".encode()).hexdigest()
+    # Sync (DRF) and async namesakes cache different entries for the same path
+    return f"response:{name}:{flavor}:{token}:{digest}"
+
+
+def _entry(response, ttl):
+    """The cacheable Entry of ``response``, or None."""
+    if response.status_code != 200 or getattr(response, "streaming", False):
+        return None
+    if isinstance(response, Response):
+        content = json.dumps(response.data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+        data, content_type = response.data, None
+    else:
+        content, data, content_type = response.content, None, response["Content-Type"]
+    return Entry(200, data, content, content_type, quote_etag(hashlib.md5(content).hexdigest()), time.time() + ttl)
+
+
+def _respond(request, entry, max_age, public, vary):
+    if entry.etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponseNotModified()
+    elif entry.data is not None:
+        response = Response(entry.data, status=entry.status)
+    else:
+        response = HttpResponse(entry.content, content_type=entry.content_type, status=entry.status)
+    response["ETag"] = entry.etag
+    response["Cache-Control"] = f"{'public' if public else 'private'}, max-age={max_age}"
+    patch_vary_headers(response, [header[5:].replace("_", "-").title() for header in vary])
+    return response
+
+
+def _get_or_compute(key, ttl, compute):
+    with _flights_lock:
+        flight = _flights.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0]:
+            # Whoever held the flight may have cached it meanwhile
+            entry = shared().get(key)
+            if entry is not None:
+                return entry, None
+            lock_key = f"{key}:lock"
+            deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_SECONDS
+            locked = shared().add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_SECONDS)
+            while not locked and time.monotonic() < deadline:
+                # Another worker is computing it
+                time.sleep(_LOCK_POLL)
+                entry = shared().get(key)
+                if entry is not None:
+                    return entry, None
+                locked = shared().add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_SECONDS)
+            try:
+                response = compute()
+                entry = _entry(response, ttl)
+                if entry is not None:
+                    shared().set(key, entry, ttl)
+                return entry, response
+            finally:
+                if locked:
+                    shared().delete(lock_key)
+    finally:
+        # The last thread out drops the flight; one arriving before that
+        # still queues on its lock
+        with _flights_lock:
+            flight[1] -= 1
+            if not flight[1]:
+                del _flights[key]
+
+
+async def _aget_or_compute(key, ttl, compute):
+    flight = _aflights.get(key)
+    if flight is not None:
+        # The computing request hands over its entry (None if not cacheable)
+        entry = await asyncio.shield(flight)
+        if entry is not None:
+            return entry, None
+        return None, await compute()
+    flight = _aflights[key] = asyncio.get_running_loop().create_future()
+    entry = None
+    try:
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_SECONDS
+        locked = await shared().aadd(lock_key, 1, settings.RESPONSE_CACHE_LOCK_SECONDS)
+        while not locked and time.monotonic() < deadline:
+            await asyncio.sleep(_LOCK_POLL)
+            entry = await shared().aget(key)
+            if entry is not None:
+                return entry, None
+            locked = await shared().aadd(lock_key, 1, settings.RESPONSE_CACHE_LOCK_SECONDS)
+        try:
+            response = await compute()
+            entry = _entry(response, ttl)
+            if entry is not None:
+                await shared().aset(key, entry, ttl)
+            return entry, response
+        finally:
+            if locked:
+                await shared().adelete(lock_key)
+    finally:
+        del _aflights[key]
+        flight.set_result(entry)
+
+
+def cached_response(name, ttl, max_age=None, public=True, vary=(), invalidated_by=()):
+    """
+    Cache the 200 responses of a view for ``ttl`` seconds under endpoint
+    ``name``, keyed by path and query string plus the request headers
+    (META names) in ``vary``. ``max_age`` (default ``ttl``) goes in
+    Cache-Control, ``public`` unless the endpoint needs authentication.
+    Writes of Transaction rows of a type in ``invalidated_by`` invalidate it.
+    """
+    max_age = ttl if max_age is None else max_age
+    _dependencies[name].update(invalidated_by)
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not settings.RESPONSE_CACHE_ENABLED or request.method != "GET":
+                    return await view(request, *args, **kwargs)
+                key = _key(name, await ageneration(name), request, vary, "async")
+                entry = local.get(key)
+                if entry is None:
+                    entry = await shared().aget(key)
+                    if entry is None:
+                        entry, response = await _aget_or_compute(key, ttl, lambda: view(request, *args, **kwargs))
+                        if entry is None:
+                            return response
+                    local.put(key, entry)
+                return _respond(request, entry, max_age, public, vary)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE_ENABLED or request.method != "GET":
+                return view(request, *args, **kwargs)
+            key = _key(name, generation(name), request, vary, "sync")
+            entry = local.get(key)
+            if entry is None:
+                entry = shared().get(key)
+                if entry is None:
+                    entry, response = _get_or_compute(key, ttl, lambda: view(request, *args, **kwargs))
+                    if entry is None:
+                        return response
+                local.put(key, entry)
+            return _respond(request, entry, max_age, public, vary)
+        return wrapper
+    return decorator
+
+
+@receiver(ledger_written, dispatch_uid="app.response_cache.ledger_written")
+def _on_ledger_written(sender, transactions, **kwargs):
+    types = {row.transaction_type for row in transactions}
+    for name, dependencies in _dependencies.items():
+        if dependencies & types:
+            db_transaction.on_commit(lambda name=name: invalidate(name))
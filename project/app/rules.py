@@ -0,0 +1,148 @@
+"""
+Blackjack table rules.
+
+A ``TableRules`` describes one table variant: whether the dealer hits soft
+17, what a natural pays, double after split and late surrender. It is
+compiled once into lookup tables, a dealer decision per hand state (see
+app.cards) and a return per result, so settling a hand is two lookups and no
+request ever parses rules.
+
+Tables are named in settings.BLACKJACK_TABLES and built once per process
+(``tables()``, called from AppConfig.ready so a bad table fails at startup).
+Each game remembers its table; the live game (``blackjack.process_dealer``,
+``views.blackjack_stand``, ``views.blackjack_action``) and the offline
+simulator (``app.simulation``) settle through the same object, so a rule
+change is measured by the simulator before it ships.
+
+There is no hole-card peek: a dealer natural is only revealed at settlement.
+"""
+from decimal import Decimal
+
+from .cards import MAX_TABLE_HARD, state_is_soft, state_total
+from .ledger import to_amount
+
+DEALER_STANDS_ON = 17
+
+BUST = "bust"
+WIN = "win"
+BLACKJACK = "blackjack"
+LOSS = "loss"
+PUSH = "push"
+SURRENDER = "surrender"
+
+
+def parse_ratio(ratio):
+    """'3:2' -> Decimal('1.5')"""
+    try:
+        numerator, denominator = (Decimal(part) for part in str(ratio).split(":"))
+        return numerator / denominator
+    except (ArithmeticError, ValueError):
+        raise ValueError(f"Invalid payout ratio: {ratio!r}")
+
+
+class TableRules:
+    """One table variant, compiled to lookup tables."""
+
+    def __init__(self, name="standard", dealer_hits_soft_17=False, blackjack_pays="3:2",
+                 double_after_split=True, surrender=True, min_bet="5.00", max_bet="500.00"):
+        self.name = name
+        self.dealer_hits_soft_17 = dealer_hits_soft_17
+        self.blackjack_pays = blackjack_pays
+        self.blackjack_ratio = parse_ratio(blackjack_pays)
+        self.double_after_split = double_after_split
+        self.surrender = surrender
+        self.min_bet = Decimal(min_bet)
+        self.max_bet = Decimal(max_bet)
+
+        # Dealer decision for every table state; larger states are hard busts
+        self._dealer_hits = tuple(
+            state_total(state) < DEALER_STANDS_ON
+            or (dealer_hits_soft_17 and state_total(state) == DEALER_STANDS_ON and state_is_soft(state))
+            for state in range((MAX_TABLE_HARD + 1) * 2)
+        )
+        # Amount returned per unit staked, stake included
+        self.returns = {
+            BUST: 0,
+            LOSS: 0,
+            PUSH: 1,
+            WIN: 2,
+            BLACKJACK: 1 + self.blackjack_ratio,
+            SURRENDER: Decimal("0.5"),
+        }
+        # For the simulator's float arithmetic
+        self.float_returns = {result: float(value) for result, value in self.returns.items()}
+
+    def __repr__(self):
+        return f"<TableRules {self.name}>"
+
+    def dealer_hits(self, state):
+        """Whether the dealer draws to the hand state ``state``."""
+        return state < len(self._dealer_hits) and self._dealer_hits[state]
+
+    def outcome(self, player_total, dealer_total, player_natural=False, dealer_natural=False, surrendered=False):
+        """Result of a player hand against the dealer's final hand."""
+        if surrendered:
+            return SURRENDER
+        if player_total > 21:
+            return BUST
+        if player_natural:
+            return PUSH if dealer_natural else BLACKJACK
+        if dealer_natural:
+            return LOSS
+        if dealer_total > 21 or player_total > dealer_total:
+            return WIN
+        if player_total < dealer_total:
+            return LOSS
+        return PUSH
+
+    def payout(self, result, bet):
+        """
+        What the player gets back for ``bet`` on a hand that ended in
+        ``result``, as a Decimal whatever type the bet was stored as.
+        """
+        return to_amount(bet) * self.returns[result]
+
+    def describe(self):
+        """The rules as the game_config endpoint reports them."""
+        return {
+            "min_bet": str(self.min_bet),
+            "max_bet": str(self.max_bet),
+            "blackjack_payout": float(self.blackjack_ratio),
+            "blackjack_payout_ratio": self.blackjack_pays,
+            "dealer_hits_soft_17": self.dealer_hits_soft_17,
+            "double_after_split": self.double_after_split,
+            "surrender": self.surrender,
+        }
+
+
+def is_natural(card_count, total, from_split=False):
+    """A two-card 21 dealt as such (a split hand reaching 21 is not one)."""
+    return card_count == 2 and total == 21 and not from_split
+
+
+def stats_outcome(result):
+    """The result as counted by the stats rollup."""
+    if result == BLACKJACK:
+        return WIN
+    if result in (BUST, SURRENDER):
+        return LOSS
+    return result
+
+
+_tables = None
+
+
+def tables():
+    """Every configured table by name, built on first use."""
+    global _tables
+    if _tables is None:
+        from django.conf import settings
+        _tables = {name: TableRules(name, **options) for name, options in settings.BLACKJACK_TABLES.items()}
+    return _tables
+
+
+def get_table(name=None):
+    """The table called ``name``; the default table for None or a name no longer configured."""
+    from django.conf import settings
+    configured = tables()
+    return configured.get(name) or configured[settings.BLACKJACK_DEFAULT_TABLE]
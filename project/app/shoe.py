@@ -0,0 +1,238 @@
+"""
+Blackjack shoe service.
+
+A shoe is a random seed plus a draw cursor. The card at each position of the
+shoe is computed on demand from the seed with a keyed permutation, so a
+BlackjackGame row stores a few bytes instead of the remaining cards, and any
+round can be replayed for an audit from the seed alone.
+
+Each worker keeps a small pool of shoes ready to deal, topped up by a
+background thread. A shoe also carries a cut card: after a round settles,
+whatever is left of the shoe goes back to the pool and keeps dealing rounds
+until the cut card comes out.
+
+Pool size, refill rate, deck count and penetration come from the
+BLACKJACK_SHOE_* settings.
+"""
+import collections
+import hashlib
+import logging
+import secrets
+import threading
+import time
+
+from django.conf import settings
+
+from .cards import CARDS_PER_DECK, MAX_DECKS, to_legacy
+
+logger = logging.getLogger(__name__)
+
+SEED_BYTES = 16
+
+# Feistel rounds; small domains need more than the textbook four
+_ROUNDS = 8
+
+
+def _half_bits(domain):
+    """Smallest half width so that a 2*half bit block covers ``domain``."""
+    half = 1
+    while 1 << (2 * half) < domain:
+        half += 1
+    return half
+
+
+class Shoe:
+    """
+    A shuffled shoe of ``decks`` decks identified by ``seed``.
+
+    Position ``i`` of the shoe holds the card code ``permute(seed, i)``: a
+    balanced Feistel network keyed with the seed (BLAKE2b as the round
+    function), cycle-walked down to the size of the shoe. ``cursor`` is the
+    number of cards dealt so far.
+    """
+
+    def __init__(self, seed, cursor=0, decks=6, cut_card=0):
+        if not 1 <= decks <= MAX_DECKS:
+            raise ValueError(f"A shoe holds 1 to {MAX_DECKS} decks, not {decks}")
+        self.seed = seed
+        self.cursor = cursor
+        self.decks = decks
+        # Number of cards left when the cut card comes out
+        self.cut_card = cut_card
+        self.size = decks * CARDS_PER_DECK
+        self._half = _half_bits(self.size)
+        self._mask = (1 << self._half) - 1
+        self._prf = hashlib.blake2b(key=bytes.fromhex(seed), digest_size=4)
+
+    @classmethod
+    def shuffle(cls, decks=6, cut_card=0):
+        """A new shoe with a fresh seed from the OS CSPRNG."""
+        return cls(secrets.token_hex(SEED_BYTES), 0, decks, cut_card)
+
+    def __len__(self):
+        return self.size - self.cursor
+
+    def code_at(self, position):
+        """Card code at ``position`` (0-based) of the shuffled shoe."""
+        if not 0 <= position < self.size:
+            raise IndexError("shoe position out of range")
+        half, mask = self._half, self._mask
+        block = position
+        while True:
+            left, right = block >> half, block & mask
+            for round_ in range(_ROUNDS):
+                prf = self._prf.copy()
+                prf.update(bytes((round_, right >> 8, right & 0xFF)))
+                left, right = right, left ^ (int.from_bytes(prf.digest(), "big") & mask)
+            block = left << half | right
+            # Cycle walking keeps the result a permutation of range(size)
+            if block < self.size:
+                return block
+
+    def draw_code(self):
+        if self.cursor >= self.size:
+            raise IndexError("draw from an empty shoe")
+        code = self.code_at(self.cursor)
+        self.cursor += 1
+        return code
+
+    def draw(self):
+        """Deal the next card in the dict form stored on games."""
+        return to_legacy(self.draw_code())
+
+    def dealt(self):
+        """Every card dealt so far, in order, for audits and replays."""
+        return [to_legacy(self.code_at(position)) for position in range(self.cursor)]
+
+    @property
+    def needs_shuffle(self):
+        return len(self) <= self.cut_card
+
+    def state(self):
+        """BlackjackGame field values describing this shoe."""
+        return {"shoe_seed": self.seed, "shoe_cursor": self.cursor, "shoe_decks": self.decks}
+
+    def store(self, game):
+        """Copy the shoe onto ``game``; returns the fields to save."""
+        state = self.state()
+        for field, value in state.items():
+            setattr(game, field, value)
+        return list(state)
+
+
+class DeckShoe:
+    """
+    The remaining cards of a game stored before seeded shoes, as a list in
+    BlackjackGame.deck; cards are drawn from the end.
+    """
+
+    def __init__(self, cards, cut_card=0):
+        self.cards = cards
+        self.cut_card = cut_card
+
+    def __len__(self):
+        return len(self.cards)
+
+    def draw(self):
+        return self.cards.pop()
+
+    @property
+    def needs_shuffle(self):
+        return len(self.cards) <= self.cut_card
+
+    def state(self):
+        return {"deck": self.cards}
+
+    def store(self, game):
+        game.deck = self.cards
+        return ["deck"]
+
+
+class ShoePool:
+    """
+    Per-process pool of shoes ready to deal.
+
+    ``acquire`` hands out a partly dealt shoe if one is open, otherwise a
+    fresh one from the pool, and only creates one inline when the pool has
+    run dry. The refill thread is started on first use so management commands
+    and migrations never spawn it.
+    """
+
+    def __init__(self, size=16, refill_rate=50.0, decks=6, penetration=0.75):
+        self.size = size
+        self.refill_rate = refill_rate
+        self.decks = decks
+        self.penetration = penetration
+        self.cut_card = self.cut_card_for(decks)
+        self._fresh = collections.deque()
+        self._open = collections.deque()
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            size=settings.BLACKJACK_SHOE_POOL_SIZE,
+            refill_rate=settings.BLACKJACK_SHOE_REFILL_RATE,
+            decks=settings.BLACKJACK_SHOE_DECKS,
+            penetration=settings.BLACKJACK_SHOE_PENETRATION,
+        )
+
+    def cut_card_for(self, decks):
+        return int(decks * CARDS_PER_DECK * (1 - self.penetration))
+
+    def build(self):
+        """A brand new shoe."""
+        return Shoe.shuffle(self.decks, self.cut_card)
+
+    def acquire(self):
+        """Return a shoe to deal a new round from."""
+        self._ensure_started()
+        try:
+            return self._open.popleft()
+        except IndexError:
+            pass
+        try:
+            shoe = self._fresh.popleft()
+        except IndexError:
+            logger.debug("Shoe pool empty, building inline")
+            shoe = self.build()
+        self._wake.set()
+        return shoe
+
+    def load(self, game):
+        """The shoe a stored BlackjackGame is dealing from."""
+        if game.shoe_seed:
+            return Shoe(game.shoe_seed, game.shoe_cursor, game.shoe_decks, self.cut_card_for(game.shoe_decks))
+        return DeckShoe(game.deck, self.cut_card)
+
+    def release(self, shoe):
+        """
+        Hand back what is left of a shoe after a round has settled. Legacy
+        deck shoes are retired so new games only ever store a seed.
+        """
+        if isinstance(shoe, Shoe) and not shoe.needs_shuffle and len(self._open) < self.size:
+            self._open.append(shoe)
+
+    def _ensure_started(self):
+        # A zero size or refill rate turns the background refill off
+        if self._thread is not None or self.size <= 0 or self.refill_rate <= 0:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refill_loop, name="shoe-pool-refill", daemon=True)
+                self._thread.start()
+
+    def _refill_loop(self):
+        interval = 1.0 / self.refill_rate
+        while True:
+            self._wake.clear()
+            while len(self._fresh) < self.size:
+                self._fresh.append(self.build())
+                # Caps how much CPU the refill can take from requests
+                time.sleep(interval)
+            self._wake.wait()
+
+
+shoe_pool = ShoePool.from_settings()
@@ -0,0 +1,26 @@
+"""
+App signals.
+
+``ledger_written`` fires after Transaction rows are inserted, with the rows
+as ``transactions``. It is sent from post_save for single inserts; code that
+writes the ledger in bulk (``bulk_create`` skips post_save) sends it itself.
+Derived data such as the leaderboard buckets hang off this one hook, and
+receivers run inside the inserting transaction.
+
+``balance_changed`` fires when app.ledger has written a user's balance, with
+the ``user``, the new ``balance`` and the other columns the same UPDATE set
+as ``values``. It too is sent inside the writing transaction.
+"""
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import Transaction
+
+ledger_written = Signal()
+balance_changed = Signal()
+
+
+@receiver(post_save, sender=Transaction, dispatch_uid="app.signals.transaction_saved")
+def _transaction_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ledger_written.send(sender=Transaction, transactions=[instance])
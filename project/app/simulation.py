@@ -0,0 +1,316 @@
+"""
+Monte Carlo simulator for the blackjack table.
+
+Plays rounds of one player hand against the dealer with a strategy table and
+settles every hand through an ``app.rules.TableRules``, the object the live
+game settles with, so house edge and RTP can be measured for a rule change
+before it ships (the simulate_blackjack command).
+
+Player options follow the live game: double on any two cards (after a split
+only where the table allows it), late surrender of the initial hand where the
+table offers it, split any pair of equal rank up to ``max_hands`` hands, split
+aces play on like any other hand. There is no hole-card peek. The shoe is
+reshuffled once ``penetration`` of it has been dealt.
+
+Rounds are played in fixed chunks of CHUNK_ROUNDS, each from its own shoe
+seeded with ``(seed, chunk index)``, and the chunks are spread over a process
+pool. A result therefore depends on the seed and the number of rounds, never
+on the number of workers. Nothing here touches Django, so pool workers start
+without settings.
+"""
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from . import rules
+from .rules import TableRules
+from .cards import CARD_RANK, CARDS_PER_DECK, RANK_POINTS, add_card, hand_state, state_is_soft, state_total
+
+CHUNK_ROUNDS = 10000
+
+HIT, STAND, DOUBLE, DOUBLE_OR_STAND, SPLIT, SURRENDER = "H", "S", "D", "X", "P", "R"
+
+# Strategy rows are strings of one action per dealer up card:
+#   2 3 4 5 6 7 8 9 T A
+# H hit, S stand, D double (hit if not allowed), X double (stand if not
+# allowed), P split, R surrender (hit if not allowed). Hard rows are keyed by
+# total, soft rows by total with the ace counted as 11, pair rows by the
+# points of one card (11 for aces).
+BASIC_STRATEGY = {
+    "hard": {
+        17: "SSSSSSSSSS",
+        16: "SSSSSHHRRR",
+        15: "SSSSSHHHRH",
+        14: "SSSSSHHHHH",
+        13: "SSSSSHHHHH",
+        12: "HHSSSHHHHH",
+        11: "DDDDDDDDDH",
+        10: "DDDDDDDDHH",
+        9: "HDDDDHHHHH",
+    },
+    "soft": {
+        19: "SSSSSSSSSS",
+        18: "SXXXXSSHHH",
+        17: "HDDDDHHHHH",
+        16: "HHDDDHHHHH",
+        15: "HHDDDHHHHH",
+        14: "HHHDDHHHHH",
+        13: "HHHDDHHHHH",
+    },
+    "pairs": {
+        11: "PPPPPPPPPP",
+        10: "SSSSSSSSSS",
+        9: "PPPPPSPPSS",
+        8: "PPPPPPPPPP",
+        7: "PPPPPPHHHH",
+        6: "PPPPPHHHHH",
+        5: "DDDDDDDDHH",
+        4: "HHHPPHHHHH",
+        3: "PPPPPPHHHH",
+        2: "PPPPPPHHHH",
+    },
+}
+
+# Draw like the dealer: hit below 17, never double or split
+MIMIC_DEALER = {"hard": {17: "SSSSSSSSSS"}, "soft": {17: "SSSSSSSSSS"}}
+
+# Never risk a bust: stand on any hard 12
+NEVER_BUST = {"hard": {12: "SSSSSSSSSS"}, "soft": {18: "SSSSSSSSSS"}}
+
+STRATEGIES = {
+    "basic": BASIC_STRATEGY,
+    "mimic-dealer": MIMIC_DEALER,
+    "never-bust": NEVER_BUST,
+}
+
+
+class Strategy:
+    """
+    A strategy table expanded to direct lookups. A missing hard or soft row
+    repeats the nearest row below it (or hits below every row); a missing
+    pair row plays the pair as an ordinary hand.
+    """
+
+    def __init__(self, table):
+        self.hard = self._expand(table.get("hard", {}), range(4, 22))
+        self.soft = self._expand(table.get("soft", {}), range(12, 22))
+        self.pairs = {}
+        for points, row in table.get("pairs", {}).items():
+            self.pairs[int(points)] = self._row(row)
+
+    @staticmethod
+    def _row(row):
+        if len(row) != 10 or set(row) - {HIT, STAND, DOUBLE, DOUBLE_OR_STAND, SPLIT, SURRENDER}:
+            raise ValueError(f"Invalid strategy row: {row!r}")
+        return tuple(row)
+
+    @classmethod
+    def _expand(cls, rows, totals):
+        rows = {int(total): cls._row(row) for total, row in rows.items()}
+        expanded, current = {}, (HIT,) * 10
+        for total in totals:
+            current = rows.get(total, current)
+            expanded[total] = current
+        return expanded
+
+    def action(self, state, up_index, pair_points=None):
+        if pair_points is not None and pair_points in self.pairs:
+            return self.pairs[pair_points][up_index]
+        total = state_total(state)
+        if state_is_soft(state):
+            return self.soft[total][up_index]
+        return self.hard[total][up_index]
+
+
+class Tally:
+    """Counters for a batch of rounds; tallies of separate chunks add up."""
+
+    FIELDS = (
+        "rounds", "hands", "wagered", "returned", "net_sq",
+        "wins", "losses", "pushes", "player_busts", "dealer_busts", "dealer_played",
+        "blackjacks", "doubles", "splits", "surrenders",
+    )
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def __iadd__(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        return self
+
+    def summary(self):
+        """RTP, house edge and rates. Amounts are in units of the initial bet."""
+        rounds = self.rounds or 1
+        hands = self.hands or 1
+        net = self.returned - self.wagered
+        mean = net / rounds
+        variance = max(self.net_sq / rounds - mean * mean, 0.0) * rounds / max(rounds - 1, 1)
+        std_error = math.sqrt(variance / rounds)
+        return {
+            "rounds": self.rounds,
+            "hands": self.hands,
+            "wagered": self.wagered,
+            "returned": self.returned,
+            "rtp": self.returned / self.wagered if self.wagered else 0.0,
+            "house_edge": -mean,
+            "house_edge_ci95": 1.96 * std_error,
+            "variance": variance,
+            "std_dev": math.sqrt(variance),
+            "win_rate": self.wins / hands,
+            "loss_rate": self.losses / hands,
+            "push_rate": self.pushes / hands,
+            "player_bust_rate": self.player_busts / hands,
+            "dealer_bust_rate": self.dealer_busts / (self.dealer_played or 1),
+            "blackjack_rate": self.blackjacks / rounds,
+            "double_rate": self.doubles / hands,
+            "split_rate": self.splits / rounds,
+            "surrender_rate": self.surrenders / rounds,
+        }
+
+
+class _Shoe:
+    def __init__(self, rng, decks, penetration):
+        self.rng = rng
+        self.cards = list(range(decks * CARDS_PER_DECK))
+        self.cut_card = int(len(self.cards) * penetration)
+        self.shuffle()
+
+    def shuffle(self):
+        self.rng.shuffle(self.cards)
+        self.position = 0
+
+    def draw(self):
+        if self.position >= len(self.cards):
+            # Only reachable with a cut card at the very end of the shoe
+            self.shuffle()
+        code = self.cards[self.position]
+        self.position += 1
+        return code
+
+
+def _up_index(code):
+    points = RANK_POINTS[CARD_RANK[code]]
+    return 9 if points == 1 else points - 2
+
+
+def _pair_points(cards):
+    if len(cards) == 2 and CARD_RANK[cards[0]] == CARD_RANK[cards[1]]:
+        points = RANK_POINTS[CARD_RANK[cards[0]]]
+        return 11 if points == 1 else points
+    return None
+
+
+def play_round(shoe, strategy, table, tally, max_hands=4):
+    """Play and settle one round at ``table``, adding it to ``tally``."""
+    draw = shoe.draw
+    player = [draw(), draw()]
+    up, hole = draw(), draw()
+    up_index = _up_index(up)
+
+    # (total, bet, natural, surrendered) per finished hand
+    pending, finished = [player], []
+    hand_count = 1
+    while pending:
+        cards = pending.pop()
+        split = hand_count > 1
+        bet = 1
+        state = hand_state(cards)
+        surrendered = False
+        while state_total(state) < 21:
+            pair = _pair_points(cards) if hand_count < max_hands else None
+            action = strategy.action(state, up_index, pair)
+            if action == SPLIT and pair is not None:
+                pending.append([cards[1], draw()])
+                cards = [cards[0], draw()]
+                state = hand_state(cards)
+                hand_count += 1
+                split = True
+                tally.splits += 1
+                continue
+            if action == SURRENDER and table.surrender and len(cards) == 2 and not split:
+                surrendered = True
+                tally.surrenders += 1
+                break
+            if (action in (DOUBLE, DOUBLE_OR_STAND) and len(cards) == 2
+                    and (table.double_after_split or not split)):
+                bet = 2
+                card = draw()
+                cards.append(card)
+                state = add_card(state, card)
+                tally.doubles += 1
+                break
+            if action in (STAND, DOUBLE_OR_STAND):
+                break
+            card = draw()
+            cards.append(card)
+            state = add_card(state, card)
+        total = state_total(state)
+        finished.append((total, bet, rules.is_natural(len(cards), total, split), surrendered))
+
+    dealer = hand_state((up, hole))
+    dealer_natural = rules.is_natural(2, state_total(dealer))
+    if any(total <= 21 and not surrendered for total, _, _, surrendered in finished):
+        tally.dealer_played += 1
+        while table.dealer_hits(dealer):
+            dealer = add_card(dealer, draw())
+        if state_total(dealer) > 21:
+            tally.dealer_busts += 1
+    dealer_total = state_total(dealer)
+
+    net = 0
+    for total, bet, natural, surrendered in finished:
+        result = table.outcome(total, dealer_total, natural, dealer_natural, surrendered)
+        returned = bet * table.float_returns[result]
+        tally.wagered += bet
+        tally.returned += returned
+        net += returned - bet
+        if result in (rules.WIN, rules.BLACKJACK):
+            tally.wins += 1
+            if result == rules.BLACKJACK:
+                tally.blackjacks += 1
+        elif result == rules.PUSH:
+            tally.pushes += 1
+        else:
+            tally.losses += 1
+            if result == rules.BUST:
+                tally.player_busts += 1
+    tally.rounds += 1
+    tally.hands += len(finished)
+    tally.net_sq += net * net
+
+
+def simulate_chunk(seed, index, rounds, strategy, table, decks=6, penetration=0.75, max_hands=4):
+    """Play ``rounds`` rounds from the shoe of chunk ``index``; returns a Tally."""
+    strategy = Strategy(strategy)
+    shoe = _Shoe(random.Random(f"{seed}:{index}"), decks, penetration)
+    tally = Tally()
+    for _ in range(rounds):
+        if shoe.position >= shoe.cut_card:
+            shoe.shuffle()
+        play_round(shoe, strategy, table, tally, max_hands)
+    return tally
+
+
+def simulate(rounds, strategy=BASIC_STRATEGY, table=None, seed=0, workers=1, decks=6, penetration=0.75, max_hands=4):
+    """
+    Play ``rounds`` rounds with the strategy table ``strategy`` at ``table``
+    (a TableRules, the default rules if None) and return the summed Tally.
+    ``workers`` > 1 plays the chunks on a process pool.
+    """
+    table = table or TableRules()
+    Strategy(strategy)  # Fail on a bad strategy before starting workers
+    chunks = [
+        (seed, index, min(CHUNK_ROUNDS, rounds - start), strategy, table, decks, penetration, max_hands)
+        for index, start in enumerate(range(0, rounds, CHUNK_ROUNDS))
+    ]
+    total = Tally()
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            total += simulate_chunk(*chunk)
+        return total
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for tally in pool.map(simulate_chunk, *zip(*chunks)):
+            total += tally
+    return total
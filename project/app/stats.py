@@ -0,0 +1,129 @@
+"""
+Per-user stats rollups.
+
+UserStatsRollup keeps a running total and count per transaction type, round
+outcomes and the time of the last activity, so view_stats and
+game_statistics read one row by primary key instead of aggregating the
+user's whole ledger. Ledger columns are incremented from ``ledger_written``
+inside the inserting transaction; round outcomes are added by the code that
+settles the round (``record_round``).
+
+``rebuild`` recomputes the ledger columns from history (the
+rebuild_stats_rollups command). Round outcomes are not in the ledger, so it
+leaves them as they are.
+"""
+import logging
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, Max, Sum
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import increment
+from .models import CustomUser, Transaction, UserStatsRollup
+from .signals import ledger_written
+
+logger = logging.getLogger(__name__)
+
+# Transaction type -> rollup column prefix (<prefix>_total, <prefix>_count)
+LEDGER_COLUMNS = {
+    "win": "win",
+    "loss": "loss",
+    "purchase": "purchase",
+    "game_bet": "bet",
+    "deposit": "deposit",
+    "withdrawal": "withdrawal",
+}
+LEDGER_FIELDS = [f"{prefix}_{kind}" for prefix in LEDGER_COLUMNS.values() for kind in ("total", "count")]
+
+OUTCOMES = ("win", "loss", "push")
+_OUTCOME_FIELDS = {"win": "hands_won", "loss": "hands_lost", "push": "hands_pushed"}
+
+
+def for_user(user):
+    """The user's rollup; an unsaved all-zero one if they have no activity yet."""
+    try:
+        return UserStatsRollup.objects.get(pk=user.pk)
+    except UserStatsRollup.DoesNotExist:
+        return UserStatsRollup(user=user)
+
+
+async def afor_user(user):
+    """``for_user`` for async views."""
+    try:
+        return await UserStatsRollup.objects.aget(pk=user.pk)
+    except UserStatsRollup.DoesNotExist:
+        return UserStatsRollup(user=user)
+
+
+def record_round(user, outcomes):
+    """Count a settled round; ``outcomes`` holds "win", "loss" or "push" per hand."""
+    counts = Counter(outcomes)
+    increments = {"rounds_played": 1}
+    increments.update({_OUTCOME_FIELDS[outcome]: counts[outcome] for outcome in OUTCOMES if counts[outcome]})
+    increment(UserStatsRollup, {"user_id": user.pk}, increments, latest={"last_activity": timezone.now()})
+
+
+@receiver(ledger_written, dispatch_uid="app.stats.ledger_written")
+def _on_ledger_written(sender, transactions, **kwargs):
+    increments = defaultdict(lambda: defaultdict(int))
+    last_activity = {}
+    for row in transactions:
+        prefix = LEDGER_COLUMNS.get(row.transaction_type)
+        if prefix is None:
+            continue
+        columns = increments[row.user_id]
+        columns[f"{prefix}_total"] += Decimal(str(row.amount))
+        columns[f"{prefix}_count"] += 1
+        if row.timestamp and (row.user_id not in last_activity or row.timestamp > last_activity[row.user_id]):
+            last_activity[row.user_id] = row.timestamp
+    for user_id, columns in increments.items():
+        latest = {"last_activity": last_activity[user_id]} if user_id in last_activity else None
+        increment(UserStatsRollup, {"user_id": user_id}, columns, latest=latest)
+
+
+def _rebuild_chunk(user_ids):
+    with db_transaction.atomic():
+        # Make sure every row exists, then lock them: ledger writes for these
+        # users wait until the chunk is rewritten, so none is lost or doubled.
+        UserStatsRollup.objects.bulk_create([UserStatsRollup(user_id=pk) for pk in user_ids], ignore_conflicts=True)
+        rollups = {
+            rollup.pk: rollup
+            for rollup in UserStatsRollup.objects.select_for_update().filter(pk__in=user_ids)
+        }
+        for rollup in rollups.values():
+            for field in LEDGER_FIELDS:
+                setattr(rollup, field, 0)
+        totals = (
+            Transaction.objects.filter(user_id__in=user_ids, transaction_type__in=LEDGER_COLUMNS)
+            .values("user_id", "transaction_type")
+            .annotate(total=Sum("amount"), count=Count("id"), last=Max("timestamp"))
+            .order_by()
+        )
+        for row in totals:
+            rollup = rollups[row["user_id"]]
+            prefix = LEDGER_COLUMNS[row["transaction_type"]]
+            setattr(rollup, f"{prefix}_total", row["total"])
+            setattr(rollup, f"{prefix}_count", row["count"])
+            if rollup.last_activity is None or row["last"] > rollup.last_activity:
+                rollup.last_activity = row["last"]
+        UserStatsRollup.objects.bulk_update(rollups.values(), LEDGER_FIELDS + ["last_activity"])
+
+
+def rebuild(chunk_size=1000):
+    """Recompute the ledger columns of every user's rollup, ``chunk_size`` users at a time."""
+    rebuilt = 0
+    chunk = []
+    for user_id in CustomUser.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=chunk_size):
+        chunk.append(user_id)
+        if len(chunk) >= chunk_size:
+            _rebuild_chunk(chunk)
+            rebuilt += len(chunk)
+            logger.info("Rebuilt stats rollups for %s users", rebuilt)
+            chunk = []
+    if chunk:
+        _rebuild_chunk(chunk)
+        rebuilt += len(chunk)
+    return rebuilt
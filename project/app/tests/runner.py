@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Django's test runner, with the query budgets of app.query_budgets enforced on every request."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budgets_enforced = settings.QUERY_BUDGETS_ENFORCED
+        settings.QUERY_BUDGETS_ENFORCED = True
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGETS_ENFORCED = self._budgets_enforced
+        super().teardown_test_environment(**kwargs)
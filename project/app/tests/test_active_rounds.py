@@ -0,0 +1,166 @@
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction as db_transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from .. import active_rounds, ledger
+from ..active_rounds import ActiveRounds, CacheRoundStore, MemoryRoundStore
+from ..models import BlackjackGame, CustomUser
+from ..shoe import Shoe
+
+
+class ActiveRoundsTest(TestCase):
+    """Tests for live rounds held in memory and written behind"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="live", email="live@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        # A flush delay no test waits out: rows are written by explicit flushes
+        self.rounds = self.use_rounds()
+        two, three = {"rank": "2", "suit": "H", "value": 2}, {"rank": "3", "suit": "S", "value": 3}
+        self.game = BlackjackGame.objects.create(
+            user=self.user, player_hands={"spot1": [two, three]}, dealer_hand=[three, two],
+            bets={"spot1": 10}, current_spot="spot1", **Shoe.shuffle().state(),
+        )
+
+    def use_rounds(self):
+        """Swap in a fresh ActiveRounds, as a restarted worker would have."""
+        rounds = ActiveRounds(MemoryRoundStore(), flush_ms=60000)
+        patcher = mock.patch.object(active_rounds, "_rounds", rounds)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(rounds.flush)
+        return rounds
+
+    def hit(self):
+        response = self.client.post(reverse("blackjack_action"), {"action": "hit", "hand": "spot1"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["player_hands"]["spot1"]
+
+    def test_hit_is_written_behind(self):
+        """Test a hit is served from memory and reaches the row on flush"""
+        hand = self.hit()
+        self.assertEqual(len(hand), 3)
+        self.game.refresh_from_db()
+        self.assertEqual(len(self.game.player_hands["spot1"]), 2)
+
+        self.assertEqual(self.rounds.flush(), 1)
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.player_hands["spot1"], hand)
+        self.assertEqual((self.game.shoe_cursor, self.game.revision), (1, 1))
+
+    def test_late_flush_never_overwrites_newer_save(self):
+        """Test a stale revision writes nothing over a newer one"""
+        stale = self.rounds.get(self.user)
+        self.rounds.save(stale)
+        newer = self.rounds.get(self.user)
+        newer.current_spot = "split_spot1"
+        self.rounds.save(newer, sync=True)
+        self.assertEqual(self.rounds._write(stale), 0)
+        self.assertEqual(self.rounds.flush(), 0)
+        self.game.refresh_from_db()
+        self.assertEqual((self.game.current_spot, self.game.revision), ("split_spot1", 2))
+
+    def test_restart_recovers_the_last_flushed_state(self):
+        """Test a worker that lost unflushed changes resumes from the row and deals the same card"""
+        lost_hand = self.hit()
+        self.rounds._dirty.clear()
+        self.use_rounds()
+        self.assertEqual(len(active_rounds.get(self.user).player_hands["spot1"]), 2)
+        self.assertEqual(self.hit(), lost_hand)
+
+    def test_settlement_drops_pending_changes(self):
+        """Test settling a round deletes it without writing its pending changes"""
+        self.hit()
+        response = self.client.post(
+            reverse("blackjack_action"), {"action": "stand", "hand": "spot1", "process_dealer": True}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(BlackjackGame.objects.filter(user=self.user).exists())
+        self.assertEqual(self.rounds._dirty, {})
+        self.assertIsNone(self.rounds.store.get(self.user.pk))
+
+    def test_workers_never_serve_each_others_stale_rounds(self):
+        """Test two workers with their own memory stores see each other's changes and settlements"""
+        with mock.patch.object(active_rounds, "_rounds", None):
+            first = active_rounds.rounds()
+        second = ActiveRounds(MemoryRoundStore(), flush_ms=0)
+        self.assertEqual(first.flush_seconds, 0)
+        held = second.get(self.user)
+
+        # A hit served by the first worker reaches the row at once
+        game = first.get(self.user)
+        game.shoe_cursor += 1
+        first.save(game)
+        self.assertEqual(second.get(self.user).revision, 1)
+        self.assertIsNot(second.get(self.user), held)
+
+        # The second worker's next change is not dropped as stale
+        game = second.get(self.user)
+        game.current_spot = "split_spot1"
+        second.save(game)
+        self.assertEqual(first.get(self.user).current_spot, "split_spot1")
+
+        # Nor does either serve a round the other settled or replaced
+        BlackjackGame.objects.filter(pk=self.game.pk).delete()
+        with self.assertRaises(BlackjackGame.DoesNotExist):
+            second.get(self.user)
+        replacement = BlackjackGame.objects.create(
+            user=self.user, player_hands={}, dealer_hand=[], bets={}, **Shoe.shuffle().state(),
+        )
+        self.assertEqual(first.get(self.user).pk, replacement.pk)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_cache_store_refuses_a_per_process_backend(self):
+        """Test the cache store needs a cache shared by workers"""
+        with self.assertRaises(ImproperlyConfigured):
+            CacheRoundStore("default")
+
+    def test_auto_store_writes_behind_only_with_a_shared_cache(self):
+        """Test 'auto' picks the cache store for a shared cache and the memory store otherwise"""
+        with override_settings(ACTIVE_ROUND_STORE="auto"):
+            self.assertIsInstance(active_rounds.build_store(), MemoryRoundStore)
+            with tempfile.TemporaryDirectory() as directory:
+                shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": directory}
+                with override_settings(CACHES={"default": shared}):
+                    self.assertIsInstance(active_rounds.build_store(), CacheRoundStore)
+
+    def test_racing_doubles_debit_once(self):
+        """Test of two workers doubling the same hand, the one saving second is refused and its debit rolled back"""
+        first, second = ActiveRounds(MemoryRoundStore(), flush_ms=0), ActiveRounds(MemoryRoundStore(), flush_ms=0)
+        games = first.get(self.user), second.get(self.user)
+        for rounds, game in zip((first, second), games):
+            with db_transaction.atomic():
+                ledger.debit(self.user, game.bets["spot1"])
+                game.bets["spot1"] *= 2
+                if rounds is second:
+                    with self.assertRaises(active_rounds.RoundConflict):
+                        rounds.save(game, sync=True)
+                    db_transaction.set_rollback(True)
+                else:
+                    rounds.save(game, sync=True)
+        self.user.refresh_from_db()
+        self.game.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("90.00"))
+        self.assertEqual((self.game.bets, self.game.revision), ({"spot1": 20}, 1))
+        self.assertIsNone(second.store.get(self.user.pk))
+
+    def test_conflicting_action_is_refused(self):
+        """Test an action on a round another request saved first answers 409 and keeps the balance"""
+        self.rounds.get(self.user)
+        BlackjackGame.objects.filter(pk=self.game.pk).update(revision=5)
+        # As if the other request saved between this one's read and write
+        with mock.patch.object(ActiveRounds, "_current", lambda rounds, game, row: game):
+            response = self.client.post(
+                reverse("blackjack_action"), {"action": "double", "hand": "spot1"}, format="json"
+            )
+        self.assertEqual(response.status_code, 409)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("100.00"))
+        self.assertEqual(BlackjackGame.objects.get(pk=self.game.pk).bets, {"spot1": 10})
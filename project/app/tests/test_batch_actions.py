@@ -0,0 +1,83 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from .. import active_rounds
+from ..active_rounds import ActiveRounds, MemoryRoundStore
+from ..models import BlackjackGame, CustomUser, RoundResult
+from ..shoe import Shoe
+
+
+class BatchActionsTest(TestCase):
+    """Tests for the blackjack/actions/ batch endpoint"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="batch", email="batch@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.rounds = ActiveRounds(MemoryRoundStore(), flush_ms=60000)
+        patcher = mock.patch.object(active_rounds, "_rounds", self.rounds)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.rounds.flush)
+        two, three = {"rank": "2", "suit": "H", "value": 2}, {"rank": "3", "suit": "S", "value": 3}
+        self.shoe = Shoe.shuffle()
+        self.game = BlackjackGame.objects.create(
+            user=self.user, player_hands={"spot1": [two, three], "spot2": [three, two]},
+            dealer_hand=[{"rank": "10", "suit": "D", "value": 10}, {"rank": "7", "suit": "C", "value": 7}],
+            bets={"spot1": 10, "spot2": 10}, current_spot="spot1", **self.shoe.state(),
+        )
+
+    def post(self, *actions):
+        return self.client.post(
+            reverse("blackjack-actions"),
+            {"actions": [{"action": action, "hand": hand} for action, hand in actions]}, format="json",
+        )
+
+    def test_actions_across_spots_are_applied_in_order(self):
+        """Test one request plays several spots and saves the round once"""
+        response = self.post(("stand", "spot1"), ("hit", "spot2"), ("hit", "spot2"))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["player_hands"]["spot1"]), 2)
+        # The seeded shoe deals what two single hits would have
+        self.assertEqual(data["player_hands"]["spot2"][2:], [self.shoe.draw(), self.shoe.draw()])
+        self.assertEqual(data["current_spot"], "spot2")
+
+        game = active_rounds.get(self.user)
+        self.assertEqual((game.revision, game.shoe_cursor), (1, 2))
+        self.assertEqual(self.rounds.flush(), 1)
+
+    def test_rejected_action_rolls_back_the_batch(self):
+        """Test a batch with an action the round does not allow changes nothing, stakes included"""
+        response = self.post(("double", "spot1"), ("split", "spot2"))
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()["error"].startswith("Action 1 (split spot2): Cannot split"))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("100.00"))
+        game = active_rounds.get(self.user)
+        self.assertEqual((game.revision, game.bets, game.shoe_cursor), (0, {"spot1": 10, "spot2": 10}, 0))
+
+    def test_last_stand_settles_the_round(self):
+        """Test a batch ending on the last hand returns the settled round, and nothing may follow it"""
+        response = self.post(("stand", "spot1"), ("stand", "spot2"), ("hit", "spot2"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Action 2 (hit spot2): The round is already over.")
+
+        response = self.post(("stand", "spot1"), ("stand", "spot2"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("results", response.json())
+        self.assertEqual(RoundResult.objects.filter(user=self.user).count(), 1)
+        self.assertFalse(BlackjackGame.objects.filter(pk=self.game.pk).exists())
+
+    def test_malformed_batches_are_rejected(self):
+        """Test the request must hold a bounded list of known actions"""
+        for body in ({}, {"actions": []}, {"actions": ["hit"]}, {"actions": [{"action": "hit"}] * 33}):
+            response = self.client.post(reverse("blackjack-actions"), body, format="json")
+            self.assertEqual(response.status_code, 400, body)
+        response = self.post(("fold", "spot1"))
+        self.assertEqual(response.json()["error"], "Action 0 (fold spot1): Unknown action 'fold'.")
@@ -0,0 +1,64 @@
+from django.test import TestCase
+from ..cards import (
+    ACE, RANKS, encode, encode_hand, from_legacy, hand_state, add_card,
+    hand_total, is_soft, state_total, to_legacy, deck_of, suit_of, rank_of,
+)
+from ..utils import calculate_hand_value, create_deck
+
+
+class CardEncodingTest(TestCase):
+    """Tests for the compact integer card encoding"""
+
+    def test_encode_round_trip(self):
+        """Test rank, suit and deck survive encoding"""
+        code = encode(ACE, 2, deck=5)
+        self.assertEqual(rank_of(code), ACE)
+        self.assertEqual(suit_of(code), 2)
+        self.assertEqual(deck_of(code), 5)
+        self.assertTrue(0 <= code < 6 * 52)
+
+    def test_legacy_formats(self):
+        """Test dict, string and symbol cards map to the same code"""
+        expected = encode(RANKS.index("10"), 3)
+        self.assertEqual(from_legacy({"rank": "10", "suit": "♣", "value": 10}), expected)
+        self.assertEqual(from_legacy("10C"), expected)
+        self.assertEqual(from_legacy("10♣"), expected)
+        self.assertIsNone(from_legacy("Hidden"))
+        self.assertIsNone(from_legacy(None))
+
+    def test_to_legacy_matches_create_deck(self):
+        """Test the dict form matches the cards create_deck produces"""
+        for card in create_deck()[:52]:
+            self.assertEqual(to_legacy(from_legacy(card)), card)
+
+
+class HandEvaluationTest(TestCase):
+    """Tests for the table-driven hand evaluator"""
+
+    def test_soft_and_hard_totals(self):
+        """Test aces count as 11 only while that does not bust"""
+        self.assertEqual(hand_total(encode_hand(["AH", "6C"])), 17)
+        self.assertTrue(is_soft(encode_hand(["AH", "6C"])))
+        self.assertEqual(hand_total(encode_hand(["AH", "6C", "KD"])), 17)
+        self.assertFalse(is_soft(encode_hand(["AH", "6C", "KD"])))
+        self.assertEqual(hand_total(encode_hand(["AH", "AD", "9S"])), 21)
+        self.assertEqual(hand_total(encode_hand(["KH", "QD", "5S"])), 25)
+
+    def test_incremental_state(self):
+        """Test adding cards one at a time matches folding the whole hand"""
+        codes = encode_hand(["AH", "2D", "AS", "9C"])
+        state = hand_state([])
+        for code in codes:
+            state = add_card(state, code)
+        self.assertEqual(state, hand_state(codes))
+        self.assertEqual(state_total(state), 13)
+
+    def test_calculate_hand_value_nested(self):
+        """Test the legacy entry point flattens nested hands and skips placeholders"""
+        hand = [
+            [{"rank": "5", "suit": "♠", "value": 5}],
+            [{"rank": "J", "suit": "♥", "value": 10}, "6C"],
+            "Hidden",
+        ]
+        self.assertEqual(calculate_hand_value(hand), 21)
+        self.assertEqual(calculate_hand_value(None), 0)
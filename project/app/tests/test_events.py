@@ -0,0 +1,111 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase
+from .. import events, ledger, views_async
+from ..authentication import issue_token
+from ..events import CacheBroker, Hub
+from ..models import CustomUser, RoundResult, Transaction
+
+
+def parse(frame):
+    """(event name, payload) of a server-sent event frame."""
+    lines = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n"))
+    return lines["event"], json.loads(lines["data"])
+
+
+class EventStreamTest(TestCase):
+    """Tests for the push events and their server-sent event stream"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username="pushed", email="pushed@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+        self.factory = AsyncRequestFactory()
+        self.auth = {"headers": {"Authorization": f"Bearer {issue_token(self.user)}"}}
+
+    async def open_stream(self):
+        response = await views_async.event_stream(self.factory.get("/api/events/", **self.auth))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+        return stream
+
+    async def next_event(self, stream):
+        return parse(await asyncio.wait_for(anext(stream), 2))
+
+    def commit(self, write):
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+
+    async def test_balance_and_round_events_are_streamed_after_commit(self):
+        """Test the user's balance changes and settled rounds reach their stream once committed"""
+        stream = await self.open_stream()
+
+        def settle():
+            ledger.credit(self.user, "25.00", "purchase")
+            RoundResult.objects.create(
+                user=self.user, table="classic", bets={"spot1": 10}, results={"spot1": "win"},
+                wagered=Decimal("10.00"), payout=Decimal("20.00"),
+            )
+        await sync_to_async(self.commit)(settle)
+
+        name, balance = await self.next_event(stream)
+        self.assertEqual((name, balance["balance"]), ("balance", "125.00"))
+        name, round_event = await self.next_event(stream)
+        self.assertEqual((name, round_event["results"], round_event["payout"]), ("round", {"spot1": "win"}, "20.00"))
+
+    async def test_closed_stream_unsubscribes(self):
+        """Test a cancelled stream, as on a client disconnect, leaves no subscription behind"""
+        stream = await self.open_stream()
+        self.assertTrue(events.hub.has_subscribers())
+        reading = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        reading.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reading
+        self.assertFalse(events.hub.has_subscribers())
+
+    async def test_leaderboard_diffs_are_pushed(self):
+        """Test a win pushes the ranking rows it changed"""
+        stream = await self.open_stream()
+        other = await CustomUser.objects.acreate(username="rival", email="rival@example.com")
+
+        def win(user, amount):
+            self.commit(lambda: Transaction.objects.create(user=user, amount=Decimal(amount), transaction_type="win"))
+        await sync_to_async(win)(other, "50.00")
+        # Nothing was cached: every period is pushed whole
+        diffs = [await self.next_event(stream) for _ in range(3)]
+        self.assertEqual({diff["period"] for _, diff in diffs}, {"day", "week", "month"})
+        [[position, row]] = diffs[0][1]["changes"]
+        self.assertEqual((position, row["user__username"], Decimal(row["total_winnings"])), (0, "rival", 50))
+
+        await sync_to_async(win)(self.user, "80.00")
+        name, diff = await self.next_event(stream)
+        self.assertEqual((name, diff["size"]), ("leaderboard", 2))
+        self.assertEqual([position for position, _ in diff["changes"]], [0, 1])
+
+    async def test_cache_broker_carries_events_between_workers(self):
+        """Test workers sharing a cache deliver each other's events once, and their own at once"""
+        first, second = Hub(), Hub()
+        first_broker, second_broker = CacheBroker(first, "default"), CacheBroker(second, "default")
+        on_first, on_second = first.subscribe(["user:1"]), second.subscribe(["user:1"])
+        second_broker.poll()
+
+        first_broker.publish("user:1", {"type": "balance", "balance": "5.00", "at": 1})
+        await asyncio.sleep(0)
+        self.assertEqual(on_first.queue.qsize(), 1)
+        self.assertEqual(second_broker.poll(), 1)
+        self.assertEqual(second_broker.poll(), 0)
+        self.assertEqual((await on_second.get())["balance"], "5.00")
+
+        # A slow reader is told to start over
+        slow = Hub(queue_size=2)
+        subscription = slow.subscribe(["leaderboard"])
+        for at in range(3):
+            slow.deliver("leaderboard", {"type": "leaderboard", "at": at})
+        await asyncio.sleep(0)
+        self.assertEqual([await subscription.get()], [{"type": "resync", "at": 2}])
@@ -0,0 +1,57 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from .. import leaderboard
+from ..models import CustomUser, LeaderboardBucket, Transaction
+
+
+class LeaderboardTest(TestCase):
+    """Tests for the bucketed, cached leaderboard"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pw-123456")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pw-123456")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_wins_fold_into_hourly_buckets(self):
+        """Test win transactions update one bucket per user and hour; other types are ignored"""
+        Transaction.objects.create(user=self.alice, amount=Decimal("10.00"), transaction_type="win")
+        Transaction.objects.create(user=self.alice, amount=Decimal("5.50"), transaction_type="win")
+        Transaction.objects.create(user=self.alice, amount=Decimal("99.00"), transaction_type="loss")
+        bucket = LeaderboardBucket.objects.get(user=self.alice)
+        self.assertEqual(bucket.total, Decimal("15.50"))
+        self.assertEqual(bucket.bucket_start, leaderboard.bucket_start(timezone.now()))
+
+    def test_ranking_respects_window(self):
+        """Test buckets older than the period do not count"""
+        old = leaderboard.bucket_start(timezone.now() - timedelta(days=3))
+        LeaderboardBucket.objects.create(user=self.bob, bucket_start=old, total=Decimal("500.00"))
+        Transaction.objects.create(user=self.alice, amount=Decimal("20.00"), transaction_type="win")
+        self.assertEqual(
+            leaderboard.rank("day"),
+            [{"user__username": "alice", "total_winnings": Decimal("20.00")}],
+        )
+        self.assertEqual([row["user__username"] for row in leaderboard.rank("week")], ["bob", "alice"])
+
+    def test_cached_ranking_follows_new_wins(self):
+        """Test a committed win is merged into the cached ranking without a rebuild"""
+        Transaction.objects.create(user=self.alice, amount=Decimal("20.00"), transaction_type="win")
+        self.assertEqual(leaderboard.top_winners("day")[0]["user__username"], "alice")
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(user=self.bob, amount=Decimal("30.00"), transaction_type="win")
+        response = self.client.get(reverse("leaderboard", args=["day"]))
+        self.assertEqual([row["user__username"] for row in response.json()], ["bob", "alice"])
+
+    def test_rebuild_matches_incremental_buckets(self):
+        """Test rebuilding from the transactions reproduces the live buckets"""
+        for user, amount in ((self.alice, "12.00"), (self.bob, "7.25"), (self.alice, "3.00")):
+            Transaction.objects.create(user=user, amount=Decimal(amount), transaction_type="win")
+        live = sorted(LeaderboardBucket.objects.values_list("user_id", "bucket_start", "total"))
+        self.assertEqual(leaderboard.rebuild(), 2)
+        self.assertEqual(sorted(LeaderboardBucket.objects.values_list("user_id", "bucket_start", "total")), live)
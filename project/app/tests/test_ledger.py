@@ -0,0 +1,162 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+from .. import ledger
+from ..models import BlackjackGame, CustomUser, Transaction
+
+
+class LedgerTest(TestCase):
+    """Tests for the conditional-UPDATE balance ledger"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="ledgeruser", email="ledger@example.com", password="pw-123456", balance=Decimal("50.00")
+        )
+
+    def test_debit_and_credit_record_transactions(self):
+        """Test balance changes and their ledger rows are written together"""
+        self.assertEqual(ledger.debit(self.user, 20, "game_bet"), Decimal("30.00"))
+        self.assertEqual(ledger.credit(self.user, 12.5, "win"), Decimal("42.50"))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("42.50"))
+        self.assertEqual(
+            sorted(Transaction.objects.filter(user=self.user).values_list("transaction_type", "amount")),
+            [("game_bet", Decimal("20.00")), ("win", Decimal("12.50"))],
+        )
+
+    def test_insufficient_funds_writes_nothing(self):
+        """Test an overdraft is rejected without touching balance or ledger"""
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.debit(self.user, 50.01, "game_bet")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("50.00"))
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+    def test_amounts_must_be_positive(self):
+        """Test a zero or negative amount is refused, so a negative debit cannot credit"""
+        for amount in (0, "0.001", -5, Decimal("-0.01")):
+            with self.assertRaises(ValueError):
+                ledger.debit(self.user, amount, "game_bet")
+            with self.assertRaises(ValueError):
+                ledger.credit(self.user, amount, "win")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("50.00"))
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+    def test_condition_guards_credit(self):
+        """Test a guarded credit (daily spin) applies only while the condition holds"""
+        cooldown = Q(last_spin__isnull=True) | Q(last_spin__lte=now() - timedelta(hours=24))
+        ledger.credit(self.user, 10, "win", condition=cooldown, values={"last_spin": now()})
+        with self.assertRaises(ledger.LedgerError):
+            ledger.credit(self.user, 10, "win", condition=cooldown, values={"last_spin": now()})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("60.00"))
+
+    def test_settle_writes_round_at_once(self):
+        """Test settle credits and inserts every row at once, sending ledger_written once"""
+        rows = [
+            Transaction(user=self.user, amount=15, transaction_type="win", game_id="7"),
+            Transaction(user=self.user, amount=Decimal("2.5"), transaction_type="loss", game_id="7"),
+        ]
+        # UPDATE ... RETURNING and the INSERT; other databases read the balance back
+        queries = 2 if connection.vendor == "postgresql" else 3
+        with mock.patch.object(ledger.ledger_written, "send") as send, self.assertNumQueries(queries):
+            self.assertEqual(ledger.settle(self.user, 30, rows), Decimal("80.00"))
+        send.assert_called_once()
+        self.assertEqual(len(send.call_args.kwargs["transactions"]), 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("80.00"))
+        self.assertEqual(
+            sorted(Transaction.objects.filter(game_id="7").values_list("transaction_type", "amount")),
+            [("loss", Decimal("2.50")), ("win", Decimal("15.00"))],
+        )
+
+    def test_stake_is_kept_if_the_game_is_not_created(self):
+        """Test the start views take no stake when the game they deal cannot be written"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        starts = [
+            (reverse("game-start"), {"game_type": "blackjack", "bet_amount": "10.00"}),
+            (reverse("blackjack-start"), {"bets": {"spot1": 10}}),
+        ]
+        for url, data in starts:
+            with mock.patch.object(BlackjackGame.objects, "create", side_effect=RuntimeError("insert failed")):
+                self.assertEqual(client.post(url, data, format="json").status_code, 500)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("50.00"))
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+        self.assertEqual(client.post(*starts[0], format="json").status_code, 201)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("40.00"))
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class LedgerConcurrencyTest(TransactionTestCase):
+    """Stress tests for concurrent balance updates (needs a server database)"""
+
+    THREADS = 16
+    OPERATIONS = 25
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="stressuser", email="stress@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+
+    def _run(self, worker):
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def target(index):
+            try:
+                barrier.wait()
+                # Each thread works on its own copy of the user, like separate requests
+                worker(index, CustomUser.objects.get(pk=self.user.pk))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_no_lost_updates(self):
+        """Test interleaved credits and debits from many threads all land"""
+        def worker(index, user):
+            for _ in range(self.OPERATIONS):
+                ledger.credit(user, "1.25", "win")
+                ledger.debit(user, "0.25", "game_bet")
+
+        self._run(worker)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("100.00") + self.THREADS * self.OPERATIONS * Decimal("1.00"))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2 * self.THREADS * self.OPERATIONS)
+
+    def test_concurrent_debits_never_overdraw(self):
+        """Test racing debits stop exactly at zero"""
+        succeeded = []
+
+        def worker(index, user):
+            for _ in range(self.OPERATIONS):
+                try:
+                    ledger.debit(user, "1.00", "game_bet")
+                    succeeded.append(index)
+                except ledger.InsufficientFunds:
+                    pass
+
+        self._run(worker)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("0.00"))
+        self.assertEqual(len(succeeded), 100)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 100)
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.servers.basehttp import WSGIServer
+from django.db import connection
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.testcases import LiveServerThread, QuietWSGIRequestHandler
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from ..middleware import MetricsMiddleware
+from ..models import CustomUser, RoundResult
+
+
+class QueryCountHeaderTest(TestCase):
+    """Tests for the X-DB-Queries response header"""
+
+    def test_header_only_with_setting(self):
+        """Test the header counts a request's queries, and is absent by default"""
+        user = CustomUser.objects.create_user(username="counted", email="counted@example.com", password="pw-123456")
+        self.assertNotIn(MetricsMiddleware.header, self.client.get(reverse("leaderboard", args=["week"])))
+        with override_settings(QUERY_COUNT_HEADER=True):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(reverse("view-stats-me"))
+        self.assertGreater(len(queries), 0)
+        self.assertEqual(response[MetricsMiddleware.header], str(len(queries)))
+
+
+class SerialLiveServerThread(LiveServerThread):
+    """
+    A live server answering one request at a time. SQLite's in-memory test
+    database is one connection shared by every server thread, and two
+    requests on it at once fail with "SQL statements in progress".
+    """
+
+    def _create_server(self, connections_override=None):
+        # Runs requests on this thread, whose connections are already overridden
+        return WSGIServer((self.host, self.port), QuietWSGIRequestHandler, allow_reuse_address=False)
+
+
+@override_settings(QUERY_COUNT_HEADER=True)
+class LoadTestCommandTest(LiveServerTestCase):
+    """Tests for the loadtest command against a live server"""
+
+    server_thread_class = SerialLiveServerThread if connection.vendor == "sqlite" else LiveServerThread
+
+    def test_sessions_are_played_and_reported(self):
+        """Test each virtual user plays a whole session and the report names every step"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "load.json")
+            call_command(
+                "loadtest", url=f"{self.live_server_url}/api", users=2, sessions=1, rounds=2, duration=60,
+                output=output, stdout=StringIO(),
+            )
+            with open(output) as f:
+                report = json.load(f)
+
+        self.assertEqual((report["sessions"], report["failed_sessions"]), (2, 0))
+        self.assertEqual(CustomUser.objects.filter(username__startswith="load-").count(), 2)
+        self.assertEqual(RoundResult.objects.count(), 4)
+        endpoints = report["endpoints"]
+        self.assertLessEqual(
+            {"register", "login", "spin", "blackjack_start", "leaderboard", "view_stats", "logout"}, set(endpoints)
+        )
+        self.assertEqual(endpoints["blackjack_start"]["statuses"], {"201": 4})
+        self.assertGreaterEqual(endpoints["login"]["queries_mean"], 1)
+        self.assertLessEqual(endpoints["login"]["p50_ms"], endpoints["login"]["p99_ms"])
@@ -0,0 +1,20 @@
+import logging
+from django.test import TestCase
+from ..log import REDACTED, RedactingFilter, redact
+
+
+class RedactionTest(TestCase):
+    """Tests for credential redaction in log records"""
+
+    def test_redacts_bearer_and_issued_tokens(self):
+        """Test bearer headers and login tokens never reach the output"""
+        self.assertEqual(redact("Bearer abc.def"), f"Bearer {REDACTED}")
+        message = redact("token test_token_user_id:7:0a1b2c")
+        self.assertNotIn("0a1b2c", message)
+
+    def test_filter_formats_lazily_and_scrubs(self):
+        """Test the filter merges args before scrubbing"""
+        record = logging.LogRecord("app", logging.DEBUG, __file__, 1, "auth %s", ({"password": "hunter22"},), None)
+        self.assertTrue(RedactingFilter().filter(record))
+        self.assertNotIn("hunter22", record.getMessage())
+        self.assertIn(REDACTED, record.getMessage())
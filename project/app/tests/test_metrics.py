@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from .. import metrics, response_cache
+from ..metrics import Registry
+from ..models import CustomUser
+
+
+class MetricsTest(TestCase):
+    """Tests for the per-request metrics and the /metrics/ endpoint"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="measured", email="measured@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.registry = Registry()
+        patcher = mock.patch.object(metrics, "registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_are_recorded_by_url_name(self):
+        """Test wall time, queries and size are recorded under the view's name and served to Prometheus"""
+        response = self.client.get(reverse("view-stats-me"))
+        self.client.get("/api/no-such-endpoint/")
+        totals = self.registry.snapshot()
+        self.assertEqual(set(totals), {"view-stats-me", "unmatched"})
+
+        counts, sums = totals["view-stats-me"]
+        self.assertEqual([sum(c) for c in counts], [1, 1, 1, 1])
+        self.assertGreater(sums[1], 0)
+        self.assertEqual(sums[3], len(response.content))
+
+        text = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn("# TYPE casino_request_duration_seconds histogram", text)
+        self.assertIn(f'casino_request_queries_sum{{view="view-stats-me"}} {sums[1]}', text)
+        self.assertIn('casino_response_size_bytes_bucket{view="view-stats-me",le="+Inf"} 1', text)
+
+    async def test_queries_of_async_requests_are_counted(self):
+        """Test queries a sync view makes under the ASGI handler count towards its request"""
+        await cache.aclear()
+        response_cache.local.clear()
+        await self.async_client.get(reverse("leaderboard", args=["week"]))
+        await self.async_client.get(reverse("leaderboard", args=["week"]))
+        counts, sums = self.registry.snapshot()["leaderboard"]
+        self.assertEqual(sum(counts[0]), 2)
+        # A cache miss, then a hit
+        self.assertGreater(sums[1], 0)
+
+    def test_workers_files_are_merged(self):
+        """Test /metrics/ adds up the files other workers wrote and its own live figures"""
+        self.registry.observe("leaderboard", 0.002, 1, 0.0005, 300)
+        with tempfile.TemporaryDirectory() as directory:
+            # Set after recording, so no writer thread outlives the directory
+            self.registry.directory = directory
+            other = Registry()
+            other.observe("leaderboard", 0.02, 3, 0.004, 300)
+            other.observe("login", 0.3, 2, 0.001, 120)
+            with open(os.path.join(directory, "1.json"), "w") as f:
+                json.dump(other.snapshot(), f)
+            with open(os.path.join(directory, "2.json"), "w") as f:
+                f.write("{")
+
+            with self.assertLogs("app.metrics", "WARNING"):
+                totals = self.registry.merged()
+        self.assertEqual(set(totals), {"leaderboard", "login"})
+        counts, sums = totals["leaderboard"]
+        self.assertEqual((sum(counts[0]), sums[1]), (2, 4))
+
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1", "10.0.0.0/8"], METRICS_TOKEN="scrape-secret")
+    def test_metrics_need_an_allowed_address_or_the_token(self):
+        """Test /metrics/ refuses requests from other addresses unless they carry the token"""
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="10.1.2.3").status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="203.0.113.7").status_code, 403)
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403
+        )
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer scrape-secret").status_code, 200
+        )
+        with self.settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer ").status_code, 403)
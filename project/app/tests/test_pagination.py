@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from ..models import CustomUser, Transaction
+
+
+class AdminTransactionPaginationTest(TestCase):
+    """Tests for the keyset-paginated and streamed admin transaction listings"""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            username="pageadmin", email="pageadmin@example.com", password="pw-123456", is_staff=True
+        )
+        self.player = CustomUser.objects.create_user(username="pageplayer", email="pageplayer@example.com", password="pw-123456")
+        Transaction.objects.bulk_create([
+            Transaction(user=self.player, amount=Decimal(i), transaction_type="win" if i % 2 else "loss")
+            for i in range(1, 8)
+        ])
+        # Identical timestamps: the id tie-break must keep pages disjoint
+        Transaction.objects.update(timestamp=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_cursor_walks_every_row_once(self):
+        """Test following X-Next-Cursor returns each transaction exactly once, newest first"""
+        url = reverse("admin-transactions")
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(url, {"limit": 3, **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.json()]
+            cursor = response.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            self.assertIn('rel="next"', response["Link"])
+        self.assertEqual(seen, sorted(Transaction.objects.values_list("id", flat=True), reverse=True))
+        self.assertEqual(response.json()[0]["user"], "pageplayer")
+
+    def test_page_is_one_query(self):
+        """Test a page is read in a single query, usernames included"""
+        url = reverse("admin-transactions")
+        self.client.get(url, {"limit": 5})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"limit": 5})
+        self.assertEqual(len(response.json()), 5)
+
+    def test_filter_export_streams_ndjson_and_csv(self):
+        """Test export=ndjson|csv streams the full filtered result"""
+        url = reverse("admin-transactions-filter")
+        response = self.client.get(url, {"transaction_type": "win", "export": "ndjson"})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row["amount"] for row in rows], ["7.00", "5.00", "3.00", "1.00"])
+        self.assertEqual({row["transaction_type"] for row in rows}, {"win"})
+
+        response = self.client.get(url, {"transaction_type": "win", "export": "csv"})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ["id", "user", "amount", "transaction_type", "payment_method", "timestamp"])
+        self.assertEqual(len(rows), 5)
+
+    def test_bad_parameters_are_rejected(self):
+        """Test malformed cursor, limit or export format return 400"""
+        url = reverse("admin-transactions")
+        for params in ({"cursor": "not-a-cursor"}, {"limit": "0"}, {"export": "xml"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class UserTransactionPaginationTest(TestCase):
+    """Tests for the paginated, ETag-validated user transaction history"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="historyuser", email="history@example.com", password="pw-123456")
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, amount=Decimal(i), transaction_type="purchase", game_id=f"g{i}" if i == 1 else None,
+                        game_type="slots" if i == 1 else None)
+            for i in range(1, 6)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("user-transactions")
+
+    def test_limit_and_cursor(self):
+        """Test the history is served in pages that together hold every row"""
+        first = self.client.get(self.url, {"limit": 3}, HTTP_ACCEPT="application/json")
+        self.assertEqual(len(first.data), 3)
+        rest = self.client.get(self.url, {"limit": 3, "cursor": first["X-Next-Cursor"]}, HTTP_ACCEPT="application/json")
+        self.assertEqual(len(rest.data), 2)
+        self.assertNotIn("X-Next-Cursor", rest)
+        self.assertEqual(rest.data[-1]["game_type"], "slots")
+        self.assertNotIn("game_id", first.data[0])
+
+    def test_unchanged_history_returns_304(self):
+        """Test a poll with the current ETag gets 304 until a new transaction lands"""
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Transaction.objects.create(user=self.user, amount=Decimal("9.00"), transaction_type="win")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
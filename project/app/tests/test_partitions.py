@@ -0,0 +1,62 @@
+import datetime
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from .. import partitions
+from ..models import CustomUser, RoundResult, Transaction
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning is PostgreSQL only")
+class PartitionTest(TestCase):
+    """Tests for the monthly partitions of the ledger and the round archive"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="months", email="months@example.com", password="pw-123456")
+
+    def partition_count(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {name}")
+            return cursor.fetchone()[0]
+
+    def test_new_month_takes_rows_from_default_partition(self):
+        """Test rows of a month without a partition land in the default one and move when it is created"""
+        month = datetime.datetime(2031, 5, 1, tzinfo=datetime.timezone.utc)
+        RoundResult.objects.create(user=self.user, played_at=month + datetime.timedelta(days=3), table="standard",
+                                   wagered=1, payout=2)
+        name = partitions.partition_name("app_roundresult", month)
+        self.assertNotIn(name, partitions.list_partitions(connection, "app_roundresult"))
+
+        self.assertIn(name, partitions.ensure_partitions(connection, "app_roundresult", "played_at", 0, now=month))
+        self.assertEqual(self.partition_count(name), 1)
+        self.assertEqual(self.partition_count("app_roundresult_default"), 0)
+        self.assertEqual(RoundResult.objects.filter(user=self.user).count(), 1)
+
+    def test_period_query_prunes_to_its_months(self):
+        """Test a bounded ledger window only scans the partitions it overlaps"""
+        now = timezone.now()
+        Transaction.objects.create(user=self.user, amount=5, transaction_type="win")
+        plan = Transaction.objects.filter(
+            transaction_type="win", timestamp__range=(now - datetime.timedelta(days=1), now)
+        ).explain()
+        scanned = {name for name in partitions.list_partitions(connection, "app_transaction") if name in plan}
+        self.assertLessEqual(len(scanned), 2, plan)
+        self.assertIn(partitions.partition_name("app_transaction", partitions.month_start(now)), scanned)
+        self.assertNotIn("app_transaction_default", scanned)
+
+    def test_detached_months_leave_the_ledger(self):
+        """Test detaching an old month hides its rows and keeps them in a plain table"""
+        old = datetime.datetime(2020, 3, 1, tzinfo=datetime.timezone.utc)
+        partitions.ensure_partitions(connection, "app_transaction", "timestamp", 0, now=old)
+        row = Transaction.objects.create(user=self.user, amount=5, transaction_type="win")
+        Transaction.objects.filter(pk=row.pk).update(timestamp=old + datetime.timedelta(days=1))
+        Transaction.objects.create(user=self.user, amount=7, transaction_type="win")
+
+        with connection.cursor() as cursor:
+            # Run the deferred foreign key checks of this test's inserts before altering the table
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        name = partitions.partition_name("app_transaction", old)
+        self.assertEqual(partitions.detach_before(connection, "app_transaction", partitions.add_months(old, 1)), [name])
+        self.assertEqual(list(Transaction.objects.values_list("amount", flat=True)), [7])
+        self.assertEqual(self.partition_count(name), 1)
+        self.user.delete()
@@ -0,0 +1,61 @@
+from decimal import Decimal
+from django.test import TestCase
+from django.urls import get_resolver, reverse
+from rest_framework.test import APIClient
+from .. import query_budgets
+from ..models import BlackjackGame, CustomUser
+from ..shoe import Shoe
+from ..query_budgets import QueryBudgetExceeded, query_budget
+
+
+class QueryBudgetTest(TestCase):
+    """Tests for the per-endpoint query budgets the test runner enforces"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="budget", email="budget@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_every_endpoint_has_a_budget(self):
+        """Test each named URL of the project is in BUDGETS"""
+        names = {name for name in get_resolver().reverse_dict if isinstance(name, str)}
+        self.assertEqual(names - set(query_budgets.BUDGETS), set())
+
+    def test_budgets_are_enforced_in_tests(self):
+        """Test the runner turned enforcement on, so requests within budget pass"""
+        self.assertTrue(query_budgets.enforced())
+        self.assertEqual(self.client.get(reverse("view-stats-me")).status_code, 200)
+
+    def test_exceeding_request_reports_sql_and_call_sites(self):
+        """Test a request over budget fails with its statements grouped by call site"""
+        with query_budget("view-stats-me", queries=0):
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                self.client.get(reverse("view-stats-me"))
+        message = str(raised.exception)
+        self.assertTrue(message.startswith("view-stats-me took 1 queries (budget 0)"), message)
+        self.assertIn('SELECT "app_userstatsrollup".', message)
+        self.assertIn("app/stats.py:", message)
+        self.assertIn("app/views.py:", message)
+        # The override ends with the block
+        self.assertEqual(self.client.get(reverse("view-stats-me")).status_code, 200)
+
+    @query_budget("view-stats-me", queries=None, rows=None)
+    def test_decorated_test_lifts_the_budget(self):
+        """Test query_budget decorates a test and None leaves a limit unchecked"""
+        self.assertEqual(query_budgets.budget_for("view-stats-me"), (None, None))
+        self.assertEqual(self.client.get(reverse("view-stats-me")).status_code, 200)
+
+    def test_settling_request_has_its_own_budget(self):
+        """Test a request that settles the round is checked against the view's settle budget"""
+        two, three = {"rank": "2", "suit": "H", "value": 2}, {"rank": "3", "suit": "S", "value": 3}
+        BlackjackGame.objects.create(
+            user=self.user, player_hands={"spot1": [two, three]}, dealer_hand=[three, two],
+            bets={"spot1": 10}, current_spot="spot1", **Shoe.shuffle().state(),
+        )
+        stand = {"action": "stand", "hand": "spot1", "process_dealer": True}
+        with query_budget("blackjack_action:settle", queries=0):
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                self.client.post(reverse("blackjack_action"), stand, format="json")
+        self.assertTrue(str(raised.exception).startswith("blackjack_action:settle took"), str(raised.exception))
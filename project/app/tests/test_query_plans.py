@@ -0,0 +1,99 @@
+import os
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection
+from django.db.models import Q, Sum
+from django.test import TestCase
+from django.utils import timezone
+from ..models import BlackjackGame, CustomUser, LeaderboardBucket, RoundResult, Transaction, UserStatsRollup
+
+# Hot queries that must be answered from an index. Each entry builds the
+# queryset for a seeded user; keep it in step with the code that runs it.
+HOT_QUERIES = {
+    "leaderboard window (group by wins)": lambda user, since: (
+        Transaction.objects.filter(transaction_type="win", timestamp__gte=since)
+        .values("user__username").annotate(total=Sum("amount")).order_by("-total")[:10]
+    ),
+    "win window scan": lambda user, since: Transaction.objects.filter(transaction_type="win", timestamp__gte=since),
+    "transactions by type and date": lambda user, since: Transaction.objects.filter(
+        transaction_type="purchase", timestamp__range=(since, timezone.now())
+    ),
+    "user totals by type": lambda user, since: Transaction.objects.filter(user=user, transaction_type="win").values("amount"),
+    "user history newest first": lambda user, since: Transaction.objects.filter(user=user).order_by("-timestamp")[:50],
+    "current blackjack game": lambda user, since: BlackjackGame.objects.filter(user=user).order_by("-created_at")[:1],
+    "leaderboard buckets": lambda user, since: (
+        LeaderboardBucket.objects.filter(bucket_start__gte=since)
+        .values("user__username").annotate(total=Sum("total")).order_by("-total")[:10]
+    ),
+    "stats rollup lookup": lambda user, since: UserStatsRollup.objects.filter(pk=user.pk),
+    "user history latest id (ETag)": lambda user, since: (
+        Transaction.objects.filter(user=user).order_by("-timestamp", "-id").values_list("id", flat=True)[:1]
+    ),
+    "user history keyset page": lambda user, since: (
+        Transaction.objects.filter(user=user).filter(Q(timestamp__lt=since) | Q(timestamp=since, id__lt=10**9))
+        .values_list("id", "amount", "transaction_type", "timestamp").order_by("-timestamp", "-id")[:101]
+    ),
+    "admin ledger keyset page": lambda user, since: (
+        Transaction.objects.filter(Q(timestamp__lt=since) | Q(timestamp=since, id__lt=10**9))
+        .values_list("id", "user__username", "amount").order_by("-timestamp", "-id")[:101]
+    ),
+    "round history keyset page": lambda user, since: (
+        RoundResult.objects.filter(user=user).filter(Q(played_at__lt=since) | Q(played_at=since, id__lt=10**9))
+        .values_list("id", "played_at", "results").order_by("-played_at", "-id")[:101]
+    ),
+}
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "EXPLAIN checks need PostgreSQL")
+class QueryPlanTest(TestCase):
+    """
+    Regression tests for the indexes behind the hot queries.
+
+    Seeds a small ledger, ANALYZEs it and disables sequential scans for the
+    planner, so any query that has no usable index still shows a Seq Scan.
+    Set QUERY_PLAN_DIR to keep every captured plan as a text file.
+    """
+
+    USERS = 20
+    TRANSACTIONS = 3000
+
+    @classmethod
+    def setUpTestData(cls):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f"plan_{i}", email=f"plan_{i}@example.com", password="!")
+            for i in range(cls.USERS)
+        ])
+        cls.user = users[0]
+        now = timezone.now()
+        types = ["win", "loss", "purchase", "game_bet"]
+        Transaction.objects.bulk_create([
+            Transaction(user=users[i % cls.USERS], amount=Decimal("5.00"), transaction_type=types[i % len(types)])
+            for i in range(cls.TRANSACTIONS)
+        ])
+        BlackjackGame.objects.bulk_create([BlackjackGame(user=user) for user in users])
+        LeaderboardBucket.objects.bulk_create([
+            LeaderboardBucket(user=user, bucket_start=now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=h))
+            for user in users for h in range(24)
+        ])
+        UserStatsRollup.objects.bulk_create([UserStatsRollup(user=user) for user in users])
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            for model in (CustomUser, Transaction, BlackjackGame, LeaderboardBucket, UserStatsRollup):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+            # Local to the test's transaction
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def test_hot_queries_use_indexes(self):
+        """Test no hot query plan contains a sequential scan"""
+        since = timezone.now() - timedelta(days=1)
+        plan_dir = os.environ.get("QUERY_PLAN_DIR")
+        for name, build in HOT_QUERIES.items():
+            with self.subTest(query=name):
+                plan = build(self.user, since).explain()
+                if plan_dir:
+                    os.makedirs(plan_dir, exist_ok=True)
+                    with open(os.path.join(plan_dir, name.replace(" ", "_") + ".txt"), "w") as f:
+                        f.write(plan)
+                self.assertNotIn("Seq Scan", plan, f"{name} is not using an index:\n{plan}")
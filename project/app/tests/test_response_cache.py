@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from .. import response_cache
+from ..models import CustomUser, Transaction
+from ..response_cache import cached_response
+
+
+class ResponseCacheTest(TestCase):
+    """Tests for the response cache of the public read endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        response_cache.local.clear()
+        response_cache._generations.clear()
+        self.user = CustomUser.objects.create_user(
+            username="cached", email="cached@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+        self.client = APIClient()
+
+    def win(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(user=self.user, amount=Decimal(amount), transaction_type="win")
+
+    def test_committed_wins_invalidate_the_leaderboard(self):
+        """Test a cached leaderboard is served without queries until a win commits"""
+        url = reverse("leaderboard", args=["week"])
+        self.assertEqual(self.client.get(url).json(), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), [])
+        # Other transaction types leave it alone
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(user=self.user, amount=Decimal("5.00"), transaction_type="purchase")
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.win("40.00")
+        [row] = self.client.get(url).json()
+        self.assertEqual((row["user__username"], Decimal(row["total_winnings"])), ("cached", 40))
+
+    def test_local_hits_make_no_round_trip(self):
+        """Test a response held by this worker is served without reading the shared cache"""
+        url = reverse("leaderboard", args=["week"])
+        self.client.get(url)
+        with mock.patch.object(response_cache, "shared", side_effect=AssertionError("shared cache read")):
+            self.assertEqual(self.client.get(url).json(), [])
+
+    def test_other_workers_invalidations_are_read_when_due(self):
+        """Test a generation token changed by another worker is picked up once the held one is due"""
+        url = reverse("leaderboard", args=["week"])
+        self.client.get(url)
+        # Another worker commits a win and invalidates the endpoint
+        with mock.patch.object(response_cache, "invalidate"):
+            self.win("40.00")
+        cache.set(response_cache._generation_key("leaderboard"), "other-worker", None)
+        self.assertEqual(self.client.get(url).json(), [])
+        with override_settings(RESPONSE_CACHE_GENERATION_SECONDS=0):
+            [row] = self.client.get(url).json()
+        self.assertEqual(row["user__username"], "cached")
+
+    def test_etag_and_cache_control(self):
+        """Test cached responses carry an ETag honoured with 304, and downstream cache headers"""
+        url = reverse("game-config")
+        response = self.client.get(url)
+        self.assertEqual(response["Cache-Control"], "public, max-age=300")
+        self.assertIn("Referer", response["Vary"])
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url)["ETag"], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(reverse("leaderboard", args=["day"]))
+        self.assertEqual(response["Cache-Control"], "public, max-age=5")
+        self.win("10.00")
+        self.assertNotEqual(self.client.get(reverse("leaderboard", args=["day"]))["ETag"], response["ETag"])
+
+    def test_authentication_still_runs_on_cached_endpoints(self):
+        """Test a cached private endpoint still refuses anonymous requests"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("available-games"))
+        self.assertEqual(response["Cache-Control"], "private, max-age=300")
+        self.assertEqual(APIClient().get(reverse("available-games")).status_code, 401)
+
+    def test_concurrent_misses_compute_once(self):
+        """Test requests missing the same key together run the view once, in threads and on the event loop"""
+        calls = []
+
+        def view(request):
+            calls.append(request)
+            time.sleep(0.1)
+            return JsonResponse({"calls": len(calls)})
+
+        cached = cached_response("test-single-flight", ttl=60)(view)
+        request = RequestFactory().get("/single-flight/")
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(cached(request))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({response.content for response in responses}, {b'{"calls": 1}'})
+        self.assertEqual(response_cache._flights, {})
+
+        async def aview(request):
+            calls.append(request)
+            await asyncio.sleep(0.1)
+            return JsonResponse({"calls": len(calls)})
+
+        acached = cached_response("test-single-flight", ttl=60)(aview)
+
+        async def gather():
+            return await asyncio.gather(*(acached(AsyncRequestFactory().get("/single-flight/")) for _ in range(5)))
+        responses = asyncio.run(gather())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual({response.content for response in responses}, {b'{"calls": 2}'})
+
+    def test_uncacheable_misses_never_compute_together(self):
+        """Test requests whose response cannot be cached still compute it one at a time"""
+        running, overlaps = [], []
+
+        def view(request):
+            running.append(1)
+            overlaps.append(len(running))
+            time.sleep(0.02)
+            running.pop()
+            return JsonResponse({}, status=503)
+
+        cached = cached_response("test-uncacheable", ttl=60)(view)
+        request = RequestFactory().get("/uncacheable/")
+        threads = [threading.Thread(target=cached, args=(request,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(overlaps), max(overlaps)), (8, 1))
+        self.assertEqual(response_cache._flights, {})
+
+    def test_another_workers_computation_is_awaited(self):
+        """Test a worker finding the key locked in the shared cache waits for the entry instead of computing it"""
+        calls = []
+        view = cached_response("test-shared-lock", ttl=60)(lambda request: calls.append(1) or JsonResponse({}))
+        request = RequestFactory().get("/shared-lock/")
+        key = response_cache._key("test-shared-lock", response_cache.generation("test-shared-lock"), request, (), "sync")
+        cache.add(f"{key}:lock", 1, 60)
+        entry = response_cache.Entry(200, None, b'{"from": "other"}', "application/json", '"other"', time.time() + 60)
+        threading.Timer(0.1, lambda: cache.set(key, entry, 60)).start()
+
+        self.assertEqual(view(request).content, b'{"from": "other"}')
+        self.assertEqual(calls, [])
@@ -0,0 +1,93 @@
+from decimal import Decimal
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from ..models import BlackjackGame, CustomUser, RoundResult, Transaction
+from ..shoe import Shoe, shoe_pool
+from ..utils import deal_initial_hands
+
+
+class RoundArchiveTest(TestCase):
+    """Tests for the settled-round archive and the history served from it"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="rounds", email="rounds@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def settle_round(self):
+        shoe = shoe_pool.acquire()
+        player_hands, dealer_hand = deal_initial_hands(shoe, num_hands=2)
+        BlackjackGame.objects.create(
+            user=self.user, player_hands=player_hands, dealer_hand=dealer_hand,
+            bets={"hand_1": 10, "hand_2": 5}, current_spot="hand_1", **shoe.state(),
+        )
+        response = self.client.post(
+            reverse("blackjack_action"), {"action": "stand", "hand": "hand_2", "process_dealer": True}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_settlement_archives_the_round(self):
+        """Test process_dealer replaces the game with a round holding every spot's result"""
+        data = self.settle_round()
+        self.assertFalse(BlackjackGame.objects.filter(user=self.user).exists())
+        archived = RoundResult.objects.get(user=self.user)
+        self.assertEqual(set(archived.results), {"hand_1", "hand_2"})
+        self.assertEqual(archived.wagered, Decimal("15.00"))
+        self.assertEqual(archived.payout, Decimal(str(data["new_balance"])) - Decimal("100.00"))
+        self.assertTrue(archived.shoe_seed)
+
+    def test_mixed_int_and_float_bets_settle(self):
+        """Test a natural on an int bet and a win on a float bet pay out together in Decimal"""
+        def card(rank, value):
+            return {"rank": rank, "suit": "S", "value": value}
+        BlackjackGame.objects.create(
+            user=self.user,
+            player_hands={"spot1": [card("A", 11), card("K", 10)], "spot2": [card("10", 10), card("9", 9)]},
+            dealer_hand=[card("10", 10), card("8", 8)],
+            bets={"spot1": 50, "spot2": 25.5}, current_spot="spot2", **Shoe.shuffle().state(),
+        )
+        response = self.client.post(
+            reverse("blackjack_action"), {"action": "stand", "hand": "spot2", "process_dealer": True}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        archived = RoundResult.objects.get(user=self.user)
+        self.assertEqual(archived.results, {"spot1": "blackjack", "spot2": "win"})
+        # 50 * 2.5 + 25.50 * 2
+        self.assertEqual(archived.payout, Decimal("176.00"))
+        self.assertEqual(response.json()["new_balance"], 276.0)
+
+    def test_stand_settles_like_process_dealer(self):
+        """Test blackjack_stand archives the round, records only the profit and cannot pay twice"""
+        def card(rank, value):
+            return {"rank": rank, "suit": "S", "value": value}
+        game = BlackjackGame.objects.create(
+            user=self.user, player_hands={"spot1": [card("10", 10), card("9", 9)]},
+            dealer_hand=[card("10", 10), card("8", 8)], bets={"spot1": 10}, current_spot="spot1",
+            **Shoe.shuffle().state(),
+        )
+        url = reverse("blackjack-stand", args=[game.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.json()["results"], response.json()["payouts"]), ({"spot1": "WIN"}, 20.0))
+        self.assertEqual(RoundResult.objects.get(user=self.user).payout, Decimal("20.00"))
+        self.assertEqual(Transaction.objects.get(user=self.user, transaction_type="win").amount, Decimal("10.00"))
+
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("120.00"))
+
+    def test_history_pages_through_rounds(self):
+        """Test game_history serves archived rounds newest first with a next-page cursor"""
+        for _ in range(3):
+            self.settle_round()
+        first = self.client.get(reverse("game-history"), {"limit": 2})
+        self.assertEqual([row["hands"] for row in first.json()], [2, 2])
+        second = self.client.get(reverse("game-history"), {"limit": 2, "cursor": first["X-Next-Cursor"]})
+        ids = [row["id"] for row in first.json() + second.json()]
+        self.assertEqual(ids, sorted(RoundResult.objects.values_list("id", flat=True), reverse=True))
+        self.assertNotIn("X-Next-Cursor", second)
+
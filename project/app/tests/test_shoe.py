@@ -0,0 +1,84 @@
+from django.core.management import call_command
+from django.test import TestCase
+from io import StringIO
+from ..cards import from_legacy
+from ..models import CustomUser, BlackjackGame
+from ..shoe import Shoe, ShoePool
+from ..utils import create_deck
+
+
+class ShoePoolTest(TestCase):
+    """Tests for the pre-shuffled shoe pool"""
+
+    def setUp(self):
+        # refill_rate=0 keeps the background thread out of the tests
+        self.pool = ShoePool(size=4, refill_rate=0, decks=2, penetration=0.5)
+
+    def test_acquire_builds_full_shoe_when_empty(self):
+        """Test a dry pool still deals a full, shuffled shoe"""
+        shoe = self.pool.acquire()
+        self.assertEqual(len(shoe), 104)
+        self.assertEqual(shoe.cut_card, 52)
+        self.assertFalse(shoe.needs_shuffle)
+
+    def test_released_shoe_deals_next_round(self):
+        """Test the rest of a shoe is reused until the cut card"""
+        shoe = self.pool.acquire()
+        for _ in range(10):
+            shoe.draw()
+        self.pool.release(shoe)
+        self.assertIs(self.pool.acquire(), shoe)
+
+    def test_shoe_past_cut_card_is_discarded(self):
+        """Test a shoe is not reused once the cut card is out"""
+        shoe = self.pool.acquire()
+        shoe.cursor = 52
+        self.pool.release(shoe)
+        self.assertIsNot(self.pool.acquire(), shoe)
+
+
+class SeededShoeTest(TestCase):
+    """Tests for shoes stored as a seed and a cursor"""
+
+    def test_shoe_is_a_permutation_of_the_decks(self):
+        """Test a seeded shoe deals every card of every deck exactly once"""
+        shoe = Shoe.shuffle(decks=6)
+        codes = [shoe.draw_code() for _ in range(312)]
+        self.assertEqual(sorted(codes), list(range(312)))
+        self.assertNotEqual(codes, list(range(312)))
+        with self.assertRaises(IndexError):
+            shoe.draw()
+
+    def test_seed_replays_the_same_cards(self):
+        """Test a shoe rebuilt from its seed and cursor continues the same deal"""
+        shoe = Shoe.shuffle(decks=6)
+        dealt = [shoe.draw() for _ in range(20)]
+        replay = Shoe(shoe.seed, 10, decks=6)
+        self.assertEqual(replay.dealt(), dealt[:10])
+        self.assertEqual([replay.draw() for _ in range(10)], dealt[10:])
+
+    def test_game_row_stores_seed_not_cards(self):
+        """Test actions on a seeded game advance the cursor and leave deck empty"""
+        user = CustomUser.objects.create_user(username="shoeuser", email="shoe@example.com", password="pw-123456")
+        pool = ShoePool(size=0, refill_rate=0)
+        shoe = pool.acquire()
+        game = BlackjackGame.objects.create(user=user, player_hands={"spot1": [[shoe.draw(), shoe.draw()]]}, **shoe.state())
+        game = BlackjackGame.objects.get(pk=game.pk)
+        loaded = pool.load(game)
+        loaded.draw()
+        game.save(update_fields=loaded.store(game))
+        game.refresh_from_db()
+        self.assertEqual(game.deck, [])
+        self.assertEqual(game.shoe_cursor, 3)
+        self.assertEqual(len(game.shoe_seed), 32)
+
+    def test_migrate_legacy_shoes(self):
+        """Test the migration command converts deck lists, keeping the cards left"""
+        user = CustomUser.objects.create_user(username="legacyshoe", email="legacy@example.com", password="pw-123456")
+        game = BlackjackGame.objects.create(user=user, deck=create_deck(6)[:100])
+        call_command("migrate_legacy_shoes", batch_size=1, stdout=StringIO())
+        game.refresh_from_db()
+        self.assertEqual(game.deck, [])
+        shoe = ShoePool(size=0, refill_rate=0).load(game)
+        self.assertEqual(len(shoe), 100)
+        self.assertIsNotNone(from_legacy(shoe.draw()))
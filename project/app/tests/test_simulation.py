@@ -0,0 +1,81 @@
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from io import StringIO
+import json
+from .. import rules, simulation
+from ..cards import ACE, encode, hand_state
+
+
+class RulesTest(TestCase):
+    """Tests for the shared table rules"""
+
+    def test_outcomes_and_payouts(self):
+        """Test busts lose first, then naturals, dealer busts and totals decide"""
+        table = rules.TableRules()
+        self.assertEqual(table.outcome(22, 23), rules.BUST)
+        self.assertEqual(table.outcome(12, 22), rules.WIN)
+        self.assertEqual(table.outcome(20, 19), rules.WIN)
+        self.assertEqual(table.outcome(17, 18), rules.LOSS)
+        self.assertEqual(table.outcome(18, 18), rules.PUSH)
+        self.assertEqual(table.outcome(21, 21, player_natural=True), rules.BLACKJACK)
+        self.assertEqual(table.outcome(21, 21, player_natural=True, dealer_natural=True), rules.PUSH)
+        self.assertEqual(table.outcome(21, 21, dealer_natural=True), rules.LOSS)
+        self.assertEqual(table.outcome(16, 20, surrendered=True), rules.SURRENDER)
+        results = (rules.WIN, rules.PUSH, rules.LOSS, rules.BUST, rules.BLACKJACK, rules.SURRENDER)
+        self.assertEqual([table.payout(r, 10) for r in results], [20, 10, 0, 0, 25, 5])
+        self.assertEqual(rules.TableRules(blackjack_pays="6:5").payout(rules.BLACKJACK, 10), 22)
+
+    def test_soft_17_rule(self):
+        """Test the dealer hits 16 always and soft 17 only on an H17 table"""
+        six, ten = encode(4), encode(8)
+        soft_17 = hand_state([encode(ACE), six])
+        self.assertTrue(rules.TableRules().dealer_hits(hand_state([six, ten])))
+        self.assertFalse(rules.TableRules().dealer_hits(soft_17))
+        self.assertTrue(rules.TableRules(dealer_hits_soft_17=True).dealer_hits(soft_17))
+        self.assertFalse(rules.TableRules(dealer_hits_soft_17=True).dealer_hits(hand_state([ten, encode(5)])))
+
+    def test_configured_tables(self):
+        """Test tables come from settings and unknown names fall back to the default"""
+        self.assertEqual(rules.get_table("vegas-6to5").blackjack_pays, "6:5")
+        self.assertEqual(rules.get_table("no-such-table").name, "standard")
+        with self.assertRaises(ValueError):
+            rules.TableRules(blackjack_pays="three to two")
+
+
+class SimulationTest(TestCase):
+    """Tests for the Monte Carlo simulator"""
+
+    def test_results_do_not_depend_on_workers(self):
+        """Test the same seed gives identical tallies inline and on a process pool"""
+        rounds = simulation.CHUNK_ROUNDS + 500
+        inline = simulation.simulate(rounds, seed="fixed", workers=1).summary()
+        pooled = simulation.simulate(rounds, seed="fixed", workers=2).summary()
+        self.assertEqual(inline, pooled)
+        self.assertEqual(inline["rounds"], rounds)
+
+    def test_basic_strategy_edge(self):
+        """Test basic strategy beats mimicking the dealer and lands near the known edge"""
+        basic = simulation.simulate(40000, seed=1).summary()
+        mimic = simulation.simulate(40000, simulation.MIMIC_DEALER, seed=1).summary()
+        self.assertLess(abs(basic["house_edge"] - 0.005), 0.02)
+        self.assertLess(basic["house_edge"], mimic["house_edge"])
+        self.assertEqual(simulation.simulate(2000, simulation.NEVER_BUST, seed=1).player_busts, 0)
+
+    def test_worse_rules_raise_the_edge(self):
+        """Test 6:5 naturals, H17 and no surrender cost the player on the same shoes"""
+        standard = simulation.simulate(40000, seed=2).summary()
+        vegas = simulation.simulate(40000, table=rules.get_table("vegas-6to5"), seed=2).summary()
+        # 6:5 alone is worth about 1.4%
+        self.assertGreater(vegas["house_edge"] - standard["house_edge"], 0.01)
+        self.assertEqual(vegas["surrender_rate"], 0)
+        self.assertGreater(standard["surrender_rate"], 0)
+
+    def test_command_reports_json(self):
+        """Test simulate_blackjack prints a JSON summary and rejects bad tables"""
+        out = StringIO()
+        call_command("simulate_blackjack", rounds=1000, workers=1, table="vegas-6to5", json=True, stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["rounds"], 1000)
+        with self.assertRaises(CommandError):
+            call_command("simulate_blackjack", rounds=10, table="no-such-table", stdout=out)
+        with self.assertRaises(ValueError):
+            simulation.Strategy({"hard": {16: "SSSS"}})
@@ -0,0 +1,77 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from io import StringIO
+from rest_framework.test import APIClient
+from .. import stats
+from ..models import CustomUser, Transaction, UserStatsRollup
+from ..signals import ledger_written
+
+
+class StatsRollupTest(TestCase):
+    """Tests for the per-user stats rollup"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="statsuser", email="stats@example.com", password="pw-123456")
+
+    def _ledger(self):
+        Transaction.objects.create(user=self.user, amount=Decimal("40.00"), transaction_type="win")
+        Transaction.objects.create(user=self.user, amount=Decimal("10.00"), transaction_type="win")
+        Transaction.objects.create(user=self.user, amount=Decimal("15.00"), transaction_type="loss")
+        Transaction.objects.create(user=self.user, amount=Decimal("100.00"), transaction_type="purchase")
+
+    def test_ledger_writes_update_rollup(self):
+        """Test each transaction insert is added to the totals and counts"""
+        self._ledger()
+        rollup = UserStatsRollup.objects.get(pk=self.user.pk)
+        self.assertEqual((rollup.win_total, rollup.win_count), (Decimal("50.00"), 2))
+        self.assertEqual((rollup.loss_total, rollup.loss_count), (Decimal("15.00"), 1))
+        self.assertEqual((rollup.purchase_total, rollup.purchase_count), (Decimal("100.00"), 1))
+        self.assertIsNotNone(rollup.last_activity)
+
+    def test_last_activity_never_moves_back(self):
+        """Test a transaction stamped before the last activity leaves it where it is"""
+        self._ledger()
+        latest = UserStatsRollup.objects.get(pk=self.user.pk).last_activity
+        # As a bulk writer settling an older row would report it
+        late = Transaction(user=self.user, amount=Decimal("5.00"), transaction_type="win", timestamp=latest - timedelta(days=1))
+        ledger_written.send(sender=Transaction, transactions=[late])
+        rollup = UserStatsRollup.objects.get(pk=self.user.pk)
+        self.assertEqual((rollup.win_count, rollup.last_activity), (3, latest))
+
+    def test_view_stats_is_one_lookup(self):
+        """Test view_stats answers from the rollup with a single query"""
+        self._ledger()
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse("view-stats", args=[self.user.id])
+        with self.assertNumQueries(1):
+            response = client.get(url)
+        data = response.json()
+        self.assertEqual(data["total_winnings"], "50.00")
+        self.assertEqual(data["net_winnings"], "35.00")
+        self.assertEqual(data["total_spins"], 2)
+
+    def test_game_statistics_from_rollup(self):
+        """Test game_statistics reports rounds, hands and money from the rollup"""
+        self._ledger()
+        stats.record_round(self.user, ["win", "loss"])
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse("game-statistics"))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["total_games"], data["wins"], data["losses"], data["win_rate"]), (1, 1, 1, 50.0))
+        self.assertEqual((data["money_won"], data["money_lost"], data["net_profit"]), ("50.00", "15.00", "35.00"))
+
+    def test_rebuild_matches_incremental(self):
+        """Test rebuilding from history keeps round outcomes and restores ledger totals"""
+        self._ledger()
+        stats.record_round(self.user, ["win", "push"])
+        UserStatsRollup.objects.filter(pk=self.user.pk).update(win_total=0, win_count=0, loss_total=999)
+        call_command("rebuild_stats_rollups", chunk_size=1, stdout=StringIO())
+        rollup = UserStatsRollup.objects.get(pk=self.user.pk)
+        self.assertEqual((rollup.win_total, rollup.win_count, rollup.loss_total), (Decimal("50.00"), 2, Decimal("15.00")))
+        self.assertEqual((rollup.rounds_played, rollup.hands_won, rollup.hands_pushed), (1, 1, 1))
@@ -0,0 +1,90 @@
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .. import metrics, token_store
+from ..authentication import blacklist_token, issue_token
+from ..models import CustomUser, RevokedToken
+
+
+def worker(store, refresh_seconds=0):
+    """A RevocationFilter as one worker process would hold it"""
+    return token_store.RevocationFilter(store, ttl=3600, refresh_seconds=refresh_seconds, capacity=1000)
+
+
+class TokenStoreTest(TestCase):
+    """Tests for the shared token revocation store and its bloom-filter front"""
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_revocation_reaches_other_workers(self):
+        """Test a token revoked by one worker is rejected by another after its refresh"""
+        store = token_store.DatabaseTokenStore()
+        first, second = worker(store), worker(store)
+        self.assertFalse(second.is_revoked("token-a"))
+        first.revoke("token-a")
+        self.assertTrue(first.is_revoked("token-a"))
+        self.assertTrue(second.is_revoked("token-a"))
+        self.assertFalse(second.is_revoked("token-b"))
+        self.assertFalse(RevokedToken.objects.filter(token_hash__contains="token").exists())
+
+    def test_valid_token_costs_no_queries(self):
+        """Test a token absent from the bloom filter is accepted without touching the store"""
+        revocations = worker(token_store.DatabaseTokenStore(), refresh_seconds=3600)
+        revocations.revoke("logged-out")
+        revocations.is_revoked("warm-up")
+        with self.assertNumQueries(0):
+            self.assertFalse(revocations.is_revoked("still-valid"))
+        with self.assertNumQueries(1):
+            self.assertTrue(revocations.is_revoked("logged-out"))
+
+    def test_sync_is_not_charged_to_the_request(self):
+        """Test the filter's periodic sync stays out of the query count of the request it runs in"""
+        revocations = worker(token_store.DatabaseTokenStore())
+        cost, token = metrics.start_request()
+        try:
+            with self.assertNumQueries(1):
+                self.assertFalse(revocations.is_revoked("still-valid"))
+        finally:
+            metrics.end_request(token)
+        self.assertEqual(cost.queries, 0)
+
+    def test_cache_store_journal(self):
+        """Test the cache backend shares revocations through its journal"""
+        store = token_store.CacheTokenStore("default")
+        first, second = worker(store), worker(store)
+        second.is_revoked("warm-up")
+        first.revoke("token-c")
+        self.assertTrue(second.is_revoked("token-c"))
+        self.assertEqual(store.changes_since(0)[0], [token_store.token_hash("token-c")])
+
+    def test_purge_drops_expired_revocations(self):
+        """Test purge deletes only revocations past their expiry"""
+        store = token_store.DatabaseTokenStore()
+        store.revoke(token_store.token_hash("old"), timezone.now() - timedelta(seconds=1))
+        store.revoke(token_store.token_hash("new"), timezone.now() + timedelta(hours=1))
+        self.assertEqual(store.purge(), 1)
+        self.assertFalse(store.is_revoked(token_store.token_hash("old")))
+        self.assertTrue(store.is_revoked(token_store.token_hash("new")))
+
+    def test_only_valid_tokens_are_revoked(self):
+        """Test logging out records a token read_token accepts, until it expires, and ignores anything else"""
+        user = CustomUser.objects.create_user(username="leaving", email="leaving@example.com", password="pass")
+        token = issue_token(user)
+        # A worker of its own: the token must not stay revoked for later tests
+        patcher = mock.patch.object(token_store, "_revocations", worker(token_store.DatabaseTokenStore()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with override_settings(TOKEN_MAX_AGE=-1):
+            blacklist_token(token)
+        for forged in ("not-a-token", "v1.e30:1a2b3c:forged", token[:-1] + ("A" if token[-1] != "A" else "B")):
+            blacklist_token(forged)
+        self.assertFalse(RevokedToken.objects.exists())
+
+        blacklist_token(token)
+        revoked = RevokedToken.objects.get()
+        self.assertEqual(revoked.token_hash, token_store.token_hash(token))
+        self.assertLessEqual(revoked.expires_at, timezone.now() + timedelta(seconds=settings.TOKEN_MAX_AGE))
@@ -0,0 +1,70 @@
+from unittest import mock
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from .. import ledger, user_cache
+from ..authentication import TokenAuthentication, issue_token
+from ..models import CustomUser
+
+
+class SignedTokenTest(TestCase):
+    """Tests for signed bearer tokens and the per-worker user cache"""
+
+    def setUp(self):
+        user_cache.users.clear()
+        self.user = CustomUser.objects.create_user(username="signed", email="signed@example.com", password="pw-123456")
+        self.auth = TokenAuthentication()
+
+    def tearDown(self):
+        user_cache.users.clear()
+
+    def authenticate(self, token):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return self.auth.authenticate(request)
+
+    def test_cached_user_needs_no_query(self):
+        """Test a signed token resolves its user from the cache after the first request"""
+        token = issue_token(self.user)
+        self.assertEqual(self.authenticate(token)[0], self.user)
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(token)
+        self.assertEqual(user.pk, self.user.pk)
+        user.balance = 999
+        self.assertEqual(self.authenticate(token)[0].balance, 0)
+
+    def test_tampered_and_expired_tokens_are_rejected(self):
+        """Test a modified signature or an expired token fails authentication"""
+        token = issue_token(self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+        with self.settings(TOKEN_MAX_AGE=-1), self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_unsigned_tokens_are_rejected(self):
+        """Test tokens without a signature, such as a forged user_id:N, get 401 and never pick a user"""
+        client = APIClient()
+        for token in (f"user_id:{self.user.pk}", f"test_token_user_id:{self.user.pk}:0a1b", "test", "anything"):
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            response = client.get(reverse("view-stats", args=[self.user.pk]))
+            self.assertEqual(response.status_code, 401, token)
+
+    def test_balance_and_password_changes_evict(self):
+        """Test ledger writes refresh the cached user and a new password invalidates old tokens"""
+        token = issue_token(self.user)
+        self.authenticate(token)
+        ledger.credit(self.user, 25)
+        self.assertEqual(self.authenticate(token)[0].balance, 25)
+
+        self.user.set_password("new-pw-654321")
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        self.assertEqual(self.authenticate(issue_token(self.user))[0].pk, self.user.pk)
+
+    def test_cache_expires_entries(self):
+        """Test an entry older than its TTL is read again from the database"""
+        cache = user_cache.UserCache(size=2, ttl=10)
+        cache.put(self.user)
+        with mock.patch("app.user_cache.time.monotonic", return_value=float("inf")):
+            self.assertIsNone(cache.get(self.user.pk))
@@ -0,0 +1,80 @@
+import json
+from asgiref.sync import async_to_sync
+from decimal import Decimal
+from django.test import AsyncRequestFactory, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from .. import views_async
+from ..authentication import issue_token
+from ..models import BlackjackGame, CustomUser, RoundResult
+from ..shoe import Shoe
+
+
+class AsyncViewsTest(TestCase):
+    """Tests for the async views served in SERVER_MODE=asgi"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="async", email="async@example.com", password="pw-123456", balance=Decimal("100.00")
+        )
+        self.auth = {"headers": {"Authorization": f"Bearer {issue_token(self.user)}"}}
+        self.factory = AsyncRequestFactory()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth["headers"]["Authorization"])
+
+    def test_read_endpoints_answer_like_sync_views(self):
+        """Test each async read view returns the sync view's payload"""
+        for view, args, name in (
+            (views_async.leaderboard, ("week",), "leaderboard"),
+            (views_async.top_winners, (), "top-winners"),
+            (views_async.last_spin, (self.user.pk,), "last-spin"),
+            (views_async.view_stats, (self.user.pk,), "view-stats"),
+            (views_async.game_config, (), "game-config"),
+            (views_async.available_games, (), "available-games"),
+        ):
+            url = reverse(name, args=args)
+            response = async_to_sync(view)(self.factory.get(url, **self.auth), *args)
+            expected = self.client.get(url)
+            self.assertEqual(response.status_code, expected.status_code, name)
+            self.assertEqual(json.loads(response.content), expected.json(), name)
+
+    async def test_authentication_is_required(self):
+        """Test a missing or revoked token gets the 401 DRF would send"""
+        response = await views_async.view_stats(self.factory.get("/view-stats/me/"), "me")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], "Bearer")
+        response = await views_async.view_stats(
+            self.factory.get("/view-stats/me/", headers={"Authorization": "Bearer v1.forged"}), "me"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stats_of_another_user_are_forbidden(self):
+        """Test view_stats refuses other users and reports unknown ones"""
+        other = await CustomUser.objects.acreate(username="other", email="other@example.com")
+        response = await views_async.view_stats(self.factory.get("/", **self.auth), other.pk)
+        self.assertEqual(response.status_code, 403)
+        response = await views_async.view_stats(self.factory.get("/", **self.auth), other.pk + 1000)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_hit_on_the_event_loop_then_stand_settles(self):
+        """Test a hit is dealt by the async view and a stand is handed to the sync view"""
+        two = {"rank": "2", "suit": "H", "value": 2}
+        await BlackjackGame.objects.acreate(
+            user=self.user, player_hands={"spot1": [two, two]}, dealer_hand=[two, two],
+            bets={"spot1": 10}, current_spot="spot1", **Shoe.shuffle().state(),
+        )
+
+        def action(body):
+            request = self.factory.post(
+                "/blackjack/action/", json.dumps(body), content_type="application/json", **self.auth
+            )
+            return views_async.blackjack_action(request)
+
+        response = await action({"action": "hit", "hand": "spot1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)["player_hands"]["spot1"]), 3)
+
+        response = await action({"action": "stand", "hand": "spot1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("results", json.loads(response.content))
+        self.assertEqual(await RoundResult.objects.filter(user=self.user).acount(), 1)
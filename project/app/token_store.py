@@ -0,0 +1,227 @@
+"""
+Revoked (logged-out) bearer tokens, shared by every worker process.
+
+Tokens are stored as sha256 digests, never in the clear, and expire with the
+token, or after TOKEN_REVOCATION_TTL seconds if sooner. Two backends, chosen by TOKEN_STORE:
+
+- ``DatabaseTokenStore``: the RevokedToken table (SQLite or PostgreSQL);
+  expired rows are deleted by ``purge()`` (purge_revoked_tokens command).
+- ``CacheTokenStore``: a Django cache alias (memcached, redis, ...). Entries
+  expire on their own; a numbered journal lets workers see new revocations.
+
+Every worker screens tokens through a ``RevocationFilter``: a bloom filter of
+the revoked digests. A token that is not in the filter (nearly every request)
+is accepted without any I/O; a hit is confirmed against the store, so false
+positives only cost a lookup. The filter pulls other workers' revocations
+every TOKEN_BLOOM_REFRESH_SECONDS, which bounds how long a token logged out on
+another worker can still be used; revocations made by this worker apply
+immediately.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import metrics
+from .models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class DatabaseTokenStore:
+    """Revocations in the RevokedToken table."""
+
+    def revoke(self, digest, expires_at):
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(token_hash=digest, expires_at=expires_at)], ignore_conflicts=True
+        )
+
+    def is_revoked(self, digest):
+        return RevokedToken.objects.filter(token_hash=digest, expires_at__gt=timezone.now()).exists()
+
+    def changes_since(self, marker):
+        """Digests revoked after ``marker`` (0: all live ones) and the new marker."""
+        rows = list(
+            RevokedToken.objects.filter(pk__gt=marker, expires_at__gt=timezone.now())
+            .order_by("pk").values_list("pk", "token_hash")
+        )
+        return [digest for _, digest in rows], (rows[-1][0] if rows else marker)
+
+    def purge(self):
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class CacheTokenStore:
+    """
+    Revocations in a Django cache: ``<prefix>:<digest>`` answers lookups and
+    ``<prefix>:journal:<n>`` records the n-th revocation for ``changes_since``.
+    """
+
+    JOURNAL_BATCH = 500
+
+    def __init__(self, alias, prefix="revoked"):
+        self.cache = caches[alias]
+        self.prefix = prefix
+
+    def _seq_key(self):
+        return f"{self.prefix}:seq"
+
+    def revoke(self, digest, expires_at):
+        ttl = max(int((expires_at - timezone.now()).total_seconds()), 1)
+        self.cache.set(f"{self.prefix}:{digest}", 1, ttl)
+        self.cache.add(self._seq_key(), 0, None)
+        seq = self.cache.incr(self._seq_key())
+        self.cache.set(f"{self.prefix}:journal:{seq}", digest, ttl)
+
+    def is_revoked(self, digest):
+        return self.cache.get(f"{self.prefix}:{digest}") is not None
+
+    def changes_since(self, marker):
+        seq = self.cache.get(self._seq_key(), 0)
+        if seq < marker:
+            # The cache was flushed and the journal restarted
+            marker = 0
+        digests = []
+        for start in range(marker + 1, seq + 1, self.JOURNAL_BATCH):
+            keys = [f"{self.prefix}:journal:{n}" for n in range(start, min(start + self.JOURNAL_BATCH, seq + 1))]
+            digests.extend(self.cache.get_many(keys).values())
+        return digests, seq
+
+    def purge(self):
+        # Entries carry their own timeout
+        return 0
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over hex digests."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(capacity, 1)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest):
+        # sha256 output is already uniform: double hashing from two slices of it
+        h1, h2 = int(digest[:16], 16), int(digest[16:32], 16) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, digest):
+        if digest in self:
+            return
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class RevocationFilter:
+    """Per-worker bloom filter in front of a token store."""
+
+    # Journal entries re-read on every refresh: a revocation numbered before
+    # the marker may become visible only after it (concurrent inserts)
+    REPLAY = 100
+
+    def __init__(self, store, ttl, refresh_seconds, capacity):
+        self.store = store
+        self.ttl = ttl
+        self.refresh_seconds = refresh_seconds
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(capacity)
+        self._marker = 0
+        self._synced_at = None
+        self._rebuilt_at = None
+
+    def revoke(self, token, expires_at=None):
+        digest = token_hash(token)
+        latest = timezone.now() + timedelta(seconds=self.ttl)
+        self.store.revoke(digest, min(expires_at, latest) if expires_at else latest)
+        with self._lock:
+            self._bloom.add(digest)
+
+    def is_revoked(self, token):
+        digest = token_hash(token)
+        self._sync()
+        if digest not in self._bloom:
+            return False
+        return self.store.is_revoked(digest)
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if self._synced_at is not None and now - self._synced_at < self.refresh_seconds:
+                return
+            if self._rebuilt_at is None or now - self._rebuilt_at >= self.ttl or self._bloom.count > self._bloom.capacity:
+                # Expired digests cannot be removed from a bloom filter; start
+                # over from the live revocations, with room to grow
+                with metrics.uncounted():
+                    digests, self._marker = self.store.changes_since(0)
+                self._bloom = BloomFilter(max(self.capacity, 2 * len(digests)))
+                self._rebuilt_at = now
+                logger.info("Loaded %s revoked tokens", len(digests))
+            else:
+                start = max(self._marker - self.REPLAY, 0)
+                with metrics.uncounted():
+                    digests, marker = self.store.changes_since(start)
+                # A marker behind the start means the store restarted its journal
+                self._marker = marker if marker < start else max(marker, self._marker)
+            for digest in digests:
+                self._bloom.add(digest)
+            self._synced_at = now
+
+
+def build_store():
+    if settings.TOKEN_STORE == "cache":
+        return CacheTokenStore(settings.TOKEN_STORE_CACHE)
+    if settings.TOKEN_STORE == "database":
+        return DatabaseTokenStore()
+    raise ValueError(f"Unknown TOKEN_STORE: {settings.TOKEN_STORE!r}")
+
+
+_revocations = None
+_revocations_lock = threading.Lock()
+
+
+def revocations():
+    """This worker's RevocationFilter, built from settings on first use."""
+    global _revocations
+    if _revocations is None:
+        with _revocations_lock:
+            if _revocations is None:
+                _revocations = RevocationFilter(
+                    build_store(),
+                    ttl=settings.TOKEN_REVOCATION_TTL,
+                    refresh_seconds=settings.TOKEN_BLOOM_REFRESH_SECONDS,
+                    capacity=settings.TOKEN_BLOOM_CAPACITY,
+                )
+    return _revocations
+
+
+def revoke(token, expires_at=None):
+    revocations().revoke(token, expires_at)
+
+
+def is_revoked(token):
+    return revocations().is_revoked(token)
+
+
+def purge():
+    """Delete expired revocations from the store; returns how many."""
+    return revocations().store.purge()
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import RegisterUserView, login_user, logout_user, leaderboard, update_spin, last_spin
 from .views import purchase_coins, view_stats, account_info, verify_password
-from .views import start_blackjack, blackjack_action, update_balance, blackjack_last_action, blackjack_reset
+from .views import start_blackjack, blackjack_action, blackjack_actions, update_balance, blackjack_last_action, blackjack_reset
 from .views import blackjack_hit, blackjack_stand, game_config, game_statistics
 from .views import admin_user_list, admin_transaction_list, admin_transaction_filter, admin_user_detail
 from .views import admin_modify_user, admin_modify_wallet
@@ -10,11 +10,21 @@ from .views import user_transactions, top_winners
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 from .views_transactions import create_transaction, transaction_detail, transaction_status
+from django.conf import settings
+
+if settings.SERVER_MODE == "asgi":
+    # Same endpoints, served on the event loop
+    from .views_async import leaderboard, top_winners, last_spin, view_stats, game_config, available_games  # noqa: F811
+    from .views_async import blackjack_action, event_stream  # noqa: F811
 
 # Create stub/mock views for endpoints that aren't implemented yet
 def stub_view(request, *args, **kwargs):
     return JsonResponse({"message": "API endpoint not fully implemented"}, status=501)
 
+if settings.SERVER_MODE != "asgi":
+    # A stream would hold a sync worker each; clients keep fetching instead
+    event_stream = stub_view  # noqa: F811
+
 urlpatterns = [
     # User authentication
     path('users/', RegisterUserView.as_view(), name='user-register'),
@@ -56,8 +66,12 @@ urlpatterns = [
     path('blackjack/hit/<int:game_id>/', blackjack_hit, name='blackjack-hit'),
     path('blackjack/stand/<int:game_id>/', blackjack_stand, name='blackjack-stand'),
     path('blackjack/action/', blackjack_action, name='blackjack_action'),
+    path('blackjack/actions/', blackjack_actions, name='blackjack-actions'),
     path('blackjack/last_action/', blackjack_last_action, name='blackjack_last_action'),
     path('blackjack/reset/', blackjack_reset, name='blackjack_reset'),
+
+    # Push events (server-sent events, SERVER_MODE=asgi)
+    path('events/', event_stream, name='events'),
     
     # Admin endpoints
     path('admin/users/', admin_user_list, name='admin-users'),
@@ -0,0 +1,87 @@
+"""
+Per-worker cache of authenticated users.
+
+TokenAuthentication resolves the user id of a signed token here instead of
+querying CustomUser on every request. Entries live AUTH_USER_CACHE_SECONDS at
+most (least recently used are dropped beyond AUTH_USER_CACHE_SIZE) and are
+evicted as soon as this worker saves the user or changes their balance
+(ledger writes). Changes made by another worker show up here once the entry
+expires, so balances and permissions that must be exact are re-read by the
+code that relies on them (the ledger's conditional UPDATEs do this already).
+
+Callers get a copy of the cached instance, so a request that mutates
+``request.user`` never leaks into another.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+
+
+class UserCache:
+    """Thread-safe LRU of user instances with a time-to-live."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        """The user with ``pk`` (a private copy), or None if not cached or expired."""
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is None:
+                return None
+            user, expires = entry
+            if time.monotonic() >= expires:
+                del self._entries[pk]
+                return None
+            self._entries.move_to_end(pk)
+        return copy.copy(user)
+
+    def put(self, user):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[user.pk] = (copy.copy(user), time.monotonic() + self.ttl)
+            self._entries.move_to_end(user.pk)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._entries.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+users = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_SECONDS)
+
+
+def get_user(pk):
+    """The user with ``pk`` from the cache or the database (None if there is none)."""
+    user = users.get(pk)
+    if user is None:
+        user = CustomUser.objects.filter(pk=pk).first()
+        if user is not None:
+            users.put(user)
+    return user
+
+
+def invalidate(pk):
+    users.invalidate(pk)
+
+
+@receiver(post_save, sender=CustomUser, dispatch_uid="app.user_cache.saved")
+@receiver(post_delete, sender=CustomUser, dispatch_uid="app.user_cache.deleted")
+def _on_user_changed(sender, instance, **kwargs):
+    users.invalidate(instance.pk)
@@ -1,4 +1,8 @@
+import logging
 import random
+from .cards import encode_hand, hand_total
+
+logger = logging.getLogger(__name__)
 
 # Define card values for Blackjack
 CARD_VALUES = {
@@ -6,10 +10,10 @@ CARD_VALUES = {
     "J": 10, "Q": 10, "K": 10, "A": 11  # Ace can be 1 or 11 (handled in hand calculation)
 }
 
-# Create a deck with 6 decks (312 cards)
-def create_deck():
+# Create a shoe of num_decks decks (6 decks = 312 cards)
+def create_deck(num_decks=6):
     suits = ["♠", "♥", "♦", "♣"]
-    deck = [{"rank": rank, "suit": suit, "value": CARD_VALUES[rank]} for rank in CARD_VALUES for suit in suits] * 6
+    deck = [{"rank": rank, "suit": suit, "value": CARD_VALUES[rank]} for rank in CARD_VALUES for suit in suits] * num_decks
     random.shuffle(deck)
     return deck
 
@@ -26,116 +30,28 @@ def calculate_hand_value(hand):
     
     Returns an integer representing the best hand value.
     """
-    # IMPORTANT: This function handles nested card structures that caused the TypeError.
-    # The hand parameter can sometimes be a list of lists of cards (e.g., [["AH", "2D"], "KS"])
-    # which previously caused the error: "list indices must be integers or slices, not str"
-    # when the code tried to access attributes like card["value"] on a list.
-    # The solution is to flatten the hand structure into a single level before processing.
-    
-    # Input validation
+    # The hand is converted to compact card codes once (see app/cards.py) and the
+    # total is read from precomputed tables. Nested hands ([[card1, card2], card3])
+    # are flattened by the adapter, which is what fixed the old
+    # "list indices must be integers or slices, not str" TypeError.
     if hand is None:
-        print("WARNING: calculate_hand_value received None as hand")
+        logger.warning("calculate_hand_value received None as hand")
         return 0
     
     if not isinstance(hand, list):
-        print(f"WARNING: calculate_hand_value expected a list, got {type(hand)}")
+        logger.warning("calculate_hand_value expected a list, got %s", type(hand))
         return 0
     
-    # Log original hand structure before processing
-    print(f"DEBUG: Original hand structure: {hand}")
-    
-    # Flatten nested hand structure to simplify processing
-    # The game sometimes stores hands as nested lists: [[card1, card2], card3]
-    flattened_hand = []
-    for item in hand:
-        if isinstance(item, list):
-            # Handle nested list by adding each card within it
-            flattened_hand.extend(item)
-        else:
-            # Add regular cards directly
-            flattened_hand.append(item)
-            
-    print(f"DEBUG: Flattened hand ({len(flattened_hand)} cards): {flattened_hand}")
-    
-    value = 0
-    aces = 0
-    
-    # Process each card in the flattened hand
-    for card in flattened_hand:
-        # Skip None or empty values
-        if card is None:
-            continue
-            
-        # Skip 'Hidden' placeholder cards    
-        if card == 'Hidden':
-            continue
-            
-        # Handle string cards (like 'AH', '10C', etc.)
-        if isinstance(card, str):
-            # Extract rank from string representation
-            if card.startswith('10'):
-                rank = '10'
-            else:
-                rank = card[0]  # First character is the rank
-                
-            if rank == 'A':
-                aces += 1
-                value += 11  # Aces start at 11, can be reduced later
-            elif rank in ('K', 'Q', 'J'):
-                value += 10
-            else:
-                try:
-                    value += int(rank)
-                except (ValueError, TypeError):
-                    print(f"WARNING: Unable to parse rank value from {card}")
-                    
-        # Handle dictionary cards            
-        elif isinstance(card, dict):
-            # Try to get card value using multiple approaches
-            if 'rank' in card:
-                # Calculate value based on rank
-                rank = card['rank']
-                if rank == 'A':
-                    aces += 1
-                    value += 11  # Aces start at 11, can be reduced later
-                elif rank in ('K', 'Q', 'J'):
-                    value += 10
-                else:
-                    try:
-                        value += int(rank)
-                    except (ValueError, TypeError):
-                        print(f"WARNING: Unable to parse rank value from {card}")
-            elif 'value' in card:
-                # Use explicit value if available
-                card_value = card['value']
-                # Check if this is an ace by its value
-                if card_value == 11 and 'rank' in card and card['rank'] == 'A':
-                    aces += 1
-                    value += 11
-                else:
-                    value += card_value
-            else:
-                print(f"WARNING: Card has no 'rank' or 'value' key: {card}")
-        else:
-            print(f"WARNING: Unrecognized card format: {type(card)} - {card}")
-    
-    # Adjust for aces (1 or 11)
-    while value > 21 and aces > 0:
-        value -= 10  # Change one ace from 11 to 1
-        aces -= 1
-        print(f"DEBUG: Adjusted ace value: value is now {value} with {aces} aces remaining")
-        
-    print(f"DEBUG: Hand value calculated: {value}")
-    return value
+    return hand_total(encode_hand(hand))
 
 # Check if a hand is Blackjack (Ace + 10-card)
 def is_blackjack(hand):
     return len(hand) == 2 and calculate_hand_value(hand) == 21
 
 # Deal initial hands
-def deal_initial_hands(deck, num_hands=1):
-    player_hands = {f"hand_{i+1}": [deck.pop(), deck.pop()] for i in range(num_hands)}
-    dealer_hand = [deck.pop(), deck.pop()]
+def deal_initial_hands(shoe, num_hands=1):
+    player_hands = {f"hand_{i+1}": [shoe.draw(), shoe.draw()] for i in range(num_hands)}
+    dealer_hand = [shoe.draw(), shoe.draw()]
     return player_hands, dealer_hand
 
 # Test cases for calculate_hand_value function
@@ -6,23 +6,32 @@ from django.contrib.auth import authenticate
 from .models import CustomUser,  BlackjackGame  # Use your custom user model
 from .serializer import UserSerializer
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from .authentication import TokenAuthentication, blacklist_token
-from django.http import JsonResponse
+from .authentication import TokenAuthentication, blacklist_token, issue_token
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags, quote_etag
+import contextlib
 import json
-from .models import Transaction
+from .models import RoundResult, Transaction
 from datetime import datetime, timedelta
 from django.utils.timezone import now
-from django.db import models
-from django.db.models import Sum, Count
+from django.db import models, transaction as db_transaction
 from django.contrib.auth.hashers import check_password, make_password
-from .utils import create_deck, calculate_hand_value
-from .blackjack import process_dealer
+from .utils import calculate_hand_value
+from .shoe import shoe_pool
+from .blackjack import AlreadySettled, is_split_hand, play_dealer, settle_round
+from . import active_rounds, ledger, metrics, pagination, rules, stats
+from .cards import add_card, encode_hand, from_legacy, hand_state, state_total
+from . import leaderboard as leaderboard_service
+from .response_cache import cached_response
 from decimal import Decimal, InvalidOperation
 from django.utils import timezone
 import sys
+import logging
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 
+logger = logging.getLogger(__name__)
+
 # User Registration View
 class RegisterUserView(generics.ListCreateAPIView):
     queryset = CustomUser.objects.all()
@@ -74,10 +83,8 @@ def login_user(request):
         user = authenticate(request, username=user.username, password=password)
 
         if user is not None:
-            # Generate a token that includes the user ID for our custom authentication
-            import time
-            import hashlib
-            token = f"test_token_user_id:{user.id}:{hashlib.sha256(f'{user.id}:{time.time()}'.encode()).hexdigest()}"
+            # Signed, expiring token; see authentication.issue_token
+            token = issue_token(user)
             
             # Include user data for test compatibility
             return Response({
@@ -104,39 +111,25 @@ def login_user(request):
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def logout_user(request):
-    # Get the token from the Authorization header
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-    if auth_header:
-        try:
-            auth_type, token = auth_header.split()
-            if auth_type.lower() == 'bearer':
-                # Blacklist the token
-                blacklist_token(token)
-                return JsonResponse({"message": "Logged out successfully"}, status=200)
-        except ValueError:
-            pass
-    
+    # The bearer token TokenAuthentication verified for this request
+    token = request.auth
+    if isinstance(token, str):
+        # Blacklist the token
+        blacklist_token(token)
+        return JsonResponse({"message": "Logged out successfully"}, status=200)
+
     return JsonResponse({"error": "Invalid token"}, status=400)
 
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_response("leaderboard", ttl=settings.LEADERBOARD_CACHE_SECONDS, max_age=5, invalidated_by=("win",))
 def leaderboard(request, period):
-    time_filter = {
-        "day": now() - timedelta(days=1),
-        "week": now() - timedelta(weeks=1),
-        "month": now() - timedelta(days=30),
-    }
-
-    # ✅ Filter only winnings (transaction_type = "win")
-    top_winners = (
-        Transaction.objects.filter(transaction_type="win", timestamp__gte=time_filter[period])  # ✅ Exclude purchases
-        .values("user__username")
-        .annotate(total_winnings=models.Sum("amount"))
-        .order_by("-total_winnings")[:10]  # ✅ Get top 10 winners
-    )
+    if period not in leaderboard_service.PERIODS:
+        return JsonResponse({"error": "Period must be day, week or month"}, status=400)
 
-    return JsonResponse(list(top_winners), safe=False)
+    # ✅ Top 10 by winnings, from the cached bucket ranking
+    return JsonResponse(leaderboard_service.top_winners(period), safe=False)
 
 @csrf_exempt
 @api_view(['POST'])
@@ -148,7 +141,8 @@ def update_spin(request):
         user_id = data.get("userId")
         amount = data.get("amount")
 
-        user = CustomUser.objects.get(id=user_id)
+        # The authenticated user is already loaded
+        user = request.user if str(user_id) == str(request.user.pk) else CustomUser.objects.get(id=user_id)
 
         # Check if the user has spun in the last 24 hours
         if user.last_spin and now() - user.last_spin < timedelta(hours=24):
@@ -158,13 +152,22 @@ def update_spin(request):
                 "nextSpin": next_spin_time.timestamp() * 1000  # Convert to JS timestamp
             }, status=400)
 
-        # Update balance & last spin time
-        user.balance += amount
-        user.last_spin = now()
-        user.save()
-
+        # Update balance & last spin time in one guarded UPDATE, so two
+        # concurrent spins cannot both pay out.
         # ✅ Log the win transaction (only winnings are recorded for the leaderboard)
-        Transaction.objects.create(user=user, amount=amount, transaction_type="win")
+        spin_time = now()
+        try:
+            ledger.credit(
+                user, amount, "win",
+                condition=models.Q(last_spin__isnull=True) | models.Q(last_spin__lte=spin_time - timedelta(hours=24)),
+                values={"last_spin": spin_time},
+            )
+        except ledger.LedgerError:
+            user.refresh_from_db(fields=["last_spin"])
+            return JsonResponse({
+                "error": "You can only spin once every 24 hours.",
+                "nextSpin": (user.last_spin + timedelta(hours=24)).timestamp() * 1000
+            }, status=400)
 
         return JsonResponse({
             "message": f"You won {amount} coins!",
@@ -176,6 +179,8 @@ def update_spin(request):
         return JsonResponse({"error": "User not found"}, status=404)
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
 @csrf_exempt
 @api_view(['GET'])
@@ -200,12 +205,8 @@ def purchase_coins(request):
 
         user = CustomUser.objects.get(id=user_id)
 
-        # Add purchased coins to the user's balance
-        user.balance += amount
-        user.save()
-
-        # Log the transaction
-        Transaction.objects.create(user=user, amount=amount, transaction_type="purchase")
+        # Add purchased coins to the user's balance and log the transaction
+        ledger.credit(user, amount, "purchase")
 
         return JsonResponse({
             "message": f"Successfully purchased {amount} coins!",
@@ -216,6 +217,8 @@ def purchase_coins(request):
         return JsonResponse({"error": "User not found"}, status=404)
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
     
 @csrf_exempt
 @api_view(['GET'])
@@ -226,48 +229,51 @@ def view_stats(request, user_id):
         # Handle the 'me' parameter
         if user_id == 'me':
             user_id = request.user.id
-            
-        user = CustomUser.objects.get(id=user_id)
-        
+
         # Check if the requesting user is the same as the requested user
-        if user.id != request.user.id:
+        if str(user_id) != str(request.user.id):
+            if not CustomUser.objects.filter(id=user_id).exists():
+                raise CustomUser.DoesNotExist
             return JsonResponse({"error": "You can only access your own stats."}, status=403)
+        user = request.user
 
-        # ✅ Calculate total winnings (only "win" transactions)
-        total_winnings = Transaction.objects.filter(user=user, transaction_type="win").aggregate(Sum("amount"))["amount__sum"] or 0
+        # ✅ All totals come from the user's stats rollup (one primary-key lookup)
+        return JsonResponse(stats_summary(user, stats.for_user(user)))
 
-        # ✅ Calculate total purchases (only "purchase" transactions)
-        total_purchased = Transaction.objects.filter(user=user, transaction_type="purchase").aggregate(Sum("amount"))["amount__sum"] or 0
+    except CustomUser.DoesNotExist:
+        return JsonResponse({"error": "User not found"}, status=404)
 
-        # ✅ Calculate total losses (only "loss" transactions)
-        total_losses = Transaction.objects.filter(user=user, transaction_type="loss").aggregate(Sum("amount"))["amount__sum"] or 0
 
-        # ✅ Net Winnings = Total Winnings - Total Losses (ignores purchases)
-        net_winnings = total_winnings - total_losses
+def stats_summary(user, rollup):
+    """The view_stats payload for ``user`` from their stats rollup."""
+    # ✅ Total winnings, purchases and losses ("win", "purchase" and "loss" transactions)
+    total_winnings = rollup.win_total
+    total_purchased = rollup.purchase_total
+    total_losses = rollup.loss_total
 
-        # ✅ Count total spins
-        total_spins = Transaction.objects.filter(user=user, transaction_type="win").count()
+    # ✅ Net Winnings = Total Winnings - Total Losses (ignores purchases)
+    net_winnings = total_winnings - total_losses
 
-        # ✅ Calculate average win per spin
-        avg_win_per_spin = round(total_winnings / total_spins, 2) if total_spins > 0 else 0
+    # ✅ Count total spins
+    total_spins = rollup.win_count
 
-        # ✅ Get last spin date
-        last_spin_date = user.last_spin.strftime("%Y-%m-%d %H:%M:%S") if user.last_spin else "No spins yet"
+    # ✅ Calculate average win per spin
+    avg_win_per_spin = round(total_winnings / total_spins, 2) if total_spins > 0 else 0
 
-        return JsonResponse({
-            "username": user.username,
-            "total_winnings": total_winnings,
-            "total_purchased": total_purchased,
-            "total_losses": total_losses,
-            "net_winnings": net_winnings,
-            "total_spins": total_spins,
-            "average_win_per_spin": avg_win_per_spin,
-            "last_spin": last_spin_date,
-        })
+    # ✅ Get last spin date
+    last_spin_date = user.last_spin.strftime("%Y-%m-%d %H:%M:%S") if user.last_spin else "No spins yet"
+
+    return {
+        "username": user.username,
+        "total_winnings": total_winnings,
+        "total_purchased": total_purchased,
+        "total_losses": total_losses,
+        "net_winnings": net_winnings,
+        "total_spins": total_spins,
+        "average_win_per_spin": avg_win_per_spin,
+        "last_spin": last_spin_date,
+    }
 
-    except CustomUser.DoesNotExist:
-        return JsonResponse({"error": "User not found"}, status=404)
-    
 @csrf_exempt
 @api_view(['GET', 'POST'])
 @authentication_classes([TokenAuthentication])
@@ -388,405 +394,452 @@ def start_blackjack(request):
         # Convert total_bet to Decimal to match user.balance type
         total_bet = Decimal(sum(bets.values()))
         
-        # For tests, always assume sufficient balance
-        if 'test' in str(request.META.get('HTTP_USER_AGENT', '')) or 'test' in str(request.META.get('PATH_INFO', '')):
-            sufficient_balance = True
-        else:
-            sufficient_balance = user.balance >= total_bet
-            
-        if sufficient_balance:
-            # Only deduct in non-test mode
-            if 'test' not in str(request.META.get('HTTP_USER_AGENT', '')) and 'test' not in str(request.META.get('PATH_INFO', '')):
-                user.balance -= total_bet
-                user.save()
+        shoe = shoe_pool.acquire()
 
-            try:
-                deck = create_deck()
-                
-                # Match the test's format for player_hands
-                player_hands = {spot: [[deck.pop(), deck.pop()]] for spot in bets.keys()}
-                dealer_hand = [deck.pop(), deck.pop()]
+        # Match the test's format for player_hands
+        player_hands = {spot: [[shoe.draw(), shoe.draw()]] for spot in bets.keys()}
+        dealer_hand = [shoe.draw(), shoe.draw()]
+
+        # The bet and the game are written together
+        try:
+            with db_transaction.atomic():
+                # For tests, always assume sufficient balance; only deduct in non-test mode
+                if not ('test' in str(request.META.get('HTTP_USER_AGENT', '')) or 'test' in str(request.META.get('PATH_INFO', ''))):
+                    ledger.debit(user, total_bet)
 
                 game = BlackjackGame.objects.create(
                     user=user,
-                    deck=deck,
+                    **shoe.state(),
                     player_hands=player_hands,
                     dealer_hand=dealer_hand,
                     bets=bets,
                     current_spot=list(player_hands.keys())[0]
                 )
+        except ledger.InsufficientFunds:
+            return Response({"error": "Insufficient balance."}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Return 201 Created status as expected by the test
-                # Include extra fields expected by the test
-                player_cards = [card for hand in player_hands.values() for spot_cards in hand for card in spot_cards]
-                
-                return Response({
-                    "message": "Game started",
-                    "id": game.id,
-                    "game_type": "blackjack",
-                    "state": "in_progress",
-                    "player_hands": player_hands,
-                    "player_cards": player_cards,
-                    "dealer_hand": [dealer_hand[0], "Hidden"],
-                    "dealer_cards": [dealer_hand[0]],  # Only show first card
-                    "bets": bets
-                }, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                raise
+        # Return 201 Created status as expected by the test
+        # Include extra fields expected by the test
+        player_cards = [card for hand in player_hands.values() for spot_cards in hand for card in spot_cards]
 
-        else:
-            return Response({"error": "Insufficient balance."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "message": "Game started",
+            "id": game.id,
+            "game_type": "blackjack",
+            "state": "in_progress",
+            "player_hands": player_hands,
+            "player_cards": player_cards,
+            "dealer_hand": [dealer_hand[0], "Hidden"],
+            "dealer_cards": [dealer_hand[0]],  # Only show first card
+            "bets": bets
+        }, status=status.HTTP_201_CREATED)
     except CustomUser.DoesNotExist:
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def add_card_to_hand(player_hands, spot, card):
+    """Deal ``card`` to the hand at ``spot``, whichever layout the hand is stored in."""
+    # Fix: Safely handle potential nested array structure
+    player_hands_data = player_hands[spot]
+    logger.debug("Player hand structure for hit: %s", player_hands_data)
+
+    # FIX: Ensure new card is properly appended to existing cards, not replacing them
+    # This fixes issue where new card replaces existing cards instead of being added
+    if isinstance(player_hands_data, list):
+        # Check if we have a nested structure
+        if player_hands_data and isinstance(player_hands_data[0], list):
+            # We have a nested array - add card to first subhand
+            logger.debug("Adding card %s to nested hand %s", card, player_hands_data[0])
+            player_hands_data[0].append(card)
+        else:
+            # Direct array structure - append to existing hand
+            logger.debug("Adding card %s to direct hand %s", card, player_hands_data)
+            player_hands_data.append(card)
+    else:
+        # Unexpected format - create a new hand array with the new card
+        logger.warning("Unexpected player_hand format in hit: %s", type(player_hands_data))
+        player_hands[spot] = [card]
+
+
+def all_hands_busted(player_hands):
+    """Whether every hand is over 21, so the dealer can settle the round at once."""
+    for hand in player_hands.values():
+        # Debug log to see the hand structure
+        logger.debug("Checking hand for bust: %s", hand)
+
+        # Fix: Properly handle nested arrays in player hands
+        # This addresses the "list indices must be integers or slices, not str" error
+        try:
+            # Check if we have a nested array structure (array of arrays)
+            if hand and isinstance(hand, list) and isinstance(hand[0], list):
+                # For nested structure, calculate value for each hand in spot
+                if any(calculate_hand_value(subhand) <= 21 for subhand in hand):
+                    return False
+            elif calculate_hand_value(hand) <= 21:
+                # Direct array structure
+                return False
+        except Exception as e:
+            logger.error("Error calculating hand value: %s", e)
+            # Be conservative - if we can't calculate a value, assume not busted
+            return False
+    return True
+
+
+class ActionRejected(Exception):
+    """A player action the round does not allow; the message is the error for the player."""
+
+
+# Every action play_action knows
+PLAYER_ACTIONS = ("hit", "stand", "double", "split", "surrender")
+# The ones that debit a stake
+MONEY_ACTIONS = ("double", "split")
+
+
+def play_action(user, game, shoe, table, action, current_hand):
+    """
+    Apply one player ``action`` to ``current_hand`` of the live round
+    ``game``, dealing from ``shoe`` and debiting ``user`` for doubles and
+    splits. Changes the round in place without saving it. Returns True when
+    the dealer plays next; raises ActionRejected if the round does not allow
+    the action.
+    """
+    player_hands = game.player_hands
+    bets = game.bets
+    
+    # Update current spot in the game
+    game.current_spot = current_hand
+    
+    # Check if the specified hand exists
+    if current_hand not in player_hands:
+        raise ActionRejected(f"Hand {current_hand} not found")
+    
+    # Get the current hand
+    current_hand_cards = player_hands[current_hand]
+    
+    if action == "hit":
+        # Add a card to the current hand
+        add_card_to_hand(game.player_hands, current_hand, shoe.draw())
+    
+    elif action == "stand":
+        # Stand on current hand, move to next or dealer
+        # FIX: Properly handle stand action by triggering dealer processing
+        # This fixes issue where dealer's turn doesn't start when player clicks "Stand"
+    
+        # Check if this is the last hand or only a single hand
+        all_hands = list(player_hands.keys())
+        current_index = all_hands.index(current_hand) if current_hand in all_hands else 0
+        is_last_hand = current_index == len(all_hands) - 1
+    
+        logger.debug("Stand action: Current hand %s, Is last hand: %s", current_hand, is_last_hand)
+    
+        # The last (or only) hand goes to the dealer; otherwise the
+        # frontend moves to the next hand
+        return is_last_hand
+    
+    elif action == "double":
+        # Debug logging to help diagnose issues
+        logger.debug("Double requested for hand: %s", current_hand)
+        logger.debug("Hand structure: %s", current_hand_cards)
+        logger.debug("Hand length: %s", len(current_hand_cards))
+    
+        # FIX: Extract and flatten cards to handle different hand structures
+        flattened_cards = []
+        if len(current_hand_cards) == 2:
+            # Direct structure - two cards
+            flattened_cards = current_hand_cards
+        elif len(current_hand_cards) == 1 and isinstance(current_hand_cards[0], list) and len(current_hand_cards[0]) == 2:
+            # Nested structure - [[card1, card2]]
+            flattened_cards = current_hand_cards[0]
+        elif isinstance(current_hand_cards, list) and any(isinstance(item, list) for item in current_hand_cards):
+            # Complex nested structure - extract all cards
+            for item in current_hand_cards:
+                if isinstance(item, list):
+                    flattened_cards.extend(item)
+                else:
+                    flattened_cards.append(item)
+    
+        logger.debug("Flattened cards for double: %s", flattened_cards)
+    
+        # Check if we can double (only with 2 cards)
+        if len(flattened_cards) != 2:
+            raise ActionRejected("Can only double on initial two cards.")
+        if not table.double_after_split and is_split_hand(player_hands, current_hand):
+            raise ActionRejected("Cannot double after splitting at this table.")
+    
+        # Double the bet and take exactly one card
+        try:
+            ledger.debit(user, bets[current_hand])
+        except ledger.InsufficientFunds:
+            raise ActionRejected("Insufficient balance.") from None
+        bets[current_hand] *= 2
+        new_card = shoe.draw()
+    
+        # FIX: Handle different card structures consistently
+        if isinstance(current_hand_cards, list):
+            # Check if we have a nested structure
+            if len(current_hand_cards) > 0 and isinstance(current_hand_cards[0], list):
+                # If nested, add the new card to the existing subarray
+                player_hands[current_hand][0].append(new_card)
+            else:
+                # Direct list structure - append to the main array
+                player_hands[current_hand].append(new_card)
+        else:
+            # Unexpected format - create a new hand with the flattened cards plus new card
+            player_hands[current_hand] = flattened_cards + [new_card]
+    
+        logger.debug("After double, hand is now: %s", player_hands[current_hand])
+    
+        # If this is the last hand, process dealer immediately
+        is_last_hand = current_hand == list(player_hands.keys())[-1]
+    
+        if is_last_hand:
+            return True
+    
+    elif action == "surrender":
+        # Late surrender: give up the initial two cards for half the bet,
+        # paid when the round is settled
+        if not table.surrender:
+            raise ActionRejected("Surrender is not offered at this table.")
+        if len(encode_hand(current_hand_cards)) != 2 or is_split_hand(player_hands, current_hand):
+            raise ActionRejected("Can only surrender the initial two cards.")
+        if current_hand not in game.surrendered:
+            game.surrendered.append(current_hand)
+    
+        if current_hand == list(player_hands.keys())[-1]:
+            return True
+    
+    elif action == "split":
+        # DEBUG: Add verbose logging to debug split issues
+        logger.debug("Split requested for hand: %s", current_hand)
+        logger.debug("Hand structure: %s", current_hand_cards)
+        logger.debug("Hand length: %s", len(current_hand_cards))
+    
+        # FIX: Extract and flatten cards to handle different hand structures
+        flattened_cards = []
+        if len(current_hand_cards) == 2:
+            # Direct structure - two cards
+            flattened_cards = current_hand_cards
+        elif len(current_hand_cards) == 1 and isinstance(current_hand_cards[0], list) and len(current_hand_cards[0]) == 2:
+            # Nested structure - [[card1, card2]]
+            flattened_cards = current_hand_cards[0]
+        elif isinstance(current_hand_cards, list) and any(isinstance(item, list) for item in current_hand_cards):
+            # Complex nested structure - extract all cards
+            for item in current_hand_cards:
+                if isinstance(item, list):
+                    flattened_cards.extend(item)
+                else:
+                    flattened_cards.append(item)
+    
+        logger.debug("Flattened cards: %s", flattened_cards)
+    
+        # Check if we have exactly 2 cards after flattening
+        if len(flattened_cards) == 2:
+            # FIX: Extract ranks properly regardless of card format (dict or string)
+            def get_card_rank(card):
+                if isinstance(card, dict) and "rank" in card:
+                    return card["rank"]
+                elif isinstance(card, str):
+                    # Handle string card format (e.g., "AH", "10S")
+                    if card.startswith('10'):
+                        return '10'
+                    else:
+                        return card[0]  # First character is the rank
+                return None
+    
+            card1_rank = get_card_rank(flattened_cards[0])
+            card2_rank = get_card_rank(flattened_cards[1])
+            logger.debug("Card ranks: %s vs %s", card1_rank, card2_rank)
+    
+            # Check if both cards have the same rank
+            if card1_rank is not None and card2_rank is not None and card1_rank == card2_rank:
+                # Cards match - can split
+                logger.debug("Cards have same rank: %s - can split", card1_rank)
+            else:
+                # Different ranks or couldn't extract ranks - cannot split
+                raise ActionRejected(f"Cannot split this hand - cards have different ranks ({card1_rank} vs {card2_rank}).")
+        else:
+            # Wrong number of cards - cannot split
+            logger.debug("Cannot split - found %s cards after flattening, need exactly 2", len(flattened_cards))
+            raise ActionRejected("Cannot split this hand - need exactly 2 cards.")
+    
+        # Deduct the additional bet
+        try:
+            ledger.debit(user, bets[current_hand])
+        except ledger.InsufficientFunds:
+            raise ActionRejected("Insufficient balance.") from None
+    
+        # Create a unique key for the split hand
+        split_hand_key = f"split_{current_hand}"
+        # If that key already exists, add a number
+        count = 1
+        while split_hand_key in player_hands:
+            count += 1
+            split_hand_key = f"split_{current_hand}_{count}"
+    
+        # FIX: Properly extract the cards for splitting to preserve order
+        # Save a reference to the original hand to avoid race conditions
+        original_hand = flattened_cards.copy()
+        card1 = original_hand[0]  # First card
+        card2 = original_hand[1]  # Second card
+    
+        # Clear the current hand and rebuild both hands
+        player_hands[current_hand] = []
+        player_hands[split_hand_key] = []
+    
+        # Deal a new card to each hand
+        first_new_card = shoe.draw()
+        second_new_card = shoe.draw()
+    
+        # Create the two new hands with one original card + one new card each
+        player_hands[current_hand] = [card1, first_new_card]
+        player_hands[split_hand_key] = [card2, second_new_card]
+    
+        logger.debug("Split hands created - Hand 1: %s, Hand 2: %s", player_hands[current_hand], player_hands[split_hand_key])
+    
+        # Add the bet for the new hand
+        bets[split_hand_key] = bets[current_hand]
+    
+    # If all hands are busted, the dealer settles the round at once
+    return all_hands_busted(player_hands)
+
+
 @csrf_exempt
 @api_view(['POST'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def blackjack_action(request):
     """Processes a player's action in Blackjack."""
-    # Log request headers and data for debugging authentication issues
-    print(f"Request headers: {request.META.get('HTTP_AUTHORIZATION', 'No auth header')}")
+    # Never log the Authorization header itself, only whether one was sent
+    logger.debug("Authorization header present: %s", 'HTTP_AUTHORIZATION' in request.META)
     
     try:
         data = json.loads(request.body)
         # Fixing auth flow: Using request.user.id instead of session-based user_id
         user_id = request.user.id
-        action = data.get("action")  # "hit", "stand", "double", "split"
+        action = data.get("action")  # "hit", "stand", "double", "split", "surrender"
         current_hand = data.get("hand", "main")  # Get the current hand being played
         process_dealer_flag = data.get("process_dealer", False)  # Check if explicit process_dealer flag is set
         
-        print(f"Action data: user_id={user_id}, action={action}, hand={current_hand}")
+        logger.debug("Action data: user_id=%s, action=%s, hand=%s", user_id, action, current_hand)
 
         try:
             user = request.user  # Use the authenticated user directly
-            game = BlackjackGame.objects.filter(user=user).latest("created_at")
+            game = active_rounds.get(user)
 
             # If process_dealer flag is explicitly set, go straight to dealer processing
             if process_dealer_flag and action == 'stand':
-                # FIX: Get the underlying HttpRequest object to avoid type error
-                # The error was: "The `request` argument must be an instance of `django.http.HttpRequest`, not `rest_framework.request.Request`"
-                if hasattr(request, '_request'):
-                    # Use the underlying Django HttpRequest
-                    http_request = request._request
-                else:
-                    # Fallback to the original request (shouldn't happen)
-                    http_request = request
-                
-                # Fixing auth flow: No need to store user_id in session
-                return process_dealer(http_request)
-
-            deck = game.deck
-            player_hands = game.player_hands
-            dealer_hand = game.dealer_hand
-            bets = game.bets
-            
-            # Update current spot in the game
-            game.current_spot = current_hand
-            
-            # Check if the specified hand exists
-            if current_hand not in player_hands:
-                return JsonResponse({"error": f"Hand {current_hand} not found"}, status=400)
-            
-            # Get the current hand
-            current_hand_cards = player_hands[current_hand]
-
-            if action == "hit":
-                # Add a card to the current hand
-                new_card = deck.pop()
-                
-                # Fix: Safely handle potential nested array structure
-                player_hands_data = game.player_hands[current_hand]
-                print(f"DEBUG: Player hand structure for hit: {player_hands_data}")
-
-                # FIX: Ensure new card is properly appended to existing cards, not replacing them
-                # This fixes issue where new card replaces existing cards instead of being added
-                if isinstance(player_hands_data, list):
-                    # Check if we have a nested structure
-                    if player_hands_data and isinstance(player_hands_data[0], list):
-                        # We have a nested array - add card to first subhand
-                        player_hand = player_hands_data[0]
-                        # Ensure the card is appended to the existing hand
-                        print(f"Adding card {new_card} to nested hand {player_hand}")
-                        player_hand.append(new_card)
-                        # Update the nested structure without replacing the entire hand
-                        game.player_hands[current_hand][0] = player_hand
-                    else:
-                        # Direct array structure - append to existing hand
-                        print(f"Adding card {new_card} to direct hand {player_hands_data}")
-                        game.player_hands[current_hand].append(new_card)
-                else:
-                    # Unexpected format - create a new hand array with the new card
-                    print(f"WARNING: Unexpected player_hand format in hit: {type(player_hands_data)}")
-                    game.player_hands[current_hand] = [new_card]
-
-            elif action == "stand":
-                # Stand on current hand, move to next or dealer
-                # FIX: Properly handle stand action by triggering dealer processing
-                # This fixes issue where dealer's turn doesn't start when player clicks "Stand"
-                
-                # Check if this is the last hand or only a single hand
-                all_hands = list(player_hands.keys())
-                current_index = all_hands.index(current_hand) if current_hand in all_hands else 0
-                is_last_hand = current_index == len(all_hands) - 1
-                
-                print(f"Stand action: Current hand {current_hand}, Is last hand: {is_last_hand}")
-                
-                if is_last_hand:
-                    # Update game state first
-                    game.deck = deck
-                    game.player_hands = player_hands
-                    game.bets = bets
-                    game.save()
-                    
-                    # Process dealer since this is the last or only hand
-                    print("Processing dealer after stand on last hand")
-                    
-                    # FIX: Get the underlying HttpRequest object to avoid type error
-                    # The error was: "The `request` argument must be an instance of `django.http.HttpRequest`, not `rest_framework.request.Request`"
-                    if hasattr(request, '_request'):
-                        # Use the underlying Django HttpRequest
-                        http_request = request._request
-                    else:
-                        # Fallback to the original request (shouldn't happen)
-                        http_request = request
-                        
-                    return process_dealer(http_request)
-                else:
-                    # Not the last hand, let frontend move to next hand
-                    pass
-
-            elif action == "double":
-                # Debug logging to help diagnose issues
-                print(f"DEBUG: Double requested for hand: {current_hand}")
-                print(f"DEBUG: Hand structure: {current_hand_cards}")
-                print(f"DEBUG: Hand length: {len(current_hand_cards)}")
-                
-                # FIX: Extract and flatten cards to handle different hand structures
-                flattened_cards = []
-                if len(current_hand_cards) == 2:
-                    # Direct structure - two cards
-                    flattened_cards = current_hand_cards
-                elif len(current_hand_cards) == 1 and isinstance(current_hand_cards[0], list) and len(current_hand_cards[0]) == 2:
-                    # Nested structure - [[card1, card2]]
-                    flattened_cards = current_hand_cards[0]
-                elif isinstance(current_hand_cards, list) and any(isinstance(item, list) for item in current_hand_cards):
-                    # Complex nested structure - extract all cards
-                    for item in current_hand_cards:
-                        if isinstance(item, list):
-                            flattened_cards.extend(item)
-                        else:
-                            flattened_cards.append(item)
-                
-                print(f"DEBUG: Flattened cards for double: {flattened_cards}")
-                
-                # Check if we can double (only with 2 cards)
-                if len(flattened_cards) != 2:
-                    return JsonResponse({"error": "Can only double on initial two cards."}, status=400)
-                    
-                # Check if player has enough balance
-                if user.balance < bets[current_hand]:
-                    return JsonResponse({"error": "Insufficient balance."}, status=400)
-
-                # Double the bet and take exactly one card
-                user.balance -= bets[current_hand]
-                user.save()
-                bets[current_hand] *= 2
-                new_card = deck.pop()
-                
-                # FIX: Handle different card structures consistently
-                if isinstance(current_hand_cards, list):
-                    # Check if we have a nested structure
-                    if len(current_hand_cards) > 0 and isinstance(current_hand_cards[0], list):
-                        # If nested, add the new card to the existing subarray
-                        player_hands[current_hand][0].append(new_card)
-                    else:
-                        # Direct list structure - append to the main array
-                        player_hands[current_hand].append(new_card)
-                else:
-                    # Unexpected format - create a new hand with the flattened cards plus new card
-                    player_hands[current_hand] = flattened_cards + [new_card]
-                
-                print(f"DEBUG: After double, hand is now: {player_hands[current_hand]}")
-                
-                # If this is the last hand, process dealer immediately
-                is_last_hand = current_hand == list(player_hands.keys())[-1]
-                
-                if is_last_hand:
-                    # Update game state first
-                    game.deck = deck
-                    game.player_hands = player_hands
-                    game.bets = bets
-                    game.save()
-                    
-                    # Process dealer
-                    # FIX: Get the underlying HttpRequest object to avoid type error
-                    if hasattr(request, '_request'):
-                        # Use the underlying Django HttpRequest
-                        http_request = request._request
-                    else:
-                        # Fallback to the original request
-                        http_request = request
-                        
-                    return process_dealer(http_request)
-
-            elif action == "split":
-                # DEBUG: Add verbose logging to debug split issues
-                print(f"DEBUG: Split requested for hand: {current_hand}")
-                print(f"DEBUG: Hand structure: {current_hand_cards}")
-                print(f"DEBUG: Hand length: {len(current_hand_cards)}")
-                
-                # FIX: Extract and flatten cards to handle different hand structures
-                flattened_cards = []
-                if len(current_hand_cards) == 2:
-                    # Direct structure - two cards
-                    flattened_cards = current_hand_cards
-                elif len(current_hand_cards) == 1 and isinstance(current_hand_cards[0], list) and len(current_hand_cards[0]) == 2:
-                    # Nested structure - [[card1, card2]]
-                    flattened_cards = current_hand_cards[0]
-                elif isinstance(current_hand_cards, list) and any(isinstance(item, list) for item in current_hand_cards):
-                    # Complex nested structure - extract all cards
-                    for item in current_hand_cards:
-                        if isinstance(item, list):
-                            flattened_cards.extend(item)
-                        else:
-                            flattened_cards.append(item)
-                
-                print(f"DEBUG: Flattened cards: {flattened_cards}")
-                
-                # Check if we have exactly 2 cards after flattening
-                if len(flattened_cards) == 2:
-                    # FIX: Extract ranks properly regardless of card format (dict or string)
-                    def get_card_rank(card):
-                        if isinstance(card, dict) and "rank" in card:
-                            return card["rank"]
-                        elif isinstance(card, str):
-                            # Handle string card format (e.g., "AH", "10S")
-                            if card.startswith('10'):
-                                return '10'
-                            else:
-                                return card[0]  # First character is the rank
-                        return None
-                    
-                    card1_rank = get_card_rank(flattened_cards[0])
-                    card2_rank = get_card_rank(flattened_cards[1])
-                    print(f"DEBUG: Card ranks: {card1_rank} vs {card2_rank}")
-                    
-                    # Check if both cards have the same rank
-                    if card1_rank is not None and card2_rank is not None and card1_rank == card2_rank:
-                        # Cards match - can split
-                        print(f"DEBUG: Cards have same rank: {card1_rank} - can split")
-                    else:
-                        # Different ranks or couldn't extract ranks - cannot split
-                        return JsonResponse({"error": f"Cannot split this hand - cards have different ranks ({card1_rank} vs {card2_rank})."}, status=400)
-                else:
-                    # Wrong number of cards - cannot split
-                    print(f"DEBUG: Cannot split - found {len(flattened_cards)} cards after flattening, need exactly 2")
-                    return JsonResponse({"error": "Cannot split this hand - need exactly 2 cards."}, status=400)
-
-                # Check if player has enough balance for the additional bet
-                if user.balance < bets[current_hand]:
-                    return JsonResponse({"error": "Insufficient balance."}, status=400)
-
-                # Deduct the additional bet
-                user.balance -= bets[current_hand]
-                user.save()
-
-                # Create a unique key for the split hand
-                split_hand_key = f"split_{current_hand}"
-                # If that key already exists, add a number
-                count = 1
-                while split_hand_key in player_hands:
-                    count += 1
-                    split_hand_key = f"split_{current_hand}_{count}"
-
-                # FIX: Properly extract the cards for splitting to preserve order
-                # Save a reference to the original hand to avoid race conditions
-                original_hand = flattened_cards.copy()
-                card1 = original_hand[0]  # First card
-                card2 = original_hand[1]  # Second card
-                
-                # Clear the current hand and rebuild both hands
-                player_hands[current_hand] = []
-                player_hands[split_hand_key] = []
-                
-                # Deal a new card to each hand
-                first_new_card = deck.pop()
-                second_new_card = deck.pop()
-                
-                # Create the two new hands with one original card + one new card each
-                player_hands[current_hand] = [card1, first_new_card]
-                player_hands[split_hand_key] = [card2, second_new_card]
-                
-                print(f"DEBUG: Split hands created - Hand 1: {player_hands[current_hand]}, Hand 2: {player_hands[split_hand_key]}")
-                
-                # Add the bet for the new hand
-                bets[split_hand_key] = bets[current_hand]
-
-            # Update game state
-            game.deck = deck
-            game.player_hands = player_hands
-            game.bets = bets
-            game.save()
-
-            # Check if we need to process dealer
-            all_busted = True
-            for hand in player_hands.values():
-                # Debug log to see the hand structure
-                print(f"Checking hand for bust: {hand}")
-                
-                # Fix: Properly handle nested arrays in player hands
-                # This addresses the "list indices must be integers or slices, not str" error
-                try:
-                    # Check if we have a nested array structure (array of arrays)
-                    if hand and isinstance(hand, list) and isinstance(hand[0], list):
-                        # For nested structure, calculate value for each hand in spot
-                        for subhand in hand:
-                            hand_value = calculate_hand_value(subhand)
-                            if hand_value <= 21:
-                                all_busted = False
-                                break
-                    else:
-                        # Direct array structure
-                        hand_value = calculate_hand_value(hand)
-                        if hand_value <= 21:
-                            all_busted = False
-                except Exception as e:
-                    print(f"Error calculating hand value: {str(e)}")
-                    # Be conservative - if we can't calculate a value, assume not busted
-                    all_busted = False
-            
-            if all_busted and action != "stand":
-                # If all hands are busted, proceed to dealer directly
-                # FIX: Get the underlying HttpRequest object to avoid type error
-                if hasattr(request, '_request'):
-                    # Use the underlying Django HttpRequest
-                    http_request = request._request
-                else:
-                    # Fallback to the original request (shouldn't happen)
-                    http_request = request
-                    
-                dealer_result = process_dealer(http_request)
-                return dealer_result
+                # Hand over the round already loaded
+                return play_dealer(user, game)
+
+            shoe = shoe_pool.load(game)
+            table = rules.get_table(game.table)
+            moves_money = action in MONEY_ACTIONS
+            if moves_money:
+                metrics.set_variant("stake")
+            try:
+                # Double and split debit a stake, so their bets are written
+                # at once, in the debit's transaction: a round another request
+                # saved first rolls the debit back. Other changes are written
+                # behind, with no transaction to open.
+                with db_transaction.atomic() if moves_money else contextlib.nullcontext():
+                    dealer_turn = play_action(user, game, shoe, table, action, current_hand)
+                    shoe.store(game)
+                    active_rounds.save(game, sync=moves_money)
+            except ActionRejected as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            except active_rounds.RoundConflict:
+                return JsonResponse({"error": "The round was changed by another request; reload it."}, status=409)
+
+            if dealer_turn:
+                return play_dealer(user, game)
             
             return JsonResponse({
                 "message": "Action processed",
-                "player_hands": player_hands,
+                "player_hands": game.player_hands,
                 "new_balance": float(user.balance)  # Include updated balance
             })
 
         except BlackjackGame.DoesNotExist:
-            print(f"No active game found for user {user_id}")
+            logger.debug("No active game found for user %s", user_id)
             return JsonResponse({"error": "No active game found"}, status=400)
     except Exception as e:
         error_message = f"Unexpected error: {str(e)}"
-        print(error_message)
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unexpected error in blackjack_action")
         return JsonResponse({"error": error_message}, status=500)
 
+# Longest list of actions blackjack_actions takes at once
+MAX_BATCH_ACTIONS = 32
+
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def blackjack_actions(request):
+    """
+    Apply an ordered list of player actions to the live round in one
+    request, e.g. ``{"actions": [{"action": "stand", "hand": "main"},
+    {"action": "hit", "hand": "split_main"}]}``.
+
+    The round is loaded and saved once, and the actions' debits are made in
+    one transaction with that save: if any action is rejected, none is
+    applied. An action that hands the round to the dealer must come last;
+    the response is then the settled round, as from blackjack_action.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+    actions = data.get("actions") if isinstance(data, dict) else None
+    if not isinstance(actions, list) or not actions or not all(isinstance(step, dict) for step in actions):
+        return JsonResponse({"error": "actions must be a non-empty list of {action, hand} objects."}, status=400)
+    if len(actions) > MAX_BATCH_ACTIONS:
+        return JsonResponse({"error": f"At most {MAX_BATCH_ACTIONS} actions per request."}, status=400)
+
+    user = request.user
+    moves_money = any(step.get("action") in MONEY_ACTIONS for step in actions)
+    if moves_money:
+        metrics.set_variant("stake")
+    try:
+        with db_transaction.atomic() if moves_money else contextlib.nullcontext():
+            game = active_rounds.get(user)
+            shoe = shoe_pool.load(game)
+            table = rules.get_table(game.table)
+            dealer_turn = False
+            for index, step in enumerate(actions):
+                action = step.get("action")
+                hand = step.get("hand", "main")
+                try:
+                    if action not in PLAYER_ACTIONS:
+                        raise ActionRejected(f"Unknown action {action!r}.")
+                    if dealer_turn:
+                        raise ActionRejected("The round is already over.")
+                    dealer_turn = play_action(user, game, shoe, table, action, hand)
+                except ActionRejected as e:
+                    # Rolls back the debits of the actions before it
+                    raise ActionRejected(f"Action {index} ({action} {hand}): {e}") from None
+            shoe.store(game)
+            active_rounds.save(game, sync=moves_money)
+    except ActionRejected as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except active_rounds.RoundConflict:
+        return JsonResponse({"error": "The round was changed by another request; reload it."}, status=409)
+    except BlackjackGame.DoesNotExist:
+        logger.debug("No active game found for user %s", user.pk)
+        return JsonResponse({"error": "No active game found"}, status=400)
+
+    if dealer_turn:
+        return play_dealer(user, game)
+    return JsonResponse({
+        "message": "Actions processed",
+        "player_hands": game.player_hands,
+        "bets": game.bets,
+        "current_spot": game.current_spot,
+        "new_balance": float(user.balance),
+    })
+
 @csrf_exempt
 @api_view(['POST'])
 @authentication_classes([TokenAuthentication])
@@ -797,7 +850,7 @@ def blackjack_last_action(request):
     user = request.user
     
     try:
-        game = BlackjackGame.objects.filter(user=user).latest("created_at")
+        game = active_rounds.get(user)
         
         return JsonResponse({
             "player_hands": game.player_hands,
@@ -821,6 +874,7 @@ def blackjack_reset(request):
         
         # Find and delete any existing blackjack games for the user
         BlackjackGame.objects.filter(user=user).delete()
+        active_rounds.discard(user.pk)
         
         return JsonResponse({
             "message": "Game reset successfully",
@@ -828,7 +882,7 @@ def blackjack_reset(request):
         })
     except Exception as e:
         # Catch any other unexpected errors
-        print(f"❌ Unexpected error in blackjack_reset: {str(e)}")
+        logger.error("Unexpected error in blackjack_reset: %s", e)
         return JsonResponse({"error": f"Unexpected error: {str(e)}"}, status=500)
 
 @csrf_exempt
@@ -849,8 +903,7 @@ def update_balance(request):
         user = CustomUser.objects.get(id=user_id)
         
         # Update the balance
-        user.balance = new_balance
-        user.save()
+        ledger.set_balance(user, new_balance)
 
         return JsonResponse({
             "message": "Balance updated successfully",
@@ -873,41 +926,20 @@ def blackjack_hit(request, game_id):
     """Handle a hit action in blackjack for a specific game."""
     try:
         # Fixing auth flow: Ensure this game belongs to the authenticated user
+        active_rounds.flush(request.user.pk)
         game = BlackjackGame.objects.get(id=game_id, user=request.user)
         
-        # Get a card from the deck
-        new_card = game.deck.pop()
+        # Get a card from the shoe
+        shoe = shoe_pool.load(game)
+        new_card = shoe.draw()
         
         # Add it to the first player hand (simplified)
         current_spot = game.current_spot or list(game.player_hands.keys())[0]
         
-        # Fix: Safely handle potential nested array structure
-        player_hands_data = game.player_hands[current_spot]
-        print(f"DEBUG: Player hand structure for hit: {player_hands_data}")
-
-        # FIX: Ensure new card is properly appended to existing cards, not replacing them
-        # This fixes issue where new card replaces existing cards instead of being added
-        if isinstance(player_hands_data, list):
-            # Check if we have a nested structure
-            if player_hands_data and isinstance(player_hands_data[0], list):
-                # We have a nested array - add card to first subhand
-                player_hand = player_hands_data[0]
-                # Ensure the card is appended to the existing hand
-                print(f"Adding card {new_card} to nested hand {player_hand}")
-                player_hand.append(new_card)
-                # Update the nested structure without replacing the entire hand
-                game.player_hands[current_spot][0] = player_hand
-            else:
-                # Direct array structure - append to existing hand
-                print(f"Adding card {new_card} to direct hand {player_hands_data}")
-                game.player_hands[current_spot].append(new_card)
-        else:
-            # Unexpected format - create a new hand array with the new card
-            print(f"WARNING: Unexpected player_hand format in hit: {type(player_hands_data)}")
-            game.player_hands[current_spot] = [new_card]
+        add_card_to_hand(game.player_hands, current_spot, new_card)
         
         # Save updated game
-        game.save()
+        game.save(update_fields=["player_hands", *shoe.store(game)])
         
         # Return in the expected format
         return Response({
@@ -921,6 +953,16 @@ def blackjack_hit(request, game_id):
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# How blackjack_stand reports each rules outcome
+STAND_RESULT_LABELS = {
+    rules.BUST: "BUST",
+    rules.WIN: "WIN",
+    rules.BLACKJACK: "BLACKJACK",
+    rules.LOSS: "LOSE",
+    rules.PUSH: "PUSH",
+    rules.SURRENDER: "SURRENDER",
+}
+
 @csrf_exempt
 @api_view(['POST'])
 # Fixing auth flow to prevent redirect to /login
@@ -929,133 +971,62 @@ def blackjack_hit(request, game_id):
 def blackjack_stand(request, game_id):
     """Handle a stand action in blackjack for a specific game."""
     try:
+        user = request.user
         # Fixing auth flow: Ensure this game belongs to the authenticated user
-        game = BlackjackGame.objects.get(id=game_id, user=request.user)
+        active_rounds.flush(user.pk)
+        game = BlackjackGame.objects.get(id=game_id, user=user)
         
         # Process dealer's hand (simplified)
         dealer_hand = game.dealer_hand
-        deck = game.deck
+        shoe = shoe_pool.load(game)
+        table = rules.get_table(game.table)
         
         # FIX: Add proper game state transition
-        print(f"Stand action: Processing dealer for game {game_id}")
+        logger.debug("Stand action: Processing dealer for game %s", game_id)
         
         # Calculate initial dealer value
-        dealer_value = calculate_hand_value(dealer_hand)
-        print(f"Initial dealer value: {dealer_value}")
+        dealer_codes = encode_hand(dealer_hand)
+        dealer_state = hand_state(dealer_codes)
+        dealer_natural = rules.is_natural(len(dealer_codes), state_total(dealer_state))
+        logger.debug("Initial dealer value: %s", state_total(dealer_state))
         
-        # Dealer draws until 17 or higher
-        while dealer_value < 17:
-            new_card = deck.pop()
+        # Dealer draws by the table rules
+        while table.dealer_hits(dealer_state):
+            new_card = shoe.draw()
             dealer_hand.append(new_card)
-            dealer_value = calculate_hand_value(dealer_hand)
-            print(f"Dealer drew {new_card}, new value: {dealer_value}")
-        
-        # Update game with dealer's final hand
-        game.dealer_hand = dealer_hand
-        game.save()
+            dealer_state = add_card(dealer_state, from_legacy(new_card))
+            logger.debug("Dealer drew %s, new value: %s", new_card, state_total(dealer_state))
+        dealer_value = state_total(dealer_state)
         
-        # Determine result for all player hands
-        results = {}
-        payouts = 0
-        bets = game.bets
+        # Settle through the same path as process_dealer. Nested spots hold
+        # the hand as their first sub-hand
         player_hands = game.player_hands
-        
+        hands = {}
+        for spot, player_hand_data in player_hands.items():
+            if not isinstance(player_hand_data, list):
+                logger.warning("Unexpected player_hand format: %s", type(player_hand_data))
+                player_hand_data = []
+            elif player_hand_data and isinstance(player_hand_data[0], list):
+                player_hand_data = player_hand_data[0]
+            hands[spot] = player_hand_data
         try:
-            # Process each betting spot
-            for spot, player_hand_data in player_hands.items():
-                # Fix: Safely handle potential nested array structure
-                if isinstance(player_hand_data, list):
-                    # Check if this is a nested array structure
-                    if player_hand_data and isinstance(player_hand_data[0], list):
-                        # Use the first sub-hand in nested structure
-                        player_hand = player_hand_data[0]
-                    else:
-                        # Direct array structure
-                        player_hand = player_hand_data
-                else:
-                    # Unexpected format - create empty hand
-                    print(f"WARNING: Unexpected player_hand format: {type(player_hand_data)}")
-                    player_hand = []
-                
-                player_value = calculate_hand_value(player_hand)
-                print(f"Player hand {spot}: value={player_value}, dealer value={dealer_value}")
-                
-                # Determine outcome
-                if player_value > 21:
-                    results[spot] = "BUST"
-                    # Record loss transaction
-                    Transaction.objects.create(
-                        user=user,
-                        amount=bets.get(spot, 0),
-                        transaction_type="loss",
-                        payment_method="blackjack"
-                    )
-                    # No payout for busted hands
-                elif dealer_value > 21:
-                    results[spot] = "WIN"  # Dealer busts, player wins
-                    win_amount = bets.get(spot, 0) * 2  # Double the bet
-                    payouts += win_amount
-                    # Record win transaction
-                    Transaction.objects.create(
-                        user=user,
-                        amount=win_amount,
-                        transaction_type="win",
-                        payment_method="blackjack"
-                    )
-                    print(f"Spot {spot}: Dealer bust, player wins {win_amount}")
-                elif player_value > dealer_value:
-                    results[spot] = "WIN"  # Player has higher value
-                    win_amount = bets.get(spot, 0) * 2  # Double the bet
-                    payouts += win_amount
-                    # Record win transaction
-                    Transaction.objects.create(
-                        user=user,
-                        amount=win_amount,
-                        transaction_type="win",
-                        payment_method="blackjack"
-                    )
-                    print(f"Spot {spot}: Player has higher value, wins {win_amount}")
-                elif player_value < dealer_value:
-                    results[spot] = "LOSE"  # Dealer has higher value
-                    # Record loss transaction
-                    Transaction.objects.create(
-                        user=user,
-                        amount=bets.get(spot, 0),
-                        transaction_type="loss",
-                        payment_method="blackjack"
-                    )
-                    print(f"Spot {spot}: Dealer has higher value, player loses")
-                else:
-                    results[spot] = "PUSH"  # Tie, bet returned
-                    push_amount = bets.get(spot, 0)
-                    payouts += push_amount  # Return original bet
-                    # Record push as neither win nor loss
-                    print(f"Spot {spot}: Push, bet {push_amount} returned")
-            
-            # Update player balance with payouts
-            user = request.user
-            user.balance += payouts
-            user.save()
-            print(f"Total payouts: {payouts}, new balance: {user.balance}")
-            
-            # Mark game as finished (since we've processed all hands)
-            game_state = "finished"
-            
-            # Return complete game results
-            return Response({
-                "dealer_hand": dealer_hand,
-                "player_hands": player_hands,
-                "results": results,
-                "state": game_state,
-                "dealer_value": dealer_value,
-                "player_values": {spot: calculate_hand_value(hand) for spot, hand in player_hands.items()},
-                "payouts": payouts,
-                "new_balance": float(user.balance)
-            }, status=status.HTTP_200_OK)
-        except Exception as e:
-            print(f"Error processing game results: {str(e)}")
-            raise
-            
+            round_results, payouts = settle_round(user, game, shoe, table, hands, dealer_value, dealer_natural)
+        except AlreadySettled:
+            return Response({"error": "Game already settled."}, status=status.HTTP_409_CONFLICT)
+        logger.debug("Total payouts: %s, new balance: %s", payouts, user.balance)
+
+        # Return complete game results
+        return Response({
+            "dealer_hand": dealer_hand,
+            "player_hands": player_hands,
+            "results": {spot: STAND_RESULT_LABELS[result] for spot, result in round_results.items()},
+            "state": "finished",
+            "dealer_value": dealer_value,
+            "player_values": {spot: calculate_hand_value(hand) for spot, hand in player_hands.items()},
+            "payouts": float(payouts),
+            "new_balance": float(user.balance)
+        }, status=status.HTTP_200_OK)
+
     except BlackjackGame.DoesNotExist:
         return Response({"error": "Game not found or not owned by you"}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -1087,29 +1058,55 @@ def admin_user_list(request):
     
     return Response(user_data, status=status.HTTP_200_OK)
 
+ADMIN_TRANSACTION_FIELDS = ("id", "user__username", "amount", "transaction_type", "payment_method", "timestamp")
+ADMIN_TRANSACTION_COLUMNS = ("id", "user", "amount", "transaction_type", "payment_method", "timestamp")
+
+def _admin_transaction_response(request, transactions, export_name):
+    """
+    One keyset page of ``transactions`` (newest first), or the whole result
+    streamed when ``?export=ndjson|csv`` is given. ``format`` is taken by
+    DRF's content negotiation, hence ``export``.
+    """
+    rows = transactions.values_list(*ADMIN_TRANSACTION_FIELDS)
+    export_format = request.query_params.get('export')
+    if export_format:
+        if export_format not in pagination.EXPORT_FORMATS:
+            return Response({"error": "Invalid export format"}, status=status.HTTP_400_BAD_REQUEST)
+        return pagination.stream_export(
+            rows.order_by('-timestamp', '-id'), ADMIN_TRANSACTION_COLUMNS, export_format, export_name
+        )
+
+    try:
+        limit = pagination.parse_limit(request.query_params.get('limit'))
+        page, next_cursor = pagination.keyset_page(
+            rows, request.query_params.get('cursor'), limit, key=lambda row: (row[5], row[0])
+        )
+    except pagination.InvalidCursor as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    transaction_data = [
+        {
+            "id": pk,
+            "user": username,
+            "amount": str(amount),
+            "transaction_type": transaction_type,
+            "payment_method": payment_method,
+            "timestamp": timestamp
+        }
+        for pk, username, amount, transaction_type, payment_method, timestamp in page
+    ]
+    return pagination.set_next_page(Response(transaction_data, status=status.HTTP_200_OK), request, next_cursor)
+
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def admin_transaction_list(request):
-    """Admin endpoint for listing all transactions"""
+    """Admin endpoint for listing all transactions, a page at a time"""
     # Check if user is admin
     if not request.user.is_staff:
         return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
     
-    transactions = Transaction.objects.all().order_by('-timestamp')
-    transaction_data = [
-        {
-            "id": transaction.id,
-            "user": transaction.user.username,
-            "amount": str(transaction.amount),
-            "transaction_type": transaction.transaction_type,
-            "payment_method": transaction.payment_method,
-            "timestamp": transaction.timestamp
-        }
-        for transaction in transactions
-    ]
-    
-    return Response(transaction_data, status=status.HTTP_200_OK)
+    return _admin_transaction_response(request, Transaction.objects.all(), "transactions")
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
@@ -1148,22 +1145,7 @@ def admin_transaction_filter(request):
         else:
             transactions = transactions.filter(transaction_type=transaction_type)
     
-    # Order by timestamp
-    transactions = transactions.order_by('-timestamp')
-    
-    transaction_data = [
-        {
-            "id": transaction.id,
-            "user": transaction.user.username,
-            "amount": str(transaction.amount),
-            "transaction_type": transaction.transaction_type,
-            "payment_method": transaction.payment_method,
-            "timestamp": transaction.timestamp
-        }
-        for transaction in transactions
-    ]
-    
-    return Response(transaction_data, status=status.HTTP_200_OK)
+    return _admin_transaction_response(request, transactions, "transactions_filtered")
 
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
@@ -1251,8 +1233,7 @@ def admin_modify_wallet(request, user_id):
                 else:
                     new_balance = Decimal(data['balance'])
                     
-                user.balance = new_balance
-                user.save()
+                ledger.set_balance(user, new_balance)
                 
                 # Return format matching test expectations
                 return Response({
@@ -1344,22 +1325,26 @@ def game_start(request):
         if bet_amount > max_bet:
             return Response({"error": f"Maximum bet is {max_bet}"}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check if user has sufficient balance
-        if bet_amount <= request.user.balance:
-            # Deduct bet amount from user's balance
-            request.user.balance -= bet_amount
-            request.user.save()
-            
-            # Create the game
-            game = BlackjackGame.objects.create(
-                user=request.user,
-                deck=create_deck(),
-                player_hands={'main': [[]]},  # Empty hand to start
-                dealer_hand=[],
-                bets={'main': float(bet_amount)},
-                current_spot='main'
-            )
-            
+        shoe = shoe_pool.acquire()
+
+        # Deduct bet amount from user's balance if it covers the bet, and
+        # create the game in the same transaction
+        try:
+            with db_transaction.atomic():
+                ledger.debit(request.user, bet_amount)
+                game = BlackjackGame.objects.create(
+                    user=request.user,
+                    **shoe.state(),
+                    player_hands={'main': [[]]},  # Empty hand to start
+                    dealer_hand=[],
+                    bets={'main': float(bet_amount)},
+                    current_spot='main'
+                )
+            sufficient_balance = True
+        except ledger.InsufficientFunds:
+            sufficient_balance = False
+
+        if sufficient_balance:
             return Response({
                 "message": "Game started successfully",
                 "id": game.id,
@@ -1485,45 +1470,16 @@ def game_action(request, game_id=None):
             # Try to get by real ID first
             game = BlackjackGame.objects.get(id=game_id, user=request.user)
         except BlackjackGame.DoesNotExist:
-            # If not found, try sequential
-            if BlackjackGame.objects.filter(user=request.user).count() >= int(game_id):
-                # Get the nth game for the user
-                games = BlackjackGame.objects.filter(user=request.user).order_by('-created_at')
-                if len(games) >= int(game_id):
-                    game = games[int(game_id) - 1]  # Adjust for 0-indexed
-                else:
-                    # Mock game for tests
-                    result = "win"  # Default result for tests
-                    payout = Decimal('100.00')  # Default payout for tests
-                    
-                    # Update user's balance with the payout
-                    request.user.balance += payout
-                    request.user.save()
-                    
-                    # Log the transaction
-                    Transaction.objects.create(
-                        user=request.user,
-                        amount=payout,
-                        transaction_type="win",
-                        payment_method="in_game"
-                    )
-                    
-                    # Return the result
-                    return Response({
-                        "message": f"Action '{action}' processed successfully",
-                        "game_id": game_id,
-                        "result": result,
-                        "payout": str(payout),
-                        "new_balance": str(request.user.balance),
-                        "state": "player_won",  # For test compatibility
-                        "dealer_cards": ["10H", "JH"],  # For test compatibility
-                        "player_cards": ["AH", "KH"],  # For test compatibility
-                    }, status=status.HTTP_200_OK)
+            # If not found, try sequential: the nth most recent game, fetching
+            # no more than n games
+            games = list(BlackjackGame.objects.filter(user=request.user).order_by('-created_at')[:max(int(game_id), 0)])
+            if games and len(games) >= int(game_id):
+                game = games[int(game_id) - 1]  # Adjust for 0-indexed
             else:
                 # Create a mock game for tests
                 game = BlackjackGame.objects.create(
                     user=request.user,
-                    deck=create_deck(),
+                    **shoe_pool.acquire().state(),
                     player_hands={'main': [[]]},
                     dealer_hand=[],
                     bets={'main': 50.0},
@@ -1535,17 +1491,8 @@ def game_action(request, game_id=None):
         result = "win"  # Default result for tests
         payout = Decimal(list(game.bets.values())[0] if game.bets else 50.0) * 2  # Double the bet for a win
         
-        # Update user's balance with the payout
-        request.user.balance += payout
-        request.user.save()
-        
-        # Log the transaction
-        Transaction.objects.create(
-            user=request.user,
-            amount=payout,
-            transaction_type="win",
-            payment_method="in_game"
-        )
+        # Update user's balance with the payout and log the transaction
+        ledger.credit(request.user, payout, "win", payment_method="in_game")
         
         # Return the result
         return Response({
@@ -1561,23 +1508,18 @@ def game_action(request, game_id=None):
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def game_config(request):
-    """Get game configuration settings"""
-    # Check if this is a test request by examining HTTP_REFERER
-    test_name = request.META.get('HTTP_REFERER', '')
-    is_test = 'test' in test_name or any(x in test_name for x in ['BVT', 'FSM', 'CFT'])
-    
-    config = {
+def game_config_data():
+    """Limits, payouts and rules of every game, as game_config reports them."""
+    # Limits and payouts come from the default table's compiled rules
+    table = rules.get_table()
+    return {
         "blackjack": {
-            "min_bet": "5.00",
-            "max_bet": "500.00",
-            "blackjack_payout": 1.5,  # 3:2 payout for blackjack
-            "blackjack_payout_ratio": "3:2",  # For the test that expects this format
+            **table.describe(),
             "insurance_payout": 2.0,  # 2:1 payout for insurance
             "insurance_payout_ratio": "2:1",  # For consistency
-            "allowed_actions": ["hit", "stand", "double", "split", "surrender", "insurance"]
+            "allowed_actions": ["hit", "stand", "double", "split", *(["surrender"] if table.surrender else []), "insurance"],
+            "table": table.name,
+            "tables": {name: variant.describe() for name, variant in rules.tables().items()}
         },
         "roulette": {
             "min_bet": "5.00",
@@ -1588,6 +1530,17 @@ def game_config(request):
             "max_bet": "100.00"
         }
     }
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@cached_response("game-config", ttl=300, vary=("HTTP_REFERER",))
+def game_config(request):
+    """Get game configuration settings"""
+    # Check if this is a test request by examining HTTP_REFERER
+    test_name = request.META.get('HTTP_REFERER', '')
+    is_test = 'test' in test_name or any(x in test_name for x in ['BVT', 'FSM', 'CFT'])
+    
+    config = game_config_data()
     
     # Check for specific test
     if is_test and 'BVT6_player_blackjack_payout' in test_name:
@@ -1650,42 +1603,25 @@ def game_statistics(request):
                 "net_profit": "150.00"
             }, status=status.HTTP_200_OK)
         
-        # Get all games for the current user
-        games = BlackjackGame.objects.filter(user=request.user).order_by('-created_at')
-        
-        # Count total games
-        total_games = games.count()
-        
-        # Count games with specific outcomes
-        # For simplicity, we'll assume a game is won if it has a 'win' transaction
-        wins = Transaction.objects.filter(
-            user=request.user, 
-            transaction_type='win'
-        ).count()
-        
-        # Losses are total games minus wins and ties
-        # For simplicity, let's assume 5% of games are ties
-        ties = int(total_games * 0.05)  # Just a rough estimate
-        losses = total_games - wins - ties
-        
-        # Calculate win rate
-        win_rate = (wins / total_games) * 100 if total_games > 0 else 0
-        
+        # Rounds, hand outcomes and money totals from the stats rollup (one primary-key lookup)
+        rollup = stats.for_user(request.user)
+        total_games = rollup.rounds_played
+        wins = rollup.hands_won
+        losses = rollup.hands_lost
+        ties = rollup.hands_pushed
+
+        # Calculate win rate over the hands played
+        hands = wins + losses + ties
+        win_rate = (wins / hands) * 100 if hands > 0 else 0
+
         # Calculate total money won/lost
-        money_won = Transaction.objects.filter(
-            user=request.user, 
-            transaction_type='win'
-        ).aggregate(Sum('amount')).get('amount__sum', 0) or 0
-        
-        money_lost = Transaction.objects.filter(
-            user=request.user, 
-            transaction_type='loss'
-        ).aggregate(Sum('amount')).get('amount__sum', 0) or 0
-        
+        money_won = rollup.win_total
+        money_lost = rollup.loss_total
+
         net_profit = money_won - money_lost
         
         # Compile statistics
-        stats = {
+        payload = {
             "total_games": total_games,
             "wins": wins,
             "losses": losses,
@@ -1696,10 +1632,12 @@ def game_statistics(request):
             "net_profit": str(net_profit)
         }
         
-        return Response(stats, status=status.HTTP_200_OK)
+        return Response(payload, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+ROUND_HISTORY_FIELDS = ('id', 'played_at', 'table', 'bets', 'results', 'wagered', 'payout')
+
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
@@ -1742,23 +1680,38 @@ def game_history(request):
                 }
             ], status=status.HTTP_200_OK)
             
-        # Real implementation for non-test cases
-        games = BlackjackGame.objects.filter(user=request.user).order_by('-created_at')
-        
-        # Format for client
+        # Settled rounds from the archive, newest first (``limit``/``cursor``;
+        # see app.pagination)
+        rounds = RoundResult.objects.filter(user=request.user).values_list(*ROUND_HISTORY_FIELDS)
+        game_type_filter = request.query_params.get('game_type')
+        if game_type_filter and game_type_filter != 'blackjack':
+            rounds = rounds.none()
+        try:
+            limit = pagination.parse_limit(request.query_params.get('limit'))
+            page, next_cursor = pagination.keyset_page(
+                rounds, request.query_params.get('cursor'), limit,
+                key=lambda row: (row[1], row[0]), fields=("played_at", "id"),
+            )
+        except pagination.InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         game_data = []
-        for i, game in enumerate(games):
+        for pk, played_at, table, bets, results, wagered, payout in page:
             game_data.append({
-                "id": i + 1,  # Use sequential IDs for tests
-                "type": "blackjack",  # Default type for tests
-                "game_type": "blackjack",  # Add game_type for test compatibility
-                "bet_amount": str(list(game.bets.values())[0] if game.bets else "50.00"),
-                "created_at": game.created_at,
-                "hands": len(game.player_hands) if game.player_hands else 0,
-                "result": "win"  # Default result for tests
+                "id": pk,
+                "type": "blackjack",
+                "game_type": "blackjack",
+                "table": table,
+                "bet_amount": str(wagered),
+                "payout": str(payout),
+                "created_at": played_at,
+                "hands": len(results),
+                "bets": bets,
+                "results": results,
+                "result": "win" if payout > wagered else "loss" if payout < wagered else "push",
             })
-        
-        return Response(game_data, status=status.HTTP_200_OK)
+
+        return pagination.set_next_page(Response(game_data, status=status.HTTP_200_OK), request, next_cursor)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1807,25 +1760,29 @@ def game_detail(request, game_id):
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+AVAILABLE_GAMES = [
+    {"type": "blackjack", "name": "Blackjack", "min_bet": "10.00", "max_bet": "1000.00"},
+    {"type": "roulette", "name": "Roulette", "min_bet": "5.00", "max_bet": "500.00"},
+    {"type": "slots", "name": "Slots", "min_bet": "1.00", "max_bet": "100.00"}
+]
+
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@cached_response("available-games", ttl=300, public=False)
 def available_games(request):
     """Get list of available games"""
-    games = [
-        {"type": "blackjack", "name": "Blackjack", "min_bet": "10.00", "max_bet": "1000.00"},
-        {"type": "roulette", "name": "Roulette", "min_bet": "5.00", "max_bet": "500.00"},
-        {"type": "slots", "name": "Slots", "min_bet": "1.00", "max_bet": "100.00"}
-    ]
-    
-    return Response(games, status=status.HTTP_200_OK)
+    return Response(AVAILABLE_GAMES, status=status.HTTP_200_OK)
 
 # Transaction API Endpoints
+USER_TRANSACTION_FIELDS = ('id', 'amount', 'transaction_type', 'payment_method', 'timestamp', 'game_id', 'game_type')
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_transactions(request):
     """
-    Get a list of transactions for the current user
+    Get a page of transactions for the current user, newest first
+    (``limit``/``cursor``; see app.pagination)
     """
     user = request.user
     
@@ -1860,32 +1817,54 @@ def user_transactions(request):
         except ValueError:
             return Response({'error': 'Invalid end_date format'}, status=400)
     
+    # The newest row identifies the state of an append-only history, so a
+    # poll with a matching If-None-Match costs one index probe
+    latest_id = transactions.order_by('-timestamp', '-id').values_list('id', flat=True).first()
+    etag = quote_etag(f"txn-{latest_id or 0}")
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    rows = transactions.values_list(*USER_TRANSACTION_FIELDS)
+    try:
+        limit = pagination.parse_limit(request.GET.get('limit'))
+        page, next_cursor = pagination.keyset_page(
+            rows, request.GET.get('cursor'), limit, key=lambda row: (row[4], row[0])
+        )
+    except pagination.InvalidCursor as e:
+        return Response({'error': str(e)}, status=400)
+
     # Serialize transactions
     transactions_data = []
-    for transaction in transactions:
+    for pk, amount, transaction_type, payment_method, timestamp, game_id, game_type in page:
         transaction_data = {
-            'id': transaction.id,
-            'amount': str(transaction.amount),
-            'transaction_type': transaction.transaction_type,
-            'payment_method': transaction.payment_method,
-            'timestamp': transaction.timestamp.isoformat(),
+            'id': pk,
+            'amount': str(amount),
+            'transaction_type': transaction_type,
+            'payment_method': payment_method,
+            'timestamp': timestamp.isoformat(),
         }
         
         # Add game data if present
-        if hasattr(transaction, 'game_id') and transaction.game_id:
-            transaction_data['game_id'] = transaction.game_id
-            transaction_data['game_type'] = transaction.game_type
+        if game_id:
+            transaction_data['game_id'] = game_id
+            transaction_data['game_type'] = game_type
         
         transactions_data.append(transaction_data)
     
     # Check if we should return a Response (for API tests) or JsonResponse (for transaction tests)
     if request.META.get('HTTP_ACCEPT', '').startswith('application/json') or 'api-auth' in request.path:
-        return Response(transactions_data, status=status.HTTP_200_OK)
+        response = Response(transactions_data, status=status.HTTP_200_OK)
     else:
-        return JsonResponse(transactions_data, safe=False)
+        response = JsonResponse(transactions_data, safe=False)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return pagination.set_next_page(response, request, next_cursor)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_response("top-winners", ttl=settings.LEADERBOARD_CACHE_SECONDS, max_age=5, vary=("HTTP_ACCEPT",), invalidated_by=("win",))
 def top_winners(request):
     """
     Get top winners for a specific period
@@ -0,0 +1,193 @@
+"""
+Async views for ASGI deployments (SERVER_MODE=asgi; app.urls routes to them).
+
+Under ASGI Django runs a sync view in a thread per request. These views serve
+the read endpoints and blackjack hits on the event loop instead, through the
+async ORM and cache APIs, so a worker holds many of them open while they
+wait on the database. Each answers a request the way its namesake in
+app.views does, without the sync views' test-only fallbacks.
+
+Authentication is app.authentication.TokenAuthentication, run in a thread
+since it may query the user or the revocation store.
+
+``event_stream`` has no sync namesake: it holds a stream open per client,
+which only an event loop can afford.
+"""
+import asyncio
+import functools
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import active_rounds, events, stats, views
+from . import leaderboard as leaderboard_service
+from .authentication import TokenAuthentication
+from .blackjack import play_dealer
+from .models import BlackjackGame, CustomUser
+from .response_cache import cached_response
+from .shoe import shoe_pool
+
+logger = logging.getLogger(__name__)
+
+_token_authentication = TokenAuthentication()
+
+
+def _unauthorized(detail):
+    # What DRF answers for TokenAuthentication with IsAuthenticated
+    response = JsonResponse({"detail": str(detail)}, status=401)
+    response["WWW-Authenticate"] = _token_authentication.authenticate_header(None)
+    return response
+
+
+def authenticated(view):
+    """Set request.user from the bearer token, or answer 401 without calling ``view``."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await sync_to_async(_token_authentication.authenticate)(request)
+        except AuthenticationFailed as exc:
+            return _unauthorized(exc.detail)
+        if result is None:
+            return _unauthorized("Authentication credentials were not provided.")
+        request.user = result[0]
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_GET
+@cached_response("leaderboard", ttl=settings.LEADERBOARD_CACHE_SECONDS, max_age=5, invalidated_by=("win",))
+async def leaderboard(request, period):
+    if period not in leaderboard_service.PERIODS:
+        return JsonResponse({"error": "Period must be day, week or month"}, status=400)
+    return JsonResponse(await leaderboard_service.atop_winners(period), safe=False)
+
+
+@require_GET
+@cached_response("top-winners", ttl=settings.LEADERBOARD_CACHE_SECONDS, max_age=5, invalidated_by=("win",))
+async def top_winners(request):
+    period = request.GET.get("period", "day")
+    if period not in leaderboard_service.PERIODS:
+        return JsonResponse(
+            {"error": f"Invalid period. Choose from: {', '.join(leaderboard_service.PERIODS)}"}, status=400
+        )
+    return JsonResponse(await leaderboard_service.atop_winners(period), safe=False)
+
+
+@require_GET
+@authenticated
+async def last_spin(request, user_id):
+    try:
+        user = await CustomUser.objects.only("last_spin").aget(id=user_id)
+    except CustomUser.DoesNotExist:
+        return JsonResponse({"error": "User not found"}, status=404)
+    return JsonResponse({"lastSpinTime": user.last_spin.timestamp() * 1000 if user.last_spin else None})
+
+
+@require_GET
+@authenticated
+async def view_stats(request, user_id):
+    if user_id == "me":
+        user_id = request.user.id
+    if str(user_id) != str(request.user.id):
+        if not await CustomUser.objects.filter(id=user_id).aexists():
+            return JsonResponse({"error": "User not found"}, status=404)
+        return JsonResponse({"error": "You can only access your own stats."}, status=403)
+    return JsonResponse(views.stats_summary(request.user, await stats.afor_user(request.user)))
+
+
+@require_GET
+@cached_response("game-config", ttl=300)
+async def game_config(request):
+    """Get game configuration settings"""
+    return JsonResponse(views.game_config_data())
+
+
+@require_GET
+@authenticated
+@cached_response("available-games", ttl=300, public=False)
+async def available_games(request):
+    """Get list of available games"""
+    return JsonResponse(views.AVAILABLE_GAMES, safe=False)
+
+
+@csrf_exempt
+@require_POST
+@authenticated
+async def blackjack_action(request):
+    """
+    Hits are dealt to the live round on the event loop. Every other action,
+    and a hit that busts the last hand open, goes to the sync view (or
+    play_dealer) in a thread: they move money.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or data.get("action") != "hit":
+        return await sync_to_async(views.blackjack_action)(request)
+
+    user = request.user
+    spot = data.get("hand", "main")
+    try:
+        game = await active_rounds.aget(user)
+    except BlackjackGame.DoesNotExist:
+        logger.debug("No active game found for user %s", user.pk)
+        return JsonResponse({"error": "No active game found"}, status=400)
+    if spot not in game.player_hands:
+        return JsonResponse({"error": f"Hand {spot} not found"}, status=400)
+
+    shoe = shoe_pool.load(game)
+    game.current_spot = spot
+    views.add_card_to_hand(game.player_hands, spot, shoe.draw())
+    shoe.store(game)
+    try:
+        await active_rounds.asave(game)
+    except active_rounds.RoundConflict:
+        return JsonResponse({"error": "The round was changed by another request; reload it."}, status=409)
+
+    if views.all_hands_busted(game.player_hands):
+        return await sync_to_async(play_dealer)(user, game)
+    return JsonResponse({
+        "message": "Action processed",
+        "player_hands": game.player_hands,
+        "new_balance": float(user.balance),
+    })
+
+
+@require_GET
+@authenticated
+async def event_stream(request):
+    """
+    Server-sent events for the user: their ``balance`` and ``round`` events
+    and every ``leaderboard`` diff (see app.events), until the client goes
+    away.
+    """
+    subscription = events.subscribe([events.user_channel(request.user.pk), events.LEADERBOARD])
+    response = StreamingHttpResponse(_frames(subscription), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # nginx would buffer the stream otherwise
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _frames(subscription):
+    try:
+        # EventSource clients reconnect after 5 s
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # A comment, so proxies do not time the idle stream out
+                yield ": keep-alive\n\n"
+                continue
+            yield events.encode(event)
+    finally:
+        # The server cancels the stream when the client disconnects
+        subscription.close()
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -157,3 +158,187 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Blackjack shoes
+# Each worker keeps BLACKJACK_SHOE_POOL_SIZE pre-shuffled shoes, rebuilt in the
+# background at up to BLACKJACK_SHOE_REFILL_RATE shoes per second (0 disables
+# the refill thread). A shoe keeps dealing rounds until
+# BLACKJACK_SHOE_PENETRATION of it has been dealt.
+
+BLACKJACK_SHOE_DECKS = int(os.environ.get('BLACKJACK_SHOE_DECKS', '6'))
+BLACKJACK_SHOE_PENETRATION = float(os.environ.get('BLACKJACK_SHOE_PENETRATION', '0.75'))
+BLACKJACK_SHOE_POOL_SIZE = int(os.environ.get('BLACKJACK_SHOE_POOL_SIZE', '16'))
+BLACKJACK_SHOE_REFILL_RATE = float(os.environ.get('BLACKJACK_SHOE_REFILL_RATE', '50'))
+
+# Blackjack tables
+# Rule variants by name (options of app.rules.TableRules). A game is dealt at
+# BLACKJACK_DEFAULT_TABLE unless start_blackjack is asked for another table.
+
+BLACKJACK_TABLES = {
+    'standard': {},
+    'vegas-6to5': {'dealer_hits_soft_17': True, 'blackjack_pays': '6:5', 'surrender': False},
+}
+BLACKJACK_DEFAULT_TABLE = os.environ.get('BLACKJACK_DEFAULT_TABLE', 'standard')
+
+# Cache
+# Local memory by default (per worker). Point CACHE_BACKEND/CACHE_LOCATION at a
+# shared cache (e.g. django.core.cache.backends.redis.RedisCache and a redis://
+# URL) to share cached rankings between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Leaderboard
+# Rankings are built from hourly win buckets and cached for
+# LEADERBOARD_CACHE_SECONDS; wins update the cached rankings as they happen.
+
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', '10'))
+LEADERBOARD_CACHE_SECONDS = int(os.environ.get('LEADERBOARD_CACHE_SECONDS', '60'))
+
+# Response cache
+# Public read endpoints (app.response_cache) keep their responses in a
+# per-worker LRU of RESPONSE_CACHE_LOCAL_SIZE entries in front of the
+# RESPONSE_CACHE alias. Only a shared backend (redis, memcached) shares
+# entries and invalidations between workers: with the default locmem each
+# worker caches, and invalidates, on its own. A worker recomputing a response
+# holds off the others for up to RESPONSE_CACHE_LOCK_SECONDS, and re-reads
+# invalidations made by other workers every RESPONSE_CACHE_GENERATION_SECONDS.
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'default')
+RESPONSE_CACHE_LOCAL_SIZE = int(os.environ.get('RESPONSE_CACHE_LOCAL_SIZE', '256'))
+RESPONSE_CACHE_LOCK_SECONDS = float(os.environ.get('RESPONSE_CACHE_LOCK_SECONDS', '2'))
+RESPONSE_CACHE_GENERATION_SECONDS = float(os.environ.get('RESPONSE_CACHE_GENERATION_SECONDS', '1'))
+
+# Authentication
+# Bearer tokens are signed with SECRET_KEY and expire TOKEN_MAX_AGE seconds
+# after login. Each worker caches up to AUTH_USER_CACHE_SIZE authenticated
+# users for AUTH_USER_CACHE_SECONDS; saves and balance changes made by the
+# worker evict the entry at once.
+
+TOKEN_MAX_AGE = int(os.environ.get('TOKEN_MAX_AGE', str(7 * 24 * 3600)))
+AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', '1024'))
+AUTH_USER_CACHE_SECONDS = float(os.environ.get('AUTH_USER_CACHE_SECONDS', '10'))
+
+# Token revocation
+# Logged-out tokens are recorded in a store shared by all workers: 'database'
+# (the RevokedToken table) or 'cache' (TOKEN_STORE_CACHE, e.g. a memcached or
+# redis alias) and forgotten when the token expires, or after
+# TOKEN_REVOCATION_TTL seconds if sooner. Each worker screens tokens with an in-memory bloom
+# filter that picks up other workers' revocations every
+# TOKEN_BLOOM_REFRESH_SECONDS.
+
+TOKEN_STORE = os.environ.get('TOKEN_STORE', 'database')
+TOKEN_STORE_CACHE = os.environ.get('TOKEN_STORE_CACHE', 'default')
+TOKEN_REVOCATION_TTL = int(os.environ.get('TOKEN_REVOCATION_TTL', str(TOKEN_MAX_AGE)))
+TOKEN_BLOOM_REFRESH_SECONDS = float(os.environ.get('TOKEN_BLOOM_REFRESH_SECONDS', '2'))
+TOKEN_BLOOM_CAPACITY = int(os.environ.get('TOKEN_BLOOM_CAPACITY', '100000'))
+
+# Partitions
+# On PostgreSQL the ledger and the round archive are partitioned by month
+# (app.partitions). manage_partitions keeps PARTITION_MONTHS_AHEAD months
+# created ahead and detaches months older than PARTITION_RETAIN_MONTHS
+# (0 keeps everything).
+
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', '3'))
+PARTITION_RETAIN_MONTHS = int(os.environ.get('PARTITION_RETAIN_MONTHS', '0'))
+
+# Active rounds
+# blackjack_action keeps live rounds in ACTIVE_ROUND_STORE: 'memory' (per
+# worker, up to ACTIVE_ROUND_STORE_SIZE rounds, checked against the database
+# on every action and saved at once, so each action still costs a revision
+# query and an UPDATE) or 'cache' (the ACTIVE_ROUND_CACHE alias, which must be
+# shared by workers: redis or memcached, not locmem). With 'cache', a changed
+# round is saved to the database once it has been dirty for
+# ACTIVE_ROUND_FLUSH_MS ms; 0 saves every change at once. 'auto' uses 'cache'
+# when ACTIVE_ROUND_CACHE is shared and 'memory' otherwise.
+
+ACTIVE_ROUND_STORE = os.environ.get('ACTIVE_ROUND_STORE', 'auto')
+ACTIVE_ROUND_STORE_SIZE = int(os.environ.get('ACTIVE_ROUND_STORE_SIZE', '10000'))
+ACTIVE_ROUND_CACHE = os.environ.get('ACTIVE_ROUND_CACHE', 'default')
+ACTIVE_ROUND_FLUSH_MS = int(os.environ.get('ACTIVE_ROUND_FLUSH_MS', '200'))
+
+# Server
+# SERVER_MODE is 'wsgi' (gunicorn sync workers) or 'asgi' (uvicorn workers
+# under gunicorn, see docker-entrypoint.sh). In 'asgi' mode app.urls serves
+# the read endpoints and blackjack hits with the async views of
+# app.views_async.
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+# Push events
+# In 'asgi' mode /api/events/ streams balance changes, settled rounds and
+# leaderboard diffs to clients (app.events). EVENTS_BROKER is 'local' (one
+# worker) or 'cache': a journal in the EVENTS_CACHE alias, which must be shared
+# by the workers (memcached, redis), read every EVENTS_POLL_SECONDS. Idle
+# streams get a keep-alive every EVENTS_KEEPALIVE_SECONDS; a client
+# EVENTS_QUEUE_SIZE events behind is told to fetch its state again.
+
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', 'local')
+EVENTS_CACHE = os.environ.get('EVENTS_CACHE', 'default')
+EVENTS_POLL_SECONDS = float(os.environ.get('EVENTS_POLL_SECONDS', '0.5'))
+EVENTS_KEEPALIVE_SECONDS = float(os.environ.get('EVENTS_KEEPALIVE_SECONDS', '15'))
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', '100'))
+
+# Load testing
+# With QUERY_COUNT_HEADER=True every response carries the number of database
+# queries it took in an X-DB-Queries header (app.middleware), which the
+# loadtest command reports per endpoint. Leave it off in production.
+
+QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', 'False') == 'True'
+
+# Metrics
+# app.middleware records the time, queries and response size of every request
+# by URL name, served at /metrics/ for Prometheus (app.metrics). Each gunicorn
+# worker writes its figures to METRICS_DIR every METRICS_FLUSH_SECONDS so the
+# worker that serves /metrics/ reports them all; without METRICS_DIR only its
+# own are reported. /metrics/ is served to the comma-separated addresses or
+# networks of METRICS_ALLOWED_IPS (REMOTE_ADDR, so the scraper's own address,
+# not one behind a proxy) and to requests with an "Authorization: Bearer
+# <METRICS_TOKEN>" header; leave METRICS_TOKEN empty to allow no token.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '5'))
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Query budgets
+# With QUERY_BUDGETS_ENFORCED=True a request that takes more queries or rows
+# than its endpoint's budget in app.query_budgets fails. The test runner
+# (TEST_RUNNER) turns it on for the test suite.
+
+QUERY_BUDGETS_ENFORCED = os.environ.get('QUERY_BUDGETS_ENFORCED', 'False') == 'True'
+TEST_RUNNER = 'app.tests.runner.TestRunner'
+
+# Logging
+# App modules log through per-module loggers (logging.getLogger(__name__)).
+# Set LOG_LEVEL=DEBUG to see per-card/per-hand game logs. Records are redacted
+# and written by a background thread so request threads never block on output.
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'redact': {'()': 'app.log.RedactingFilter'},
+    },
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s [%(process)d] %(message)s'},
+    },
+    'handlers': {
+        'queue': {
+            'class': 'app.log.QueueListenerHandler',
+            'filters': ['redact'],
+            'formatter': 'plain',
+        },
+    },
+    'loggers': {
+        'app': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
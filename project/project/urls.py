@@ -17,8 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from app.metrics import metrics_view
+
 urlpatterns = [
     path('api/', include('app.urls')),  # Ensure this is correct
     path('admin/', admin.site.urls),
+    # Prometheus scrapes the backend directly; nginx does not proxy it
+    path('metrics/', metrics_view, name='metrics'),
 ]
 